@@ -4,8 +4,11 @@ import jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import os
+import uuid
 from dotenv import load_dotenv
 
+from utils.revocation import token_denylist
+
 load_dotenv()
 
 # Password hashing
@@ -14,7 +17,9 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Access tokens are short-lived; clients renew them with the refresh token
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -25,32 +30,63 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token."""
+    """Create a JWT access token with a unique id (`jti`) so it can be revoked."""
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.setdefault("type", "access")
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
-    """Verify and decode a JWT token."""
+def create_refresh_token(username: str, session_id: str):
+    """Create a refresh token for a login session (`sid`), good for REFRESH_TOKEN_EXPIRE_DAYS."""
+    return create_access_token(
+        {"sub": username, "sid": session_id, "type": "refresh"},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+
+def create_token_pair(username: str, session_id: Optional[str] = None) -> dict:
+    """
+    Access and refresh tokens for a login session; both carry the session id,
+    so revoking it signs out every token the session has been given.
+    """
+    session_id = session_id or uuid.uuid4().hex
+    return {
+        "access_token": create_access_token({"sub": username, "sid": session_id}),
+        "refresh_token": create_refresh_token(username, session_id),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def decode_token(token: str, token_type: str = "access") -> dict:
+    """
+    Decode a JWT of the given type (tokens issued before types existed count
+    as access tokens) without checking revocation.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username
     except jwt.PyJWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        raise _credentials_exception()
+    return payload
+
+def verify_token(token: str):
+    """Verify and decode a JWT access token that has not been revoked; returns the username."""
+    payload = decode_token(token)
+    # A Bloom filter lookup; the database is only asked about filter hits
+    if token_denylist.is_revoked(payload.get("jti"), payload.get("sid")):
+        raise _credentials_exception()
+    return payload["sub"]
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Dashboard and profile read latency against a large dataset.
+
+Runs the app in-process with SQL_PROFILING against `--database-url`
+(normally filled by benchmarks/synthetic_data.py) and times every
+dashboard, profile and auth read for four users picked by attempt count:
+the lightest, the median, the p99 and the heaviest. Each endpoint is
+called `--repeat` times; the first call is reported as cold, the rest as
+p50/p95/max, next to the statement count and DB time from the
+X-Query-Profile header. `--writes` also times save-state and save-quiz
+(this adds rows to the database).
+
+Results can be written as JSON with `--output` and compared with an
+earlier run with `--compare`, so an index or query change can be judged
+on the same data across SQLite and PostgreSQL.
+
+Usage (from backend/):
+    python benchmarks/dashboard_queries.py [--database-url URL] [--repeat 20] [--output run.json]
+    python benchmarks/dashboard_queries.py --compare baseline.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BACKEND_DIR, 'synthetic.db')}"
+TABLES = ("users", "quiz_attempts", "question_answers", "topics", "user_daily_progress")
+
+SAMPLE_QUESTIONS = [
+    {"question": f"Benchmark question {i}?", "options": ["A", "B", "C", "D"], "answers": ["A"],
+     "explanation": "Because A."}
+    for i in range(10)
+]
+
+
+def percentile_ms(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000
+
+
+def parse_profile(header):
+    fields = dict(part.strip().split("=") for part in header.split(";"))
+    return int(fields["count"]), float(fields["time_ms"])
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def pick_users(engine):
+    """Lightest, median, p99 and heaviest users by number of attempts."""
+    from sqlalchemy import func, select
+
+    from models import QuizAttempt, User
+
+    with engine.connect() as conn:
+        counts = conn.execute(
+            select(User.id, User.username, func.count(QuizAttempt.id).label("attempts"))
+            .join(QuizAttempt, QuizAttempt.user_id == User.id)
+            .group_by(User.id, User.username)
+            .order_by("attempts", User.id)
+        ).all()
+    if not counts:
+        sys.exit("No attempts in the database; fill it with benchmarks/synthetic_data.py first")
+    picks = {"light": 0, "median": len(counts) // 2, "p99": int(len(counts) * 0.99), "heaviest": len(counts) - 1}
+    return {label: counts[min(index, len(counts) - 1)] for label, index in picks.items()}
+
+
+def user_quizzes(engine, user_id):
+    """A completed and an ongoing attempt of the user, for the per-quiz endpoints."""
+    from sqlalchemy import select
+
+    from models import QuizAttempt
+
+    with engine.connect() as conn:
+        def first(status):
+            return conn.execute(
+                select(QuizAttempt.id).where(QuizAttempt.user_id == user_id, QuizAttempt.status == status)
+                .order_by(QuizAttempt.id.desc()).limit(1)
+            ).scalar()
+        return first("completed"), first("ongoing")
+
+
+def table_counts(engine):
+    from sqlalchemy import text
+
+    counts = {}
+    with engine.connect() as conn:
+        for table in TABLES:
+            try:
+                counts[table] = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            except Exception:
+                counts[table] = None
+    return counts
+
+
+def endpoints(attempts, completed_id, ongoing_id):
+    """(name, method, path, extra params) for every read of the dashboard and profile pages."""
+    reads = [
+        ("auth/me", "GET", "/auth/me", None),
+        ("profile/me", "GET", "/profile/me", None),
+        ("profile/stats", "GET", "/profile/stats", None),
+        ("profile/preferences", "GET", "/profile/preferences", None),
+        ("dashboard/stats", "GET", "/dashboard/stats", None),
+        ("dashboard/history", "GET", "/dashboard/history", None),
+        ("dashboard/history?deep", "GET", "/dashboard/history", {"offset": max(0, int(attempts * 0.8) - 20)}),
+        ("dashboard/ongoing", "GET", "/dashboard/ongoing", None),
+        ("dashboard/performance-by-category", "GET", "/dashboard/performance-by-category", None),
+        ("dashboard/progress", "GET", "/dashboard/progress", None),
+        ("dashboard/progress?365d", "GET", "/dashboard/progress", {"days": 365}),
+        ("dashboard/export", "GET", "/dashboard/export", None),
+    ]
+    if completed_id:
+        reads.append(("dashboard/quiz/{id}", "GET", f"/dashboard/quiz/{completed_id}", None))
+    if ongoing_id:
+        reads.append(("dashboard/resume/{id}", "GET", f"/dashboard/resume/{ongoing_id}", None))
+    return reads
+
+
+def measure(client, token, method, path, params, repeat, body=None):
+    wall, statements, db_ms = [], [], []
+    for i in range(repeat):
+        payload = body(i) if callable(body) else body
+        started = time.perf_counter()
+        if method == "GET" and path.startswith("/auth/"):
+            response = client.get(path, headers={"Authorization": f"Bearer {token}"})
+        else:
+            response = client.request(method, path, params={"token": token, **(params or {})}, json=payload)
+        wall.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} -> {response.status_code}: {response.text[:200]}")
+        count, time_ms = parse_profile(response.headers["x-query-profile"])
+        statements.append(count)
+        db_ms.append(time_ms)
+    warm = wall[1:] or wall
+    return {
+        "cold_ms": round(wall[0] * 1000, 2),
+        "p50_ms": round(percentile_ms(warm, 50), 2),
+        "p95_ms": round(percentile_ms(warm, 95), 2),
+        "max_ms": round(max(warm) * 1000, 2),
+        "statements": max(statements),
+        "db_ms": round(sorted(db_ms)[len(db_ms) // 2], 2),
+    }
+
+
+def compare(baseline, results):
+    """Print p50 and p95 ratios of this run against a baseline run."""
+    before = {(r["user"], r["endpoint"]): r for r in baseline["results"]}
+    print(f"\nAgainst {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta']['dialect']}, "
+          f"{baseline['meta']['recorded_at']}):")
+    print(f"{'user':<10}{'endpoint':<38}{'p50 ms':>16}{'p95 ms':>16}{'ratio':>8}")
+    for r in results:
+        old = before.get((r["user"], r["endpoint"]))
+        if not old:
+            continue
+        ratio = r["p95_ms"] / old["p95_ms"] if old["p95_ms"] else float("inf")
+        marker = "  ⚠" if ratio > 1.25 else ""
+        print(f"{r['user']:<10}{r['endpoint']:<38}{old['p50_ms']:>7.1f} → {r['p50_ms']:<6.1f}"
+              f"{old['p95_ms']:>7.1f} → {r['p95_ms']:<6.1f}{ratio:>7.2f}x{marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.getenv("SYNTHETIC_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--repeat", type=int, default=20, help="calls per endpoint and user")
+    parser.add_argument("--writes", action="store_true", help="also time save-state and save-quiz")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    # The app modules read these at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["SQL_PROFILING"] = "1"
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+    from fastapi.testclient import TestClient
+
+    import main as app_main
+    from auth_utils import create_access_token
+    from database import engine
+
+    meta = {
+        "dialect": engine.dialect.name,
+        "database_url": engine.url.render_as_string(hide_password=True),
+        "rows": table_counts(engine),
+        "commit": git_commit(),
+        "recorded_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "repeat": args.repeat,
+    }
+    print(f"Database: {meta['database_url']} ({meta['dialect']})")
+    print("Rows: " + ", ".join(f"{table} {count:,}" for table, count in meta["rows"].items() if count is not None))
+
+    users = pick_users(engine)
+    results = []
+    with TestClient(app_main.app) as client:
+        for label, (user_id, username, attempts) in users.items():
+            token = create_access_token({"sub": username})
+            completed_id, ongoing_id = user_quizzes(engine, user_id)
+            print(f"\n{label} user ({username}, {attempts:,} attempts)")
+            print(f"  {'endpoint':<38}{'cold':>9}{'p50':>9}{'p95':>9}{'max':>9}{'stmts':>7}{'db ms':>9}")
+            timed = [(name, method, path, params, None)
+                     for name, method, path, params in endpoints(attempts, completed_id, ongoing_id)]
+            if args.writes:
+                timed += [
+                    ("dashboard/save-state", "POST", "/dashboard/save-state", None, lambda i: {
+                        "topic": "Benchmark writes", "difficulty": "medium", "total_questions": 10,
+                        "questions_data": SAMPLE_QUESTIONS, "user_answers": {"0": ["A"]}, "time_taken": 30,
+                    }),
+                    ("dashboard/save-quiz", "POST", "/dashboard/save-quiz", None, lambda i: {
+                        "topic": "Benchmark writes", "difficulty": "medium", "total_questions": 10,
+                        "correct_answers": i % 11, "percentage": i % 11 * 10.0, "time_taken": 120,
+                    }),
+                ]
+            for name, method, path, params, body in timed:
+                stats = measure(client, token, method, path, params, args.repeat, body)
+                results.append({"user": label, "attempts": attempts, "endpoint": name, **stats})
+                print(f"  {name:<38}{stats['cold_ms']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+                      f"{stats['max_ms']:>9.1f}{stats['statements']:>7}{stats['db_ms']:>9.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Batching and dedup of the question enrichment pipeline against a stand-in Gemini.
+
+`--completions` quiz completions are drawn from a shared pool of `--pool`
+questions (popular questions are picked more often), each answered
+wrongly with probability `--miss-rate`. Every completion is submitted to
+the pipeline as the save-quiz endpoint does, timing the submit itself;
+then one pipeline cycle with no batch limit drains the queue. The report compares the LLM calls made with the calls needed
+to enrich per miss or per completed quiz inline.
+
+Usage (from backend/):
+    python benchmarks/enrichment_batching.py [--completions 2000] [--pool 400] [--batch-size 20]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_key_pool import StandIn  # noqa: E402  (sets up the throwaway database first)
+
+
+class EnrichmentStandIn(StandIn):
+    """Answers every call with an explanation for ids 0..batch_size-1; ids past the batch are ignored."""
+
+    def __init__(self, batch_size: int, latency: float):
+        super().__init__(quota=1_000_000, latency=latency)
+        self.text = json.dumps({"explanations": [
+            {"id": i, "detailed_explanation": "Option A is right because of the definition; B, C and D are not.",
+             "reference_links": [{"title": "Encyclopedia article", "url": "https://en.wikipedia.org/wiki/Quiz"}]}
+            for i in range(batch_size)
+        ]})
+
+    def answer(self, key):
+        status, body = super().answer(key)
+        if status == 200:
+            body["candidates"][0]["content"]["parts"][0]["text"] = self.text
+        return status, body
+
+
+def percentile_us(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--completions", type=int, default=2000)
+    parser.add_argument("--pool", type=int, default=400, help="distinct questions")
+    parser.add_argument("--questions", type=int, default=10, help="questions per quiz")
+    parser.add_argument("--miss-rate", type=float, default=0.3)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="stand-in response time in seconds")
+    args = parser.parse_args()
+
+    from database import create_tables
+    from utils.enrichment import EnrichmentPipeline, enrichments_for
+    from utils.gemini_client import GeminiClient
+    from utils.llm_ledger import llm_ledger
+
+    create_tables()
+    rng = random.Random(7)
+    pool = [
+        {"question": f"Which statement about concept {i} is true?", "options": ["A", "B", "C", "D"],
+         "answers": ["A"], "explanation": "Because A."}
+        for i in range(args.pool)
+    ]
+    weights = [1 / (i + 1) for i in range(args.pool)]  # a few questions come up far more often
+
+    stand_in = EnrichmentStandIn(args.batch_size, args.latency)
+    client = GeminiClient(api_keys=["stand-in-key"], base_url=stand_in.url)
+    pipeline = EnrichmentPipeline(interval=1, batch_size=args.batch_size, max_batches=1_000_000)
+    pipeline._client_factory = lambda: client
+
+    misses = quizzes_with_misses = 0
+    submit_seconds = []
+    last = None
+    try:
+        for _ in range(args.completions):
+            questions = rng.choices(pool, weights, k=args.questions)
+            answers = {str(i): ["B"] if rng.random() < args.miss_rate else ["A"] for i in range(len(questions))}
+            started = time.perf_counter()
+            missed = pipeline.submit("Concepts", "medium", questions, answers)
+            submit_seconds.append(time.perf_counter() - started)
+            misses += missed
+            quizzes_with_misses += bool(missed)
+            if missed:
+                last = (questions, answers)
+
+        started = time.perf_counter()
+        cycles = asyncio.run(pipeline.run_once())
+        elapsed = time.perf_counter() - started
+        explained = len(enrichments_for(*last)) if last else 0
+    finally:
+        stand_in.stop()
+        llm_ledger.stop()
+
+    metrics = pipeline.metrics()
+    unique = metrics["queued_total"]
+    print(f"{args.completions:,} completions, {misses:,} missed questions, {unique:,} unique")
+    print(f"submit() on the save path: p50 {percentile_us(submit_seconds, 50):.0f} µs, "
+          f"p99 {percentile_us(submit_seconds, 99):.0f} µs")
+    print(f"Enriched {metrics['enriched_total']:,} questions in {metrics['llm_calls_total']} LLM calls "
+          f"({elapsed:.1f}s, {cycles['retried']} retried, {cycles['failed']} failed)")
+    print(f"Inline enrichment would have taken {misses:,} calls per miss or {quizzes_with_misses:,} per quiz")
+    print(f"Last quiz with misses: {explained} explained question(s) in its details")
+
+    expected = math.ceil(unique / args.batch_size)
+    if metrics["enriched_total"] != unique or metrics["llm_calls_total"] > expected:
+        print(f"❌ Expected {unique} questions enriched in at most {expected} calls")
+        sys.exit(1)
+    print(f"✅ {misses / max(metrics['llm_calls_total'], 1):.0f} missed questions per LLM call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Export memory benchmark: peak Python memory while streaming a user's history.
+
+Seeds one user with N attempts in a throwaway SQLite database, then consumes
+the CSV and NDJSON export streams chunk by chunk and reports the tracemalloc
+peak. The peak should stay flat as N grows.
+
+Usage (from backend/):
+    python benchmarks/export_memory.py [--sizes 10 10000 200000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_db_dir = tempfile.mkdtemp(prefix="quiz-export-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from database import create_tables, engine  # noqa: E402
+from models import QuizAttempt, User  # noqa: E402
+from utils.export import ATTEMPT_COLUMNS, build_export_query, stream_export  # noqa: E402
+
+
+def seed(user_id, n):
+    started_at = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(delete(QuizAttempt))
+        for offset in range(0, n, 10_000):
+            conn.execute(insert(QuizAttempt), [
+                {
+                    "user_id": user_id, "topic": f"Topic {i % 50}", "difficulty": "medium", "status": "completed",
+                    "total_questions": 10, "correct_answers": i % 11, "incorrect_answers": 10 - i % 11,
+                    "score": float(i % 11), "percentage": (i % 11) * 10.0, "time_taken": 120,
+                    "started_at": started_at + timedelta(minutes=i), "completed_at": started_at + timedelta(minutes=i + 2),
+                }
+                for i in range(offset, min(n, offset + 10_000))
+            ])
+
+
+def measure(user_id, fmt):
+    query = build_export_query(user_id, "attempts")
+    tracemalloc.start()
+    started = time.perf_counter()
+    total_bytes = 0
+    for chunk in stream_export(query, fmt, ATTEMPT_COLUMNS):
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, total_bytes, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 10_000, 200_000])
+    args = parser.parse_args()
+
+    create_tables()
+    with engine.begin() as conn:
+        user_id = conn.execute(insert(User).values(
+            username="export", email="export@example.com", hashed_password="x")).inserted_primary_key[0]
+
+    print(f"{'attempts':>9} {'format':>7} {'output MB':>10} {'peak KB':>9} {'seconds':>8}")
+    for n in args.sizes:
+        seed(user_id, n)
+        for fmt in ("csv", "ndjson"):
+            peak, total_bytes, elapsed = measure(user_id, fmt)
+            print(f"{n:>9} {fmt:>7} {total_bytes / 1e6:>10.2f} {peak / 1024:>9.0f} {elapsed:>8.2f}")
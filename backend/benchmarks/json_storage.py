@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+JSON storage benchmark: plain JSON vs CompressedJSON quiz columns.
+
+Writes the same 50-question quizzes into two throwaway SQLite databases,
+one per column type, and compares file size, write time and read time.
+
+Usage (from backend/):
+    python benchmarks/json_storage.py [--quizzes 2000] [--questions 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import JSON, Column, Integer, MetaData, Table, create_engine, select  # noqa: E402
+
+from models.types import CompressedJSON, JSON_COMPRESSION  # noqa: E402
+
+WORDS = (
+    "the cell membrane protein energy function process system reaction value theory example result "
+    "structure change rate level model data form method effect cause number type order layer"
+).split()
+
+
+def sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def make_quiz(rng, questions):
+    data = [
+        {
+            "question": sentence(rng, 14) + "?",
+            "options": [sentence(rng, 5) for _ in range(4)],
+            "answers": [rng.choice("ABCD")],
+            "explanation": sentence(rng, 40) + ".",
+        }
+        for _ in range(questions)
+    ]
+    answers = {str(i): [rng.choice("ABCD")] for i in range(questions)}
+    return data, answers
+
+
+def run(column_type, quizzes):
+    path = os.path.join(tempfile.mkdtemp(prefix="quiz-json-"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    table = Table(
+        "quiz_attempts", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("questions_data", column_type),
+        Column("user_answers", column_type),
+    )
+    table.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for data, answers in quizzes:
+            conn.execute(table.insert().values(questions_data=data, user_answers=answers))
+    write_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        for row_id in range(1, len(quizzes) + 1):
+            conn.execute(select(table.c.questions_data, table.c.user_answers).where(table.c.id == row_id)).one()
+    read_ms = (time.perf_counter() - started) * 1000
+
+    engine.dispose()
+    return os.path.getsize(path), write_ms / len(quizzes), read_ms / len(quizzes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quizzes", type=int, default=2_000)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    quizzes = [make_quiz(rng, args.questions) for _ in range(args.quizzes)]
+
+    print(f"{args.quizzes} quizzes x {args.questions} questions, codec: {JSON_COMPRESSION}\n")
+    print(f"{'column type':<16} {'db size MB':>11} {'write ms/row':>13} {'read ms/row':>12}")
+    results = {}
+    for name, column_type in (("JSON", JSON), ("CompressedJSON", CompressedJSON)):
+        size, write_ms, read_ms = results[name] = run(column_type, quizzes)
+        print(f"{name:<16} {size / 1e6:>11.2f} {write_ms:>13.3f} {read_ms:>12.3f}")
+
+    print(f"\nSize ratio: {results['CompressedJSON'][0] / results['JSON'][0]:.1%} of plain JSON")
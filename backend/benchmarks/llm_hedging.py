@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tail latency of question generation with and without hedging, plus the
+deadline and circuit breaker, against the local Gemini stand-in server.
+
+The stand-in answers most calls in about 200 ms, but `--tail` of them take
+`--slow` seconds. The same paced load is sent with hedging off and on;
+with hedging, a call slower than the recent p95 is duplicated on another
+key and the first answer wins, which should cut p99 close to p95 at the
+cost of a few extra calls. Then every call is made slower than the
+deadline, and finally the stand-in fails every call until the breaker
+opens.
+
+Usage (from backend/):
+    python benchmarks/llm_hedging.py [--rate 20] [--duration 10] [--tail 0.03] [--slow 2.5]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# A short deadline so the deadline check does not take long; the slow tail stays within it
+os.environ.setdefault("LLM_DEADLINE_BASE", "3")
+os.environ.setdefault("LLM_DEADLINE_PER_QUESTION", "1.5")
+os.environ.setdefault("LLM_BREAKER_COOLDOWN", "5")
+# Stand-in calls take ~200 ms instead of seconds, so allow hedges well below the production floor
+os.environ.setdefault("LLM_HEDGE_MIN_DELAY", "0.05")
+
+from llm_key_pool import StandIn, run  # noqa: E402  (sets up the throwaway database first)
+
+
+def percentiles(latencies):
+    ordered = sorted(latencies)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99), "max": ordered[-1] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--keys", type=int, default=3)
+    parser.add_argument("--rate", type=float, default=20, help="offered calls per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load per run")
+    parser.add_argument("--tail", type=float, default=0.03, help="share of slow calls")
+    parser.add_argument("--slow", type=float, default=2.5, help="seconds a slow call takes")
+    args = parser.parse_args()
+
+    from database import create_tables
+    from utils.gemini_client import GeminiClient
+    from utils.llm_ledger import llm_ledger
+    from utils.llm_resilience import CircuitOpenError, LLMDeadlineExceeded, llm_hedges_total, request_deadline
+
+    def latency():
+        return args.slow if random.random() < args.tail else random.uniform(0.15, 0.25)
+
+    create_tables()
+    random.seed(7)
+    stand_in = StandIn(quota=10_000, latency=latency)
+    keys = [f"stand-in-key-{i}" for i in range(args.keys)]
+    failed = False
+    try:
+        print(f"{'hedging':<9}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'hedges':>8}{'won':>6}")
+        results = {}
+        for hedging in (False, True):
+            stand_in.reset()
+            client = GeminiClient(api_keys=keys, base_url=stand_in.url)
+            client.hedging.enabled = hedging
+
+            async def measure():
+                # Warm up first, so the hedge delay is already learned from recent latencies
+                await run(client, args.rate, 30 / args.rate)
+                before = llm_hedges_total.collect()
+                measured = await run(client, args.rate, args.duration)
+                after = llm_hedges_total.collect()
+                hedges = {r: after.get((r,), 0) - before.get((r,), 0) for r in ("fired", "won")}
+                return measured, hedges
+
+            (outcomes, _, latencies), hedges = asyncio.run(measure())
+            results[hedging] = stats = percentiles(latencies)
+            print(f"{'on' if hedging else 'off':<9}{outcomes['ok']:>7}{stats['p50']:>9.0f}{stats['p95']:>9.0f}"
+                  f"{stats['p99']:>9.0f}{stats['max']:>9.0f}{hedges['fired']:>8.0f}{hedges['won']:>6.0f}")
+        print(f"\np99 {results[False]['p99']:.0f} ms -> {results[True]['p99']:.0f} ms with hedging")
+        if results[True]["p99"] >= results[False]["p99"]:
+            print("❌ Hedging did not improve p99")
+            failed = True
+
+        # Deadline: every call is slower than the deadline
+        stand_in.latency = request_deadline(1) * 3
+        client = GeminiClient(api_keys=keys, base_url=stand_in.url)
+        started = time.perf_counter()
+        try:
+            asyncio.run(client.generate_questions("Astronomy", 1, "easy"))
+            print("❌ Generation finished despite every call being slower than the deadline")
+            failed = True
+        except LLMDeadlineExceeded as e:
+            print(f"Deadline: {e} (deadline {request_deadline(1):.1f}s, "
+                  f"returned after {time.perf_counter() - started:.1f}s)")
+
+        # Circuit breaker: the stand-in fails every call
+        stand_in.failing = True
+        client = GeminiClient(api_keys=keys, base_url=stand_in.url)
+
+        async def until_open():
+            errors = rejected = 0
+            for _ in range(30):
+                try:
+                    await client.generate_questions("Astronomy", 1, "easy")
+                except CircuitOpenError:
+                    rejected += 1
+                except Exception:
+                    errors += 1
+            return errors, rejected
+
+        errors, rejected = asyncio.run(until_open())
+        print(f"Breaker: {errors} failed calls reached the stand-in, then {rejected} were rejected "
+              f"without a call (state {client.breaker.state})")
+        if not rejected:
+            print("❌ The circuit breaker never opened")
+            failed = True
+    finally:
+        stand_in.stop()
+        llm_ledger.stop()
+
+    if failed:
+        sys.exit(1)
+    print("✅ Hedging cuts the tail, deadlines and the breaker fail fast")
+
+
+if __name__ == "__main__":
+    main()
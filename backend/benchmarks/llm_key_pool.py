@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Gemini key pool against a local stand-in server with per-key quotas.
+
+The stand-in speaks the generateContent REST API and allows `--quota`
+calls per key per second, answering 429 RESOURCE_EXHAUSTED beyond that.
+The same paced load (`--rate` calls per second for `--duration` seconds)
+is sent through a GeminiClient with one key and with `--keys` keys. The
+pooled run should spread calls over every key, take rate-limited keys out
+of rotation and serve the load a single key cannot, while reusing a few
+keep-alive connections per key.
+
+Usage (from backend/):
+    python benchmarks/llm_key_pool.py [--keys 3] [--quota 10] [--rate 25] [--duration 4]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Keep the ledger away from the real database; cool keys down for one quota window
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/llm_key_pool.db"
+os.environ.setdefault("LLM_KEY_COOLDOWN", "1")
+os.environ.setdefault("LLM_KEY_MAX_COOLDOWN", "4")
+os.environ["LLM_PARSE_RETRIES"] = "0"
+
+RESPONSE_TEXT = json.dumps({"questions": [{
+    "question": "Which planet is known as the Red Planet?",
+    "options": ["Venus", "Mars", "Jupiter", "Saturn"],
+    "answers": ["Mars"],
+    "explanation": "Iron oxide on its surface gives Mars its red colour.",
+}]})
+
+
+class StandIn:
+    """Threaded HTTP server imitating Gemini with a fixed-window quota per API key."""
+
+    def __init__(self, quota: int, latency):
+        self.quota = quota
+        self.latency = latency  # seconds, or a function returning seconds per call
+        self.aborted = 0  # responses the client no longer waited for
+        self.failing = False  # answer every call with a 500
+        self.windows = {}  # key -> (window second, calls in it)
+        self.served = Counter()
+        self.limited = Counter()
+        self.connections = 0
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is visible
+
+            def setup(self):
+                super().setup()
+                with stand_in.lock:
+                    stand_in.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("content-length", 0)))
+                status, body = stand_in.answer(self.headers.get("x-goog-api-key"))
+                payload = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("content-type", "application/json")
+                    self.send_header("content-length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    with stand_in.lock:
+                        stand_in.aborted += 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def answer(self, key):
+        if self.failing:
+            return 500, {"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}}
+        second = int(time.monotonic())
+        with self.lock:
+            window, calls = self.windows.get(key, (second, 0))
+            calls = calls + 1 if window == second else 1
+            self.windows[key] = (second, calls)
+            if calls > self.quota:
+                self.limited[key] += 1
+                return 429, {"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}
+            self.served[key] += 1
+        time.sleep(self.latency() if callable(self.latency) else self.latency)
+        return 200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": RESPONSE_TEXT}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 120, "candidatesTokenCount": 80, "totalTokenCount": 200},
+        }
+
+    def reset(self):
+        with self.lock:
+            self.windows.clear()
+            self.served.clear()
+            self.limited.clear()
+            self.connections = 0
+            self.aborted = 0
+
+    def stop(self):
+        self.server.shutdown()
+
+
+async def run(client, rate: float, duration: float):
+    """Send `rate` generations per second for `duration` seconds; returns outcomes, elapsed time and latencies."""
+    outcomes = Counter()
+    latencies = []
+    started = time.perf_counter()
+
+    async def call():
+        call_started = time.perf_counter()
+        try:
+            await client.generate_questions("Astronomy", 1, "easy")
+            outcomes["ok"] += 1
+        except Exception:
+            outcomes["failed"] += 1
+        latencies.append(time.perf_counter() - call_started)
+
+    calls = []
+    for i in range(int(rate * duration)):
+        # Pace calls evenly instead of bursting them all at once
+        delay = started + i / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        calls.append(asyncio.create_task(call()))
+    await asyncio.gather(*calls)
+    return outcomes, time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--keys", type=int, default=3)
+    parser.add_argument("--quota", type=int, default=10, help="calls per key per second")
+    parser.add_argument("--rate", type=float, default=25, help="offered calls per second")
+    parser.add_argument("--duration", type=float, default=4, help="seconds of load per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in response time in seconds")
+    args = parser.parse_args()
+
+    from database import create_tables
+    from utils.gemini_client import GeminiClient
+    from utils.llm_ledger import llm_ledger
+
+    create_tables()
+    stand_in = StandIn(args.quota, args.latency)
+    results = {}
+    try:
+        for keys in (1, args.keys):
+            stand_in.reset()
+            client = GeminiClient(api_keys=[f"stand-in-key-{i}" for i in range(keys)], base_url=stand_in.url)
+            outcomes, elapsed, _ = asyncio.run(run(client, args.rate, args.duration))
+            calls = sum(outcomes.values())
+            results[keys] = outcomes["ok"] / calls if calls else 0
+            print(f"{keys} key(s): {outcomes['ok']}/{calls} calls succeeded in {elapsed:.1f}s "
+                  f"({outcomes['ok'] / elapsed:.1f}/s), {stand_in.connections} connections opened")
+            for i in range(keys):
+                key = f"stand-in-key-{i}"
+                print(f"    key{i}: {stand_in.served[key]} served, {stand_in.limited[key]} rate limited")
+    finally:
+        stand_in.stop()
+        llm_ledger.stop()
+
+    capacity = min(1.0, args.keys * args.quota / args.rate)
+    print(f"\nSuccess rate: 1 key {results[1]:.0%}, {args.keys} keys {results[args.keys]:.0%} "
+          f"(quota allows {capacity:.0%})")
+    if results[args.keys] <= results[1]:
+        print("❌ The key pool did not serve more calls than a single key")
+        sys.exit(1)
+    print("✅ The key pool spreads load over its keys")
+
+
+if __name__ == "__main__":
+    main()
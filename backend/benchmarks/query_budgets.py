@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Query budget check for the dashboard, profile and auth endpoints.
+
+Runs the app in-process against a throwaway SQLite database with
+SQL_PROFILING enabled and fails if any endpoint issues more statements
+than its budget, or repeats the same statement (N+1).
+
+Usage (from backend/):
+    python benchmarks/query_budgets.py
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_db_dir = tempfile.mkdtemp(prefix="quiz-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ["SQL_PROFILING"] = "1"
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+# Maximum SQL statements per request
+QUERY_BUDGETS = {
+    ("GET", "/auth/me"): 1,
+    ("GET", "/profile/me"): 1,
+    ("GET", "/profile/stats"): 3,
+    ("GET", "/profile/preferences"): 4,  # first call inserts the defaults
+    ("GET", "/dashboard/stats"): 4,
+    ("GET", "/dashboard/history"): 2,
+    ("GET", "/dashboard/ongoing"): 2,
+    ("GET", "/dashboard/performance-by-category"): 2,
+    ("GET", "/dashboard/progress"): 4,
+    ("GET", "/dashboard/quiz/{quiz_id}"): 3,  # completed quizzes also look up enrichments of missed questions
+    ("GET", "/dashboard/resume/{quiz_id}"): 2,
+    ("GET", "/dashboard/search"): 3,
+    ("GET", "/dashboard/review"): 3,  # plus the next due time when nothing is due
+    ("POST", "/dashboard/review"): 3,
+    # Saves of a new topic also look it up and insert it (the first save also loads the topic index);
+    # both also insert the attempt's search index rows
+    ("POST", "/dashboard/save-state"): 7,
+    ("POST", "/dashboard/save-quiz"): 9,  # plus the daily progress and review queue upserts
+}
+
+SAMPLE_QUESTIONS = [
+    {
+        "question": f"Sample question {i}?",
+        "options": ["A", "B", "C", "D"],
+        "answers": ["A"],
+        "explanation": "Because A.",
+    }
+    for i in range(10)
+]
+
+
+def parse_profile(header: str) -> dict:
+    fields = dict(part.strip().split("=") for part in header.split(";"))
+    return {"count": int(fields["count"]), "time_ms": float(fields["time_ms"]), "repeated": int(fields["repeated"])}
+
+
+def run():
+    results = []
+
+    with TestClient(main.app) as client:
+        def call(method, template, path, **kwargs):
+            response = client.request(method, path, **kwargs)
+            assert response.status_code < 400, f"{method} {path} -> {response.status_code}: {response.text}"
+            profile = parse_profile(response.headers["x-query-profile"])
+            results.append((method, template, profile))
+            return response
+
+        client.post("/auth/register", json={"username": "bench", "email": "bench@example.com", "password": "bench-pass"})
+        token = client.post("/auth/login", json={"username": "bench", "password": "bench-pass"}).json()["access_token"]
+        params = {"token": token}
+
+        # Seed a few completed and ongoing attempts
+        for i in range(5):
+            call("POST", "/dashboard/save-quiz", "/dashboard/save-quiz", params=params, json={
+                "topic": f"Topic {i % 2}", "difficulty": "medium", "total_questions": 10,
+                "correct_answers": 7, "percentage": 70.0, "time_taken": 120,
+            })
+        quiz_id = call("POST", "/dashboard/save-state", "/dashboard/save-state", params=params, json={
+            "topic": "Ongoing", "difficulty": "easy", "total_questions": 10,
+            "questions_data": SAMPLE_QUESTIONS, "user_answers": {}, "time_taken": 0,
+        }).json()["quiz_id"]
+        call("POST", "/dashboard/save-state", "/dashboard/save-state", params=params, json={
+            "quiz_id": quiz_id, "current_question_index": 3,
+            "questions_data": SAMPLE_QUESTIONS, "user_answers": {"0": ["A"]}, "time_taken": 30,
+        })
+        # One completed through its quiz session, with a missed question to look up enrichments for
+        completed_id = call("POST", "/dashboard/save-state", "/dashboard/save-state", params=params, json={
+            "topic": "Completed", "difficulty": "easy", "total_questions": 10,
+            "questions_data": SAMPLE_QUESTIONS, "user_answers": {"0": ["A"], "1": ["B"]}, "time_taken": 0,
+        }).json()["quiz_id"]
+        call("POST", "/dashboard/save-quiz", "/dashboard/save-quiz", params=params, json={
+            "quiz_id": completed_id, "topic": "Completed", "difficulty": "easy", "total_questions": 10,
+            "correct_answers": 1, "percentage": 10.0, "time_taken": 60,
+        })
+
+        call("GET", "/auth/me", "/auth/me", headers={"Authorization": f"Bearer {token}"})
+        call("GET", "/profile/me", "/profile/me", params=params)
+        call("GET", "/profile/stats", "/profile/stats", params=params)
+        call("GET", "/profile/preferences", "/profile/preferences", params=params)
+        call("GET", "/dashboard/stats", "/dashboard/stats", params=params)
+        call("GET", "/dashboard/history", "/dashboard/history", params=params)
+        call("GET", "/dashboard/ongoing", "/dashboard/ongoing", params=params)
+        call("GET", "/dashboard/performance-by-category", "/dashboard/performance-by-category", params=params)
+        call("GET", "/dashboard/progress", "/dashboard/progress", params=params)
+        call("GET", "/dashboard/quiz/{quiz_id}", f"/dashboard/quiz/{quiz_id}", params=params)
+        call("GET", "/dashboard/quiz/{quiz_id}", f"/dashboard/quiz/{completed_id}", params=params)
+        call("GET", "/dashboard/resume/{quiz_id}", f"/dashboard/resume/{quiz_id}", params=params)
+        call("GET", "/dashboard/search", "/dashboard/search", params={**params, "q": "sample question"})
+        due = call("GET", "/dashboard/review", "/dashboard/review", params=params).json()["questions"]
+        call("POST", "/dashboard/review", "/dashboard/review", params=params, json={
+            "answers": [{"review_id": item["review_id"], "answer": item["answers"]} for item in due],
+        })
+        call("GET", "/dashboard/review", "/dashboard/review", params=params)
+
+    failures = 0
+    seen = set()
+    print(f"{'endpoint':<50} {'queries':>8} {'budget':>7} {'db ms':>8}")
+    print("-" * 77)
+    for method, template, profile in results:
+        key = (method, template)
+        budget = QUERY_BUDGETS.get(key)
+        over = budget is not None and profile["count"] > budget
+        failed = over or profile["repeated"] > 0
+        failures += failed
+        if key in seen and not failed:
+            continue
+        seen.add(key)
+        marker = "❌" if failed else "✅"
+        note = " (repeated statements)" if profile["repeated"] else ""
+        print(f"{marker} {method + ' ' + template:<48} {profile['count']:>8} {budget if budget is not None else '-':>7} "
+              f"{profile['time_ms']:>8.2f}{note}")
+
+    if failures:
+        print(f"\n❌ {failures} request(s) over budget")
+        return 1
+    print("\n✅ All endpoints within their query budgets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Due-review query latency over a large synthetic dataset.
+
+Reads the review_items queue of `--database-url` (normally filled by
+benchmarks/synthetic_data.py, which queues every missed question of the
+completed attempts that kept their questions) for four users picked by
+attempt count: the lightest, the median, the p99 and the heaviest. For
+each it times the "next `--limit` due reviews" query behind
+GET /dashboard/review and grading a full review quiz, `--repeat` times,
+and prints the query plan of the due query, which should be a single
+range scan of ix_review_items_due. An empty queue is filled first.
+
+Usage (from backend/):
+    python benchmarks/review_queue.py [--database-url URL] [--repeat 50] [--limit 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BACKEND_DIR, 'synthetic.db')}"
+
+
+def percentile_ms(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.getenv("SYNTHETIC_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--repeat", type=int, default=50, help="runs per query and user")
+    parser.add_argument("--limit", type=int, default=20, help="reviews per quiz")
+    args = parser.parse_args()
+
+    # The app modules read this at import time
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import func, select
+
+    from dashboard_queries import pick_users
+    from database import SessionLocal, create_tables, engine
+    from models import ReviewItem
+    from utils.review import backfill_review_items, due_reviews, grade_reviews
+
+    create_tables()
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+    db = SessionLocal()
+    try:
+        items = db.execute(select(func.count(ReviewItem.id))).scalar()
+        if not items:
+            print("Queueing missed questions for review...")
+            started = time.perf_counter()
+            backfill_review_items(db)
+            items = db.execute(select(func.count(ReviewItem.id))).scalar()
+            print(f"  {items:,} review items in {time.perf_counter() - started:.1f}s")
+        print(f"Review items: {items:,}")
+
+        if engine.dialect.name == "sqlite":
+            plan = db.connection().exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id, question FROM review_items "
+                "WHERE user_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?", (1, datetime.utcnow(), args.limit)
+            ).all()
+            print("Due query plan: " + "; ".join(row[-1] for row in plan))
+
+        worst = 0.0
+        print(f"\n{'user':<10}{'attempts':>10}{'queued':>8}{'due':>6}{'due p50':>10}{'due p95':>10}{'grade p95':>11}")
+        for label, (user_id, username, attempts) in pick_users(engine).items():
+            queued = db.execute(select(func.count(ReviewItem.id)).where(ReviewItem.user_id == user_id)).scalar()
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                due = due_reviews(db, user_id, args.limit)
+                samples.append(time.perf_counter() - started)
+            # Grade the quiz without committing, so every run sees the same queue
+            grading = []
+            for _ in range(max(1, args.repeat // 5)):
+                started = time.perf_counter()
+                grade_reviews(db, user_id, [{"review_id": item["review_id"], "answer": item["answers"]} for item in due])
+                db.flush()
+                grading.append(time.perf_counter() - started)
+                db.rollback()
+            worst = max(worst, percentile_ms(samples, 95))
+            print(f"{label:<10}{attempts:>10,}{queued:>8,}{len(due):>6}{percentile_ms(samples, 50):>9.2f}ms"
+                  f"{percentile_ms(samples, 95):>9.2f}ms{percentile_ms(grading, 95):>10.2f}ms")
+    finally:
+        db.close()
+    print(f"\nSlowest due-query p95: {worst:.2f} ms, no LLM call per review quiz")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Broadcast latency of a live quiz room with many sockets.
+
+Starts the app under uvicorn on a throwaway database, opens a room with
+`--questions` questions and connects a host and `--sockets` players over
+real WebSockets from this process. For each question the host sends
+"next" and every player records when the question arrives, then answers
+it at once (so answers, scoreboard updates, the early reveal and the
+per-player results all flow too). Latency is measured from the host's
+send to each player's receipt; both ends share this machine's clock.
+The server's own fan-out time (serializing once and queueing the text
+on every socket) comes from its room_broadcast_seconds histogram.
+
+Usage (from backend/):
+    python benchmarks/room_broadcast.py [--sockets 1000] [--questions 5] [--port 8765]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile_ms(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000
+
+
+def start_server(port: int, sockets: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/room_broadcast.db",
+        "GOOGLE_API_KEY": "benchmark-placeholder",
+        "LLM_WARMUP": "0",
+        "RETENTION_INTERVAL": "0",
+        "ROOM_MAX_PLAYERS": str(sockets),
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit("Server did not start")
+
+
+class Player:
+    def __init__(self, name: str, token: str):
+        self.name = name
+        self.token = token
+        self.received = {}  # question index -> time.time() it arrived
+        self.results = 0
+
+
+async def play(url: str, player: Player, ready: asyncio.Event, connected: list, finished: asyncio.Event):
+    import websockets
+
+    async with websockets.connect(url, max_queue=None, ping_interval=None) as ws:
+        connected.append(player)
+        ready.set()
+        async for raw in ws:
+            message = json.loads(raw)
+            if message["type"] == "question":
+                player.received[message["index"]] = time.time()
+                await ws.send(json.dumps({"type": "answer", "question": message["index"],
+                                          "selected": [random.choice(message["options"])]}))
+            elif message["type"] == "result":
+                player.results += 1
+            elif message["type"] == "finished":
+                finished.set()
+                return
+
+
+async def run(args, base_url: str):
+    import websockets
+    from auth_utils import create_access_token
+
+    questions = [
+        {"question": f"Benchmark question {i}?", "options": ["A", "B", "C", "D"], "answers": ["A"],
+         "explanation": "Because A."}
+        for i in range(args.questions)
+    ]
+    host_token = create_access_token({"sub": "host"})
+    request = urllib.request.Request(
+        f"http://{base_url}/rooms?token={host_token}", method="POST",
+        data=json.dumps({"questions": questions, "question_seconds": 60}).encode(),
+        headers={"Content-Type": "application/json"})
+    code = json.loads(urllib.request.urlopen(request).read())["code"]
+
+    players = [Player(f"player{i}", create_access_token({"sub": f"player{i}"})) for i in range(args.sockets)]
+    connected, finished = [], asyncio.Event()
+    tasks = []
+    started = time.perf_counter()
+    for player in players:
+        ready = asyncio.Event()
+        tasks.append(asyncio.create_task(
+            play(f"ws://{base_url}/rooms/{code}/ws?token={player.token}", player, ready, connected, finished)))
+        await ready.wait()
+    print(f"Connected {len(connected):,} players in {time.perf_counter() - started:.1f}s")
+
+    sent = {}
+    async with websockets.connect(f"ws://{base_url}/rooms/{code}/ws?token={host_token}",
+                                  max_queue=None, ping_interval=None) as host:
+        for index in range(args.questions + 1):
+            await asyncio.sleep(0.5)  # let the lobby and scoreboard updates settle
+            sent[index] = time.time()
+            await host.send(json.dumps({"type": "next"}))
+            if index == args.questions:
+                break
+            # The reveal comes once every player has answered
+            async for raw in host:
+                if json.loads(raw)["type"] == "reveal":
+                    break
+        await asyncio.wait_for(finished.wait(), 60)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    latencies = [at - sent[index] for player in players for index, at in player.received.items()]
+    missing = args.sockets * args.questions - len(latencies)
+    results = sum(player.results for player in players)
+    return latencies, missing, results
+
+
+def server_fanout(base_url: str):
+    text = urllib.request.urlopen(f"http://{base_url}/metrics").read().decode()
+    total = re.search(r"^room_broadcast_seconds_sum (\S+)", text, re.M)
+    count = re.search(r"^room_broadcast_seconds_count (\S+)", text, re.M)
+    if not total or not count or not float(count.group(1)):
+        return None, 0
+    return float(total.group(1)) / float(count.group(1)), int(float(count.group(1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sockets", type=int, default=1000, help="connected players")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    random.seed(7)
+    server = start_server(args.port, args.sockets)
+    base_url = f"127.0.0.1:{args.port}"
+    try:
+        latencies, missing, results = asyncio.run(run(args, base_url))
+        fanout, broadcasts = server_fanout(base_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{args.questions} questions to {args.sockets:,} sockets: {len(latencies):,} deliveries, "
+          f"{missing} missing, {results:,} per-player results")
+    print(f"Question latency: p50 {percentile_ms(latencies, 50):.1f} ms, p95 {percentile_ms(latencies, 95):.1f} ms, "
+          f"p99 {percentile_ms(latencies, 99):.1f} ms, max {max(latencies) * 1000:.1f} ms")
+    if fanout is not None:
+        print(f"Server fan-out per broadcast: {fanout * 1000:.2f} ms on average over {broadcasts} broadcasts")
+
+    if missing or results != args.sockets * args.questions:
+        print("❌ Some players missed a question or a result")
+        sys.exit(1)
+    print(f"✅ Every socket got every question; p99 {percentile_ms(latencies, 99):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
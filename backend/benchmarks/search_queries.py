@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Full-text search latency over a large synthetic dataset.
+
+Searches the quiz_search index of `--database-url` (normally filled by
+benchmarks/synthetic_data.py, which also builds the index) for four users
+picked by attempt count: the lightest, the median, the p99 and the
+heaviest. Each query runs `--repeat` times and is reported as p50/p95/max
+with the number of hits on the page. The synthetic questions are drawn
+from a few dozen words, so single-word queries match most of a user's
+questions; they are the worst case for ranking, not the typical one.
+
+`--rebuild` (or an empty index) rebuilds the index first and reports the
+indexing rate.
+
+Usage (from backend/):
+    python benchmarks/search_queries.py [--database-url URL] [--repeat 20] [--rebuild]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BACKEND_DIR, 'synthetic.db')}"
+
+# (name, query, outcome, offset); "{topic}" is a word of the user's most frequent topic
+QUERIES = [
+    ("one common word", "process", None, 0),
+    ("two words", "memory protocol", None, 0),
+    ("three words", "energy signal boundary", None, 0),
+    ("phrase-like question", "which of the following best describes", None, 0),
+    ("topic word", "{topic}", None, 0),
+    ("wrong answers only", "network", "wrong", 0),
+    ("page 10", "process", None, 200),
+    ("no match", "recursion", None, 0),
+]
+
+
+def percentile_ms(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1000
+
+
+def topic_word(engine, user_id):
+    from sqlalchemy import func, select
+
+    from models import QuizAttempt
+
+    with engine.connect() as conn:
+        topic = conn.execute(
+            select(QuizAttempt.topic).where(QuizAttempt.user_id == user_id)
+            .group_by(QuizAttempt.topic).order_by(func.count().desc()).limit(1)
+        ).scalar()
+    return (topic or "quiz").split()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.getenv("SYNTHETIC_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query and user")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index before searching")
+    args = parser.parse_args()
+
+    # The app modules read this at import time
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import text
+
+    from dashboard_queries import pick_users
+    from database import SessionLocal, create_tables, engine
+    from utils.search import backfill_search_index, search_attempts, search_supported
+
+    if not search_supported(engine):
+        sys.exit(f"Search is not available on {engine.dialect.name}")
+    create_tables()
+    print(f"Database: {engine.url.render_as_string(hide_password=True)} ({engine.dialect.name})")
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT COUNT(*) FROM quiz_search")).scalar()
+    if args.rebuild or not rows:
+        print("Building the search index...")
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            indexed = backfill_search_index(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT COUNT(*) FROM quiz_search")).scalar()
+        print(f"  {indexed:,} attempts, {rows:,} index rows in {elapsed:.1f}s "
+              f"({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    print(f"Index rows: {rows:,}")
+    if engine.dialect.name == "sqlite" and engine.url.database:
+        print(f"Database size: {os.path.getsize(engine.url.database) / 1e6:,.1f} MB")
+
+    worst = 0.0
+    db = SessionLocal()
+    try:
+        for label, (user_id, username, attempts) in pick_users(engine).items():
+            word = topic_word(engine, user_id)
+            print(f"\n{label} user ({username}, {attempts:,} attempts)")
+            print(f"  {'query':<24}{'hits':>6}{'p50':>9}{'p95':>9}{'max':>9}")
+            for name, query, outcome, offset in QUERIES:
+                query = query.format(topic=word)
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    hits = search_attempts(db, user_id, query, outcome=outcome, limit=args.limit, offset=offset)
+                    samples.append(time.perf_counter() - started)
+                worst = max(worst, percentile_ms(samples, 95))
+                print(f"  {name:<24}{len(hits):>6}{percentile_ms(samples, 50):>9.1f}"
+                      f"{percentile_ms(samples, 95):>9.1f}{max(samples) * 1000:>9.1f}")
+    finally:
+        db.close()
+    print(f"\nSlowest p95: {worst:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
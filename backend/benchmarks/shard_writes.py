@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Write throughput of quiz state saves with one database and with shards.
+
+Each run starts `--workers` processes, like uvicorn workers, each with the
+app in-process. They save quiz state (POST /dashboard/save-state) for their
+own tenants as fast as they can for `--duration` seconds. With one SQLite
+file every commit takes the same write lock; with `--shards` files the
+tenants are spread over separate locks, so throughput should grow with the
+shard count until the CPU is the limit. `--direct` skips HTTP and writes
+through the live quiz session's write path, which needs far less CPU per
+save, so the database is the limit sooner. The databases live in a
+temporary directory on the same disk as this checkout, so commits pay a
+real fsync.
+
+Usage (from backend/):
+    python benchmarks/shard_writes.py [--shards 4] [--workers 8] [--tenants 64] [--duration 10] [--direct]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    {"question": f"Benchmark question {i}?", "options": ["A", "B", "C", "D"], "answers": ["A"],
+     "explanation": "Because A."}
+    for i in range(10)
+]
+
+
+def configure(directory: str, shards: int):
+    """Point this process at the run's databases; must happen before the app is imported."""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'main.db')}"
+    os.environ["SHARD_COUNT"] = str(shards)
+    os.environ["SHARD_URL_TEMPLATE"] = f"sqlite:///{os.path.join(directory, 'shard{n}.db')}"
+    os.environ["GOOGLE_API_KEY"] = "benchmark-placeholder"
+    os.environ["LLM_WARMUP"] = "0"
+    os.environ["RETENTION_INTERVAL"] = "0"
+
+
+def setup(directory: str, shards: int, tenants: int):
+    """Register the tenants and start one quiz each; returns [(username, token, user_id, quiz_id)]."""
+    configure(directory, shards)
+    from fastapi.testclient import TestClient
+
+    import main
+
+    quizzes = []
+    with TestClient(main.app) as client:
+        for i in range(tenants):
+            username = f"tenant{i}"
+            client.post("/auth/register", json={"username": username, "email": f"{username}@example.com",
+                                                "password": "bench-pass"}).raise_for_status()
+            token = client.post("/auth/login", json={"username": username, "password": "bench-pass"}).json()["access_token"]
+            quiz_id = client.post("/dashboard/save-state", params={"token": token}, json={
+                "topic": "Benchmark", "difficulty": "easy", "total_questions": len(QUESTIONS),
+                "questions_data": QUESTIONS, "user_answers": {}, "time_taken": 0,
+            }).json()["quiz_id"]
+            user_id = client.get("/profile/me", params={"token": token}).json()["id"]
+            quizzes.append((username, token, user_id, quiz_id))
+        from utils.sharding import shard_router
+        spread = [shard["users"] for shard in shard_router.status()]
+    return quizzes, spread
+
+
+def worker(directory: str, shards: int, quizzes, ready, duration: float, direct: bool):
+    """Save state round-robin over this worker's quizzes once every worker is up; returns (saves, errors)."""
+    configure(directory, shards)
+    from fastapi.testclient import TestClient
+
+    import main
+    from utils.quiz_sessions import _write_state
+
+    saves = errors = 0
+    with TestClient(main.app) as client:
+        ready.wait()
+        started = time.time()
+        step = 0
+        while time.time() < started + duration:
+            username, token, user_id, quiz_id = quizzes[step % len(quizzes)]
+            step += 1
+            state = {
+                "quiz_id": quiz_id, "current_question_index": step % len(QUESTIONS),
+                "user_answers": {str(step % len(QUESTIONS)): ["A"]}, "time_taken": step,
+            }
+            if direct:
+                try:
+                    _write_state(username, user_id, state)
+                    saves += 1
+                except Exception:
+                    errors += 1
+                continue
+            response = client.post("/dashboard/save-state", params={"token": token}, json=state)
+            if response.status_code == 200:
+                saves += 1
+            else:
+                errors += 1
+    return saves, errors
+
+
+def run(shards: int, args) -> float:
+    directory = tempfile.mkdtemp(prefix="shard-writes-", dir=BACKEND_DIR)
+    context = multiprocessing.get_context("spawn")
+    try:
+        with context.Pool(1) as pool:
+            quizzes, spread = pool.apply(setup, (directory, shards, args.tenants))
+        with context.Manager() as manager, context.Pool(args.workers) as pool:
+            # Importing the app takes a while; start writing only once every worker has
+            ready = manager.Barrier(args.workers)
+            results = pool.starmap(worker, [
+                (directory, shards, quizzes[i::args.workers], ready, args.duration, args.direct)
+                for i in range(args.workers)
+            ])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    saves = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    rate = saves / args.duration
+    print(f"{shards:>6}{rate:>12.0f}{errors:>9}   tenants per shard {spread}")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8, help="processes writing at once")
+    parser.add_argument("--tenants", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10, help="seconds of writes per run")
+    parser.add_argument("--direct", action="store_true", help="write without the HTTP layer")
+    args = parser.parse_args()
+
+    print(f"{args.workers} worker processes, {args.tenants} tenants, {os.cpu_count()} CPU(s), "
+          f"{'direct writes' if args.direct else 'POST /dashboard/save-state'}")
+    print(f"{'shards':>6}{'saves/s':>12}{'errors':>9}")
+    single = run(1, args)
+    sharded = run(args.shards, args)
+    print(f"\n{sharded / single:.2f}x the write throughput with {args.shards} shards")
+    if (os.cpu_count() or 1) < args.workers:
+        # Workers share too few cores; beyond that point more write locks cannot help
+        print("⚠️  Fewer CPUs than workers: the runs are CPU bound, not lock bound")
+        return
+    if sharded <= single:
+        print("❌ Sharding did not raise write throughput")
+        sys.exit(1)
+    print("✅ Writes scale with the shard count")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Startup profile: import-time breakdown of `main` and time to first request.
+
+Each measurement runs in a fresh interpreter so module caches do not skew
+the numbers. Time to first request covers interpreter start, importing the
+app, running the lifespan startup and serving GET /health.
+
+Usage (from backend/):
+    python benchmarks/startup_profile.py [--top 15] [--target-ms 1500]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_REQUEST_SCRIPT = """
+import time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+import main
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    client.get("/health")
+    served = time.perf_counter()
+print(f"{(imported - started) * 1000:.1f} {(ready - imported) * 1000:.1f} {(served - ready) * 1000:.1f}")
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "startup-profile-placeholder")
+    # Measure the web tier only; the LLM client warms up in the background anyway
+    env["LLM_WARMUP"] = "0"
+    return env
+
+
+def import_breakdown(top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True, check=True
+    )
+
+    direct = []  # modules imported directly by main
+    by_package = defaultdict(int)  # self time per top-level package
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        self_us, cumulative_us = int(self_us), int(cumulative_us)
+        # Names are indented two spaces per nesting level, after one separator space
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        module = name.strip()
+        by_package[module.split(".")[0]] += self_us
+        if module == "main":
+            total_us = cumulative_us
+        elif depth == 1:
+            direct.append((cumulative_us, module))
+
+    print(f"Import of main: {total_us / 1000:.1f} ms\n")
+    print("Slowest direct imports of main (cumulative):")
+    for cumulative_us, module in sorted(direct, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:>9.1f} ms  {module}")
+    print("\nSelf time by top-level package:")
+    for package, self_us in sorted(by_package.items(), key=lambda x: x[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:>9.1f} ms  {package}")
+
+
+def first_request():
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST_SCRIPT],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    import_ms, startup_ms, request_ms = (float(v) for v in result.stdout.split()[-3:])
+    print("\nTime to first request:")
+    print(f"  import app        {import_ms:>9.1f} ms")
+    print(f"  lifespan startup  {startup_ms:>9.1f} ms")
+    print(f"  first GET /health {request_ms:>9.1f} ms")
+    print(f"  total (wall)      {wall_ms:>9.1f} ms")
+    return wall_ms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--target-ms", type=float, default=float(os.getenv("STARTUP_TARGET_MS", "1500")))
+    args = parser.parse_args()
+
+    import_breakdown(args.top)
+    wall_ms = first_request()
+
+    if wall_ms > args.target_ms:
+        print(f"\n❌ Time to first request {wall_ms:.0f} ms exceeds target {args.target_ms:.0f} ms")
+        sys.exit(1)
+    print(f"\n✅ Time to first request within target ({args.target_ms:.0f} ms)")
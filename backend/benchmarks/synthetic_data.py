@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Seeded synthetic dataset for query benchmarks at realistic scale.
+
+Fills users (with preferences), canonical topics, quiz_attempts and
+question_answers with bulk inserts of `--batch-size` rows per transaction,
+then rebuilds the per-user daily progress series and the search index and
+queues missed questions for review.
+Attempts per user follow a long-tailed distribution (a few heavy users own
+a large share), topic popularity is Zipf-like, and ongoing attempts (plus
+completed ones that were started through save-state) carry questions_data
+of realistic size.
+The same --seed always produces the same data.
+
+Every user's password is `synthetic-pass`. The target defaults to a
+separate synthetic.db so the dev database is never touched.
+
+Usage (from backend/):
+    python benchmarks/synthetic_data.py --scale small|medium|large [--database-url URL]
+    python benchmarks/synthetic_data.py --users 10000 --attempts 10000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BACKEND_DIR, 'synthetic.db')}"
+PASSWORD = "synthetic-pass"
+
+# (users, attempts)
+SCALES = {
+    "small": (1_000, 100_000),
+    "medium": (10_000, 1_000_000),
+    "large": (10_000, 10_000_000),
+}
+
+STATUSES = (("completed", 85), ("abandoned", 10), ("ongoing", 5))
+DIFFICULTIES = (("easy", 30), ("medium", 50), ("hard", 20))
+QUESTION_COUNTS = ((5, 45), (10, 35), (15, 12), (20, 8))
+WORDS = (
+    "which of the following best describes how a process value system function result method "
+    "structure element reaction theory model signal period force energy layer protocol cell "
+    "market equation variable pattern network memory interface boundary evidence principle"
+).split()
+
+
+def weighted(pairs):
+    values, weights = zip(*pairs)
+    return values, list(accumulate(weights))
+
+
+def sentence(rng, words):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:]
+
+
+def question_pool(rng, size=2000):
+    """Question dicts shaped like generated ones (about 500 bytes of JSON each)."""
+    pool = []
+    for _ in range(size):
+        options = [sentence(rng, rng.randint(2, 6)) for _ in range(4)]
+        pool.append({
+            "question": sentence(rng, rng.randint(10, 22)) + "?",
+            "options": options,
+            "answers": rng.sample(options, 1 if rng.random() < 0.7 else 2),
+            "explanation": sentence(rng, rng.randint(18, 32)) + ".",
+        })
+    return pool
+
+
+def make_users(rng, count, first_id, hashed_password, now):
+    users, preferences = [], []
+    for user_id in range(first_id, first_id + count):
+        created = now - timedelta(days=rng.uniform(30, 730))
+        users.append({
+            "id": user_id, "username": f"synthetic_{user_id}", "email": f"synthetic_{user_id}@example.com",
+            "hashed_password": hashed_password, "is_active": True, "created_at": created, "updated_at": created,
+        })
+        if rng.random() < 0.8:
+            preferences.append({
+                "user_id": user_id, "preferred_categories": [], "notifications_enabled": rng.random() < 0.7,
+                "default_difficulty": rng.choice(("easy", "medium", "hard")),
+            })
+    return users, preferences
+
+
+def make_attempts(rng, count, first_id, user_ids, user_weights, skill, topics, topic_weights, pool, days, now,
+                  answers_fraction, questions_fraction):
+    """One batch of attempts, plus question_answers rows for a share of the completed ones."""
+    statuses, status_weights = weighted(STATUSES)
+    difficulties, difficulty_weights = weighted(DIFFICULTIES)
+    sizes, size_weights = weighted(QUESTION_COUNTS)
+    owners = rng.choices(user_ids, cum_weights=user_weights, k=count)
+    picked_topics = rng.choices(topics, cum_weights=topic_weights, k=count)
+
+    attempts, answers = [], []
+    for offset, (user_id, (topic_id, topic_name)) in enumerate(zip(owners, picked_topics)):
+        attempt_id = first_id + offset
+        status = rng.choices(statuses, cum_weights=status_weights)[0]
+        difficulty = rng.choices(difficulties, cum_weights=difficulty_weights)[0]
+        total = rng.choices(sizes, cum_weights=size_weights)[0]
+        started = now - timedelta(seconds=rng.uniform(0, days * 86400))
+
+        with_questions = status == "ongoing" or (status == "completed" and rng.random() < questions_fraction)
+        questions = rng.sample(pool, total) if with_questions else None
+        p_correct = max(0.05, min(0.98, skill[user_id] - {"easy": -0.1, "medium": 0.0, "hard": 0.15}[difficulty]))
+        answered = total if status == "completed" else rng.randint(0, total - 1)
+        outcomes = [rng.random() < p_correct for _ in range(answered)]
+        correct = sum(outcomes)
+        time_taken = sum(rng.randint(15, 60) for _ in range(max(answered, 1)))
+
+        user_answers = {}
+        if questions:
+            for index, is_correct in enumerate(outcomes):
+                q = questions[index]
+                user_answers[str(index)] = q["answers"] if is_correct else [rng.choice(q["options"])]
+
+        completed = status == "completed"
+        attempts.append({
+            "id": attempt_id, "user_id": user_id, "topic": topic_name, "topic_id": topic_id,
+            "difficulty": difficulty, "total_questions": total, "status": status, "version": 1,
+            "current_question_index": min(answered, total - 1),
+            "questions_data": questions if status != "abandoned" else None,
+            "user_answers": user_answers,
+            "score": float(correct) if completed else 0.0,
+            "percentage": correct / total * 100 if completed else 0.0,
+            "correct_answers": correct if completed else 0,
+            "incorrect_answers": total - correct if completed else 0,
+            "started_at": started,
+            "completed_at": started + timedelta(seconds=time_taken) if completed else None,
+            "updated_at": started + timedelta(seconds=time_taken),
+            "time_taken": time_taken,
+        })
+
+        if completed and questions and rng.random() < answers_fraction:
+            for index, (q, is_correct) in enumerate(zip(questions, outcomes)):
+                answers.append({
+                    "quiz_attempt_id": attempt_id, "question_index": index, "question_text": q["question"],
+                    "user_answer": user_answers[str(index)], "correct_answer": q["answers"],
+                    "is_correct": is_correct, "explanation": q["explanation"], "reference_links": [],
+                    "time_spent": rng.randint(15, 60),
+                })
+    return attempts, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--users", type=int, help="overrides the scale's user count")
+    parser.add_argument("--attempts", type=int, help="overrides the scale's attempt count")
+    parser.add_argument("--topics", type=int, default=2_000)
+    parser.add_argument("--days", type=int, default=365, help="attempts are spread over this many days")
+    parser.add_argument("--questions-fraction", type=float, default=0.6,
+                        help="share of completed attempts that keep their questions_data")
+    parser.add_argument("--answers-fraction", type=float, default=0.05,
+                        help="share of those that also have question_answers rows")
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=os.getenv("SYNTHETIC_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--skip-derived", action="store_true", help="do not rebuild user_daily_progress, the search index and review items")
+    args = parser.parse_args()
+
+    users_count = args.users or SCALES[args.scale][0]
+    attempts_count = args.attempts or SCALES[args.scale][1]
+
+    # The app modules read DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = args.database_url
+    from sqlalchemy import func, insert, select, text
+
+    from auth_utils import get_password_hash
+    from database import SessionLocal, create_tables, engine
+    from models import QuestionAnswer, QuizAttempt, Topic, User, UserPreference
+    from topic_index import make_topics
+    from utils.progress import backfill_user_progress
+    from utils.review import backfill_review_items
+    from utils.search import backfill_search_index
+    from utils.topics import normalize_topic
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    dialect = engine.dialect.name
+    print(f"Target: {engine.url.render_as_string(hide_password=True)} ({dialect})")
+    print(f"Generating {users_count:,} users, {attempts_count:,} attempts, {args.topics:,} topics (seed {args.seed})")
+    create_tables()
+
+    totals = {"users": 0, "user_preferences": 0, "topics": 0, "quiz_attempts": 0, "question_answers": 0}
+    started_all = time.perf_counter()
+
+    def bulk(conn, model, rows):
+        if rows:
+            conn.execute(insert(model.__table__), rows)
+            totals[model.__tablename__] += len(rows)
+
+    @contextmanager
+    def batch():
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                # Bulk load: skip the fsync on every commit
+                conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            yield conn
+
+    def next_id(conn, model):
+        return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    # Topics: Zipf-like popularity, normalized keys unique
+    with engine.begin() as conn:
+        existing = set(conn.execute(select(Topic.normalized_key)).scalars())
+        first_topic = next_id(conn, Topic)
+        rows = []
+        # make_topics returns a set's order, which varies between runs; sort it to keep the seed meaningful
+        names = sorted(make_topics(args.topics * 2, rng))
+        rng.shuffle(names)
+        for name in names:
+            key = normalize_topic(name)
+            if key in existing:
+                continue
+            existing.add(key)
+            rows.append({"id": first_topic + len(rows), "name": name.title(), "normalized_key": key, "created_at": now})
+            if len(rows) == args.topics:
+                break
+        bulk(conn, Topic, rows)
+    topics = [(row["id"], row["name"]) for row in rows]
+    topic_weights = list(accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(topics))))
+
+    # Users and preferences; one password hash shared by all, bcrypt per user would dominate the run
+    hashed_password = get_password_hash(PASSWORD)
+    with engine.begin() as conn:
+        first_user = next_id(conn, User)
+    user_ids = list(range(first_user, first_user + users_count))
+    for start in range(0, users_count, args.batch_size):
+        with batch() as conn:
+            users, preferences = make_users(rng, min(args.batch_size, users_count - start), first_user + start,
+                                            hashed_password, now)
+            bulk(conn, User, users)
+            bulk(conn, UserPreference, preferences)
+
+    # Long tail of attempts per user, and a per-user skill level for scores
+    user_weights = list(accumulate(rng.lognormvariate(0, 1.2) for _ in user_ids))
+    skill = {user_id: rng.betavariate(5, 2.5) for user_id in user_ids}
+
+    pool = question_pool(rng)
+    with engine.begin() as conn:
+        first_attempt = next_id(conn, QuizAttempt)
+    loaded = 0
+    report_every = max(args.batch_size, attempts_count // 20)
+    started = time.perf_counter()
+    while loaded < attempts_count:
+        count = min(args.batch_size, attempts_count - loaded)
+        attempts, answers = make_attempts(
+            rng, count, first_attempt + loaded, user_ids, user_weights, skill, topics, topic_weights, pool,
+            args.days, now, args.answers_fraction, args.questions_fraction
+        )
+        with batch() as conn:
+            bulk(conn, QuizAttempt, attempts)
+            bulk(conn, QuestionAnswer, answers)
+        loaded += count
+        if loaded % report_every < count or loaded == attempts_count:
+            rate = loaded / (time.perf_counter() - started)
+            print(f"  {loaded:>12,} attempts ({rate:,.0f}/s)")
+
+    if dialect == "postgresql":
+        # Explicit ids bypass the sequences; move them past the loaded rows
+        with engine.begin() as conn:
+            for table in ("users", "topics", "quiz_attempts"):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                ))
+
+    if not args.skip_derived:
+        print("Rebuilding user_daily_progress...")
+        db = SessionLocal()
+        try:
+            backfill_user_progress(db)
+            print("Rebuilding the search index...")
+            backfill_search_index(db)
+            print("Queueing missed questions for review...")
+            backfill_review_items(db)
+        finally:
+            db.close()
+
+    if dialect == "sqlite":
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+    elapsed = time.perf_counter() - started_all
+    print(f"\nLoaded in {elapsed:.1f}s:")
+    for table, count in totals.items():
+        print(f"  {table:<18}{count:>14,}")
+    if dialect == "sqlite" and engine.url.database:
+        print(f"  database size     {os.path.getsize(engine.url.database) / 1e6:>11,.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Cost of checking access tokens against the revocation denylist.
+
+Revokes `--revoked` token ids in a throwaway database, then verifies
+`--checks` valid access tokens three ways: the Bloom filter in front of
+the table (what verify_token does), a primary key lookup per request (a
+plain denylist table), and no revocation check at all. A second
+TokenDenylist stands in for another worker process and must reject a
+token revoked by the first after one sync. Every revoked token must be
+rejected, and filter hits that needed a database lookup must stay near
+REVOCATION_BLOOM_ERROR_RATE.
+
+Usage (from backend/):
+    python benchmarks/token_revocation.py [--revoked 50000] [--checks 20000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/token_revocation.db"
+
+
+def percentile_us(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))] * 1e6
+
+
+def timed(fn, tokens):
+    samples = []
+    for token in tokens:
+        started = time.perf_counter()
+        fn(token)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--revoked", type=int, default=50000, help="revoked token ids")
+    parser.add_argument("--checks", type=int, default=20000, help="valid tokens verified per method")
+    args = parser.parse_args()
+
+    import jwt
+    from fastapi import HTTPException
+    from sqlalchemy import select
+
+    from auth_utils import ALGORITHM, SECRET_KEY, create_access_token, verify_token
+    from database import SessionLocal, create_tables
+    from models import RevokedToken
+    from utils.revocation import TokenDenylist, token_denylist
+
+    create_tables()
+    expires_at = datetime.utcnow() + timedelta(minutes=15)
+    print(f"Revoking {args.revoked:,} token ids...")
+    revoked_tokens = []
+    for start in range(0, args.revoked, 5000):
+        entries = []
+        for _ in range(min(5000, args.revoked - start)):
+            jti = uuid.uuid4().hex
+            entries.append({"jti": jti, "username": "someone", "kind": "access", "expires_at": expires_at})
+            if len(revoked_tokens) < 1000:
+                revoked_tokens.append(create_access_token({"sub": "someone", "jti": jti}))
+        token_denylist.revoke(entries)
+    token_denylist._confirmed.clear()  # as after a restart: hits go to the database
+
+    tokens = [create_access_token({"sub": "someone", "sid": uuid.uuid4().hex}) for _ in range(args.checks)]
+
+    def per_request_lookup(token):
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        db = SessionLocal()
+        try:
+            db.execute(select(RevokedToken.jti).where(
+                RevokedToken.jti.in_([payload["jti"], payload["sid"]]))).first()
+        finally:
+            db.close()
+
+    def no_check(token):
+        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+    before = token_denylist.metrics()
+    results = {
+        "Bloom filter": timed(verify_token, tokens),
+        "Database lookup": timed(per_request_lookup, tokens[: args.checks // 4]),
+        "No revocation": timed(no_check, tokens),
+    }
+    after = token_denylist.metrics()
+    lookups = after["database_lookups_total"] - before["database_lookups_total"]
+    false_positives = after["false_positives_total"] - before["false_positives_total"]
+
+    rejected = 0
+    for token in revoked_tokens:
+        try:
+            verify_token(token)
+        except HTTPException:
+            rejected += 1
+
+    # Another process: revoke here, then the other denylist's next sync must pick it up
+    other = TokenDenylist()
+    other.rebuild()
+    late = uuid.uuid4().hex
+    token_denylist.revoke([{"jti": late, "username": "someone", "kind": "access", "expires_at": expires_at}])
+    other.sync()
+    synced = other.is_revoked(late)
+
+    print(f"Filter: {after['filter_bytes'] / 1024:.0f} KiB, {after['hashes']} hashes, "
+          f"{after['entries']:,} of {after['capacity']:,} entries")
+    for name, samples in results.items():
+        print(f"{name:16} p50 {percentile_us(samples, 50):7.1f} µs   p99 {percentile_us(samples, 99):7.1f} µs")
+    rate = lookups / max(args.checks, 1)
+    print(f"Valid tokens sent to the database: {lookups:,} of {args.checks:,} ({rate:.3%}), "
+          f"{false_positives:,} false positives")
+    print(f"Revoked tokens rejected: {rejected:,} of {len(revoked_tokens):,}; "
+          f"other process sees a new revocation after one sync: {synced}")
+
+    # The checks cover a jti and a sid, so about twice the per-id rate at capacity
+    if rejected != len(revoked_tokens) or not synced or rate > 4 * token_denylist.error_rate:
+        print("❌ Denylist missed a revocation or sent too many valid tokens to the database")
+        sys.exit(1)
+    print("✅ Revoked tokens rejected with no database read for valid ones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Topic index benchmark: build and lookup latency with many distinct topics.
+
+Usage (from backend/):
+    python benchmarks/topic_index.py [--topics 100000] [--queries 5000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.topics import TopicIndex, normalize_topic  # noqa: E402
+from utils.llm_ledger import percentile  # noqa: E402
+
+SUBJECTS = [
+    "python", "javascript", "biology", "chemistry", "physics", "history", "geography", "algebra",
+    "calculus", "statistics", "economics", "literature", "music", "astronomy", "databases", "networks",
+    "genetics", "philosophy", "psychology", "sociology", "rust", "kotlin", "accounting", "marketing",
+]
+QUALIFIERS = [
+    "basics", "advanced", "introduction", "fundamentals", "history", "applications", "theory", "practice",
+    "concepts", "exam", "review", "quiz", "essentials", "patterns", "problems", "principles",
+]
+
+
+def random_word(rng):
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9)))
+
+
+def make_topics(n, rng):
+    topics = set()
+    while len(topics) < n:
+        words = [rng.choice(SUBJECTS), rng.choice(QUALIFIERS), random_word(rng)]
+        if rng.random() < 0.3:
+            words.append(str(rng.randint(1, 20)))
+        topics.add(" ".join(words))
+    return list(topics)
+
+
+def typo(text, rng):
+    i = rng.randrange(len(text))
+    return text[:i] + text[i + 1:]
+
+
+def timed_lookups(index, queries):
+    latencies, hits = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        hits += index.lookup(normalize_topic(query)) is not None
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return hits, latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--topics", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    topics = make_topics(args.topics, rng)
+
+    index = TopicIndex()
+    started = time.perf_counter()
+    for topic_id, topic in enumerate(topics, start=1):
+        index.add(topic_id, normalize_topic(topic))
+    build_s = time.perf_counter() - started
+    print(f"Indexed {len(index)} canonical topics in {build_s:.2f} s")
+
+    sample = rng.sample(topics, min(args.queries, len(topics)))
+    workloads = {
+        "exact (reworded case/spacing)": [f"  {t.upper()} " for t in sample],
+        "fuzzy (one typo)": [typo(t, rng) for t in sample],
+        "unseen": [" ".join([random_word(rng), random_word(rng)]) for _ in sample],
+    }
+
+    print(f"\n{'workload':<32} {'hit rate':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, queries in workloads.items():
+        hits, latencies = timed_lookups(index, queries)
+        print(f"{name:<32} {hits / len(queries):>9.1%} {percentile(latencies, 50):>8.3f} "
+              f"{percentile(latencies, 99):>8.3f} {latencies[-1]:>8.3f}")
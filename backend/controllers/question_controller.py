@@ -1,18 +1,55 @@
 from fastapi import HTTPException
-from typing import List, Dict, Any
-from utils.gemini_client import GeminiClient
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Optional
+import math
+import threading
+
+from utils.llm_resilience import CircuitOpenError, LLMDeadlineExceeded
+from utils.rate_limiter import llm_queue
+from utils.rollups import usage_rollups
+from utils.tracing import span, start_trace
 
 class QuestionController:
     def __init__(self):
-        self.gemini_client = GeminiClient()
+        # The Gemini client (and the LangChain import behind it) is created on first use
+        self._gemini_client = None
+        self._gemini_lock = threading.Lock()
+    
+    @property
+    def gemini_client(self):
+        if self._gemini_client is None:
+            with self._gemini_lock:
+                if self._gemini_client is None:
+                    from utils.gemini_client import GeminiClient
+                    self._gemini_client = GeminiClient()
+        return self._gemini_client
+    
+    def warm_up(self):
+        """Build the Gemini client ahead of the first request (blocking; run in a thread)"""
+        self.gemini_client
     
-    async def generate_questions(self, topic: str, number_questions: int, difficulty: str) -> Dict[str, List[Dict[str, Any]]]:
+    def llm_key_status(self) -> List[Dict[str, Any]]:
+        """Load and health of each pooled API key; empty until the Gemini client is built"""
+        return self._gemini_client.key_status() if self._gemini_client is not None else []
+    
+    def llm_resilience_status(self) -> Dict[str, Any]:
+        """Circuit breaker state, hedge delays and recent tail latency; empty until the Gemini client is built"""
+        return self._gemini_client.resilience_status() if self._gemini_client is not None else {}
+    
+    async def generate_questions(
+        self,
+        topic: str,
+        number_questions: int,
+        difficulty: str,
+        client_key: Optional[str] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
         """
         Generate questions for a given topic
         
         Args:
             topic (str): The topic for question generation
             number_questions (int): Number of questions to generate
+            client_key (str, optional): Requesting user/IP, recorded in the LLM ledger
             
         Returns:
             Dict: Response containing generated questions
@@ -31,9 +68,35 @@ class QuestionController:
                 detail="Number of questions must be between 1 and 50"
             )
         
+        with span("controller.generate_questions", topic=topic, difficulty=difficulty,
+                  number_questions=number_questions) as trace_span:
+            result = await self._generate_questions(topic, number_questions, difficulty, client_key)
+            if trace_span is not None:
+                trace_span.set(valid_questions=len(result["questions"]))
+            return result
+    
+    async def _generate_questions(
+        self,
+        topic: str,
+        number_questions: int,
+        difficulty: str,
+        client_key: Optional[str]
+    ) -> Dict[str, List[Dict[str, Any]]]:
         try:
-            # Generate questions using Gemini
-            questions = self.gemini_client.generate_questions(topic, number_questions, difficulty)
+            gemini_client = self._gemini_client or await run_in_threadpool(lambda: self.gemini_client)
+        except ValueError as e:
+            # Missing configuration such as GOOGLE_API_KEY
+            raise HTTPException(status_code=503, detail=f"Question generation is unavailable: {str(e)}")
+        
+        try:
+            # Generate questions using Gemini, within a deadline and with hedging
+            questions = await gemini_client.generate_questions(
+                topic,
+                number_questions,
+                difficulty,
+                client_key=client_key,
+                validator=self._validate_question_structure
+            )
             
             # Validate that we got the expected number of questions
             if len(questions) != number_questions:
@@ -41,10 +104,11 @@ class QuestionController:
                 questions = questions[:number_questions]
             
             # Validate question structure
-            validated_questions = []
-            for question in questions:
-                if self._validate_question_structure(question):
-                    validated_questions.append(question)
+            with span("controller.validate_questions", questions=len(questions)):
+                validated_questions = []
+                for question in questions:
+                    if self._validate_question_structure(question):
+                        validated_questions.append(question)
             
             if not validated_questions:
                 raise HTTPException(
@@ -52,16 +116,48 @@ class QuestionController:
                     detail="Failed to generate valid questions"
                 )
             
+            usage_rollups.record(difficulty, topic=topic, generations=1, generated_questions=len(validated_questions))
             return {"questions": validated_questions}
             
         except HTTPException:
             raise
+        except LLMDeadlineExceeded as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except CircuitOpenError as e:
+            raise HTTPException(
+                status_code=503,
+                detail="Question generation is temporarily unavailable, please retry shortly",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=500, 
                 detail=f"Internal server error: {str(e)}"
             )
     
+    async def handle_generation_job(self, job: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Job handler for background generation workers
+        
+        Args:
+            job (Dict): Claimed job with topic, number_questions and difficulty
+            
+        Returns:
+            Dict: Same payload as generate_questions, stored as the job result
+
+        Raises:
+            QueueFullError: If the global LLM queue is full; the pool puts the job back
+        """
+        with start_trace("job generate", job_id=job.get("id")):
+            # Jobs share the global LLM concurrency cap and fair queue with interactive requests
+            async with llm_queue.slot(job["client_key"]):
+                return await self.generate_questions(
+                    topic=job["topic"],
+                    number_questions=job["number_questions"],
+                    difficulty=job["difficulty"],
+                    client_key=job["client_key"]
+                )
+    
     def _validate_question_structure(self, question: Dict[str, Any]) -> bool:
         """
         Validate that a question has the required structure
@@ -1,23 +1,66 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import Session, sessionmaker
+from contextlib import contextmanager
 from models import Base
+from utils.search import create_search_table
+import contextvars
 import os
+import time
 
 # Database URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
 
+def make_engine(url: str):
+    """Engine for `url`; SQLite connections may be used from the threadpool"""
+    return create_engine(
+        url,
+        connect_args={"check_same_thread": False} if "sqlite" in url else {}
+    )
+
 # Create engine
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = make_engine(DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create tables
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+def create_tables(bind=engine, tables=None):
+    Base.metadata.create_all(bind=bind, tables=tables)
+    add_missing_columns(bind)
+    create_search_table(bind)
+
+def add_missing_columns(bind=engine):
+    """Add columns (and their indexes) declared on models but missing from existing tables"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ""
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}"))
+                for index in table.indexes:
+                    if column.name in index.columns:
+                        index.create(conn, checkfirst=True)
+
+def on_commit(session: Session, callback):
+    """Run `callback` once the session's current transaction commits; dropped if it rolls back"""
+    session.info.setdefault("on_commit", []).append(callback)
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session):
+    for callback in session.info.pop("on_commit", []):
+        callback()
+
+@event.listens_for(Session, "after_rollback")
+def _drop_on_commit(session):
+    session.info.pop("on_commit", None)
 
 # Dependency to get database session
 def get_db():
@@ -26,3 +69,95 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Opt-in SQL profiling (SQL_PROFILING=1): per-request statement counts, DB time,
+# repeated statements (N+1) and slow query logging, built on engine events
+SQL_PROFILING = os.getenv("SQL_PROFILING", "0").lower() in ("1", "true", "yes")
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "3"))
+
+class QueryProfile:
+    """Statements executed while this profile is active"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = {}  # statement text -> number of executions
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    @property
+    def repeated(self):
+        """Statements executed at least SQL_REPEAT_THRESHOLD times (likely N+1)"""
+        return {s: n for s, n in self.statements.items() if n >= SQL_REPEAT_THRESHOLD}
+
+    def header_value(self) -> str:
+        return f"count={self.count}; time_ms={self.total_ms:.2f}; repeated={len(self.repeated)}"
+
+_current_profile = contextvars.ContextVar("query_profile", default=None)
+
+@contextmanager
+def profile_queries():
+    """Collect statements executed in this context (requires SQL_PROFILING)"""
+    profile = QueryProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed_ms)
+
+    if elapsed_ms >= SQL_SLOW_QUERY_MS:
+        print(f"Slow query ({elapsed_ms:.1f} ms): {statement} params={parameters!r}")
+
+def _handle_error(context):
+    # after_cursor_execute does not fire for failed statements
+    if context.connection is not None:
+        starts = context.connection.info.get("query_start_time")
+        if starts:
+            starts.pop()
+
+def profile_engine(bind):
+    """Record `bind`'s statements in the active profile (no-op unless SQL_PROFILING)"""
+    if SQL_PROFILING:
+        event.listen(bind, "before_cursor_execute", _before_cursor_execute)
+        event.listen(bind, "after_cursor_execute", _after_cursor_execute)
+        event.listen(bind, "handle_error", _handle_error)
+
+profile_engine(engine)
+
+class QueryProfilerMiddleware:
+    """Profile each HTTP request and report the summary in an X-Query-Profile header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries() as profile:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-profile", profile.header_value().encode()))
+                    message = {**message, "headers": headers}
+                    for statement, n in profile.repeated.items():
+                        print(f"Repeated statement x{n} in {scope.get('path')}: {statement}")
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -4,13 +4,20 @@ Simple database initialization script.
 Creates all tables based on models.
 """
 
-from database import engine, Base
-from models import User, UserPreference, QuizAttempt, QuestionAnswer, Leaderboard
+from sqlalchemy import text
+from database import engine, Base, SessionLocal, add_missing_columns
+from models import User, UserPreference, QuizAttempt, QuestionAnswer, Leaderboard, GenerationJob, LLMCall, Topic, MaintenanceRun, UsageRollup, UserDailyProgress, TenantShard
 
 def init_database():
     """Create all database tables"""
     print("Creating database tables...")
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    
+    from utils.search import create_search_table
+    create_search_table(engine)
+    from utils.sharding import shard_router
+    shard_router.create_tables()
     print("✅ Database tables created successfully!")
     print("\nTables created:")
     print("  - users")
@@ -18,6 +25,136 @@ def init_database():
     print("  - quiz_attempts")
     print("  - question_answers")
     print("  - leaderboards")
+    print("  - generation_jobs")
+    print("  - llm_calls")
+    print("  - topics")
+    print("  - maintenance_runs")
+    print("  - usage_rollups")
+    print("  - user_daily_progress")
+    print("  - tenant_shards")
+    print("  - question_enrichments")
+    print("  - review_items")
+    print("  - revoked_tokens")
+    print("  - quiz_search")
+
+def backfill_topics():
+    """Assign canonical topics to existing quiz attempts"""
+    from utils.topics import backfill_topic_ids
+    
+    db = SessionLocal()
+    try:
+        updated = backfill_topic_ids(db)
+        print(f"✅ Canonical topics assigned to {updated} quiz attempts")
+    finally:
+        db.close()
+
+def backfill_rollups():
+    """Rebuild usage rollups from existing quiz attempts and LLM calls"""
+    from utils.rollups import backfill_usage_rollups
+    from utils.sharding import shard_router
+    
+    db = SessionLocal()
+    shards = [session_factory() for session_factory in shard_router.sessionmakers]
+    try:
+        read = backfill_usage_rollups(db, attempt_sessions=shards)
+        print(f"✅ Usage rollups rebuilt from {read} rows")
+    finally:
+        for shard in shards:
+            shard.close()
+        db.close()
+
+def backfill_progress():
+    """Rebuild per-user daily progress from completed quiz attempts"""
+    from utils.progress import backfill_user_progress
+    from utils.sharding import shard_router
+    
+    for shard, session_factory in enumerate(shard_router.sessionmakers):
+        db = session_factory()
+        try:
+            read = backfill_user_progress(db)
+            print(f"✅ Daily progress of shard {shard} rebuilt from {read} completed quiz attempts")
+        finally:
+            db.close()
+
+def backfill_search():
+    """Rebuild the full-text search index from existing quiz attempts"""
+    from utils.search import backfill_search_index
+    from utils.sharding import shard_router
+    
+    for shard, session_factory in enumerate(shard_router.sessionmakers):
+        db = session_factory()
+        try:
+            indexed = backfill_search_index(db)
+            print(f"✅ Search index of shard {shard} rebuilt from {indexed} quiz attempts")
+        finally:
+            db.close()
+
+def backfill_reviews():
+    """Queue the missed questions of existing completed quizzes for spaced-repetition review"""
+    from utils.review import backfill_review_items
+    from utils.sharding import shard_router
+    
+    for shard, session_factory in enumerate(shard_router.sessionmakers):
+        db = session_factory()
+        try:
+            queued = backfill_review_items(db)
+            print(f"✅ {queued} missed questions of shard {shard} queued for review")
+        finally:
+            db.close()
+
+def compress_quiz_json(batch_size: int = 200):
+    """Rewrite plain-JSON quiz columns in the compressed format, one small transaction per batch"""
+    from models.types import encode_json, decode_json, is_encoded
+    
+    if engine.dialect.name == "postgresql":
+        # Column type changes from json to bytea; keep the JSON text as UTF-8 bytes until rewritten
+        with engine.begin() as conn:
+            for column in ("questions_data", "user_answers"):
+                data_type = conn.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = 'quiz_attempts' AND column_name = :column"
+                ), {"column": column}).scalar()
+                if data_type in ("json", "jsonb"):
+                    conn.execute(text(
+                        f"ALTER TABLE quiz_attempts ALTER COLUMN {column} TYPE BYTEA "
+                        f"USING convert_to({column}::text, 'UTF8')"
+                    ))
+    
+    rewritten = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, questions_data, user_answers FROM quiz_attempts "
+                "WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            
+            updates = []
+            for row in rows:
+                if all(value is None or is_encoded(value) for value in (row.questions_data, row.user_answers)):
+                    continue
+                updates.append({
+                    "id": row.id,
+                    "questions_data": None if row.questions_data is None else encode_json(decode_json(row.questions_data)),
+                    "user_answers": None if row.user_answers is None else encode_json(decode_json(row.user_answers)),
+                })
+            if updates:
+                conn.execute(text(
+                    "UPDATE quiz_attempts SET questions_data = :questions_data, user_answers = :user_answers "
+                    "WHERE id = :id"
+                ), updates)
+                rewritten += len(updates)
+    
+    print(f"✅ Compressed quiz JSON for {rewritten} quiz attempts")
 
 if __name__ == "__main__":
     init_database()
+    backfill_topics()
+    compress_quiz_json()
+    backfill_rollups()
+    backfill_progress()
+    backfill_search()
+    backfill_reviews()
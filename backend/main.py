@@ -1,15 +1,71 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from routes.question_routes import router as question_router
+from fastapi.responses import PlainTextResponse
+from routes.question_routes import router as question_router, question_controller
 from routes.auth_routes import router as auth_router
 from routes.dashboard import router as dashboard_router
 from routes.profile import router as profile_router
-from database import create_tables
+from routes.job_routes import router as job_router, job_worker_pool
+from routes.llm_routes import router as llm_router
+from routes.analytics_routes import router as analytics_router
+from routes.room_routes import router as room_router
+from utils.llm_ledger import llm_ledger
+from utils.retention import retention_sweeper
+from utils.enrichment import enrichment_pipeline
+from utils.rollups import usage_rollups
+from utils.quiz_sessions import quiz_sessions
+from utils.revocation import token_denylist
+from utils.rooms import room_manager
+from utils.sharding import shard_router
+from utils.metrics import registry, MetricsMiddleware, instrument_pool
+from utils.tracing import tracer, trace_engine, TracingMiddleware, TRACING_ENABLED
+from database import create_tables, SQL_PROFILING, QueryProfilerMiddleware
+import asyncio
+import os
 
-app = FastAPI(title="QuizMind API", version="2.0.0", description="AI-Powered Quiz Platform")
+# Create missing tables on startup; disable when the schema is managed with init_db.py
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "1").lower() in ("1", "true", "yes")
+# Build the Gemini client in the background right after startup instead of on the first request
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1").lower() in ("1", "true", "yes")
 
-# Create database tables
-create_tables()
+async def warm_up_llm():
+    try:
+        await run_in_threadpool(question_controller.warm_up)
+    except Exception as e:
+        # e.g. GOOGLE_API_KEY not set: generation returns 503, everything else keeps working
+        print(f"LLM warm-up failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_CREATE_TABLES:
+        await run_in_threadpool(create_tables)
+        await run_in_threadpool(shard_router.create_tables)
+    job_worker_pool.start()
+    retention_sweeper.start()
+    enrichment_pipeline.start(lambda: question_controller.gemini_client)
+    quiz_sessions.start()
+    token_denylist.start()
+    room_manager.start()
+    registry.start_snapshots()
+    warm_up = asyncio.create_task(warm_up_llm()) if LLM_WARMUP else None
+
+    yield
+
+    if warm_up is not None:
+        warm_up.cancel()
+    await job_worker_pool.stop()
+    await retention_sweeper.stop()
+    await enrichment_pipeline.stop()
+    await quiz_sessions.stop()
+    await token_denylist.stop()
+    await room_manager.stop()
+    llm_ledger.stop()
+    usage_rollups.stop()
+    tracer.stop()
+
+app = FastAPI(title="QuizMind API", version="2.0.0", description="AI-Powered Quiz Platform", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -20,11 +76,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics (outermost, so CORS preflights are counted too)
+app.add_middleware(MetricsMiddleware)
+for shard_engine in shard_router.engines:
+    instrument_pool(shard_engine)
+    trace_engine(shard_engine)
+
+# Per-request SQL statement profile in the X-Query-Profile header (SQL_PROFILING=1)
+if SQL_PROFILING:
+    app.add_middleware(QueryProfilerMiddleware)
+
+# Span traces of sampled (TRACE_SAMPLE_RATE) and slow (TRACE_SLOW_MS) requests, see utils/tracing.py
+if TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(question_router)
 app.include_router(auth_router)
 app.include_router(dashboard_router)
 app.include_router(profile_router)
+app.include_router(job_router)
+app.include_router(llm_router)
+app.include_router(analytics_router)
+app.include_router(room_router)
 
 @app.get("/")
 async def root():
@@ -34,6 +108,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tenant shard maintenance.
+
+    python manage_shards.py status
+    python manage_shards.py move <username> <shard>
+    python manage_shards.py rebalance [--max-moves 10] [--tolerance 0.1] [--dry-run]
+
+Uses the same SHARD_COUNT, SHARD_URL_TEMPLATE and DATABASE_URL as the app.
+A moved tenant gets 503 responses for about SHARD_DIRECTORY_TTL seconds
+plus the copy, and its quiz ids change.
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import func, select
+
+from models import QuizAttempt, User
+from utils.sharding import shard_router
+
+
+def print_status():
+    print(f"{'shard':<7}{'tenants':>9}{'users':>9}{'attempts':>12}  url")
+    for shard in shard_router.status():
+        print(f"{shard['shard']:<7}{shard['tenants']:>9}{shard['users']:>9}{shard['quiz_attempts']:>12}  {shard['url']}")
+
+
+def tenant_loads():
+    """{shard: {username: attempts}} for every shard."""
+    loads = {}
+    for shard, shard_engine in enumerate(shard_router.engines):
+        with shard_engine.connect() as conn:
+            loads[shard] = dict(conn.execute(
+                select(User.username, func.count(QuizAttempt.id))
+                .outerjoin(QuizAttempt, QuizAttempt.user_id == User.id)
+                .group_by(User.username)
+            ).all())
+    return loads
+
+
+def plan_rebalance(loads, max_moves: int, tolerance: float):
+    """
+    Greedy moves from the busiest to the quietest shard (by attempts) until
+    every shard is within `tolerance` of the mean. Each move picks the tenant
+    closest to half the gap, so no move overshoots.
+    """
+    totals = {shard: sum(tenants.values()) for shard, tenants in loads.items()}
+    mean = sum(totals.values()) / len(totals)
+    moves = []
+    while len(moves) < max_moves:
+        busiest = max(totals, key=totals.get)
+        quietest = min(totals, key=totals.get)
+        gap = totals[busiest] - totals[quietest]
+        if totals[busiest] <= mean * (1 + tolerance) or gap <= 0:
+            break
+        candidates = [(tenant, load) for tenant, load in loads[busiest].items() if 0 < load < gap]
+        if not candidates:
+            break
+        tenant, load = min(candidates, key=lambda item: abs(item[1] - gap / 2))
+        moves.append((tenant, busiest, quietest, load))
+        del loads[busiest][tenant]
+        loads[quietest][tenant] = load
+        totals[busiest] -= load
+        totals[quietest] += load
+    return moves
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tenant shard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="tenants and rows per shard")
+    move = commands.add_parser("move", help="move one tenant to another shard")
+    move.add_argument("username")
+    move.add_argument("shard", type=int)
+    rebalance = commands.add_parser("rebalance", help="move tenants until shards hold similar numbers of attempts")
+    rebalance.add_argument("--max-moves", type=int, default=10)
+    rebalance.add_argument("--tolerance", type=float, default=0.1, help="allowed share above the mean")
+    rebalance.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not shard_router.enabled:
+        sys.exit("Sharding is off; set SHARD_COUNT above 1")
+    shard_router.create_tables()
+
+    if args.command == "status":
+        print_status()
+    elif args.command == "move":
+        counts = shard_router.move_tenant(args.username, args.shard)
+        print(f"✅ Moved {args.username} to shard {args.shard}: "
+              + ", ".join(f"{count} {table}" for table, count in counts.items()))
+    else:
+        moves = plan_rebalance(tenant_loads(), args.max_moves, args.tolerance)
+        if not moves:
+            print("✅ Shards are balanced")
+        for tenant, source, target, load in moves:
+            print(f"{tenant}: shard {source} -> {target} ({load} attempts)")
+            if not args.dry_run:
+                shard_router.move_tenant(tenant, target)
+        if moves and not args.dry_run:
+            print_status()
+
+
+if __name__ == "__main__":
+    main()
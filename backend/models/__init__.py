@@ -1,5 +1,15 @@
 from .user import Base, User, UserPreference
 from .quiz import QuizAttempt, QuestionAnswer, Leaderboard
+from .job import GenerationJob
+from .llm_call import LLMCall
+from .topic import Topic
+from .maintenance import MaintenanceRun
+from .rollup import UsageRollup
+from .progress import UserDailyProgress
+from .tenant import TenantShard
+from .enrichment import QuestionEnrichment
+from .review import ReviewItem
+from .revoked_token import RevokedToken
 
 __all__ = [
     "Base",
@@ -7,5 +17,15 @@ __all__ = [
     "UserPreference",
     "QuizAttempt",
     "QuestionAnswer",
-    "Leaderboard"
+    "Leaderboard",
+    "GenerationJob",
+    "LLMCall",
+    "Topic",
+    "MaintenanceRun",
+    "UsageRollup",
+    "UserDailyProgress",
+    "TenantShard",
+    "QuestionEnrichment",
+    "ReviewItem",
+    "RevokedToken"
 ]
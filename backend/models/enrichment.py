@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index
+from datetime import datetime
+from .user import Base
+
+
+class QuestionEnrichment(Base):
+    __tablename__ = "question_enrichments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False, unique=True)  # sha256 of question, options and answers
+
+    # Question (as generated: question, options, answers, explanation)
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    question = Column(JSON, nullable=False)
+    misses = Column(Integer, default=0, nullable=False)  # wrong answers seen, enriched first
+
+    # Queue State
+    status = Column(String, default="pending", nullable=False)  # pending, running, done, failed
+    attempts = Column(Integer, default=0)
+    available_at = Column(DateTime, default=datetime.utcnow)  # not claimable before this (retry backoff)
+    locked_until = Column(DateTime, nullable=True)  # visibility timeout while running
+    worker_id = Column(String, nullable=True)  # claim that owns the row while running
+
+    # Outcome
+    detailed_explanation = Column(Text, nullable=True)
+    reference_links = Column(JSON, default=[])  # [{"title": ..., "url": ...}]
+    error = Column(Text, nullable=True)
+
+    # Timing
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    enriched_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_question_enrichments_claim", "status", "available_at"),
+    )
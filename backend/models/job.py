@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index
+from datetime import datetime
+from .user import Base
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+    
+    id = Column(String(36), primary_key=True)  # uuid4 hex
+    client_key = Column(String, nullable=False)  # user:<name> or ip:<addr>
+    
+    # Request
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    number_questions = Column(Integer, nullable=False)
+    
+    # Queue State
+    status = Column(String, default="queued", nullable=False)  # queued, running, succeeded, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    available_at = Column(DateTime, default=datetime.utcnow)  # not claimable before this (retry backoff)
+    locked_until = Column(DateTime, nullable=True)  # visibility timeout while running
+    worker_id = Column(String, nullable=True)
+    
+    # Outcome
+    result = Column(JSON, nullable=True)  # {"questions": [...]}
+    error = Column(Text, nullable=True)
+    
+    # Timing
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_generation_jobs_claim", "status", "available_at"),
+    )
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Index
+from datetime import datetime
+from .user import Base
+
+
+class LLMCall(Base):
+    __tablename__ = "llm_calls"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    # Request
+    model = Column(String, nullable=False)
+    client_key = Column(String, nullable=True)  # requesting user:<name> or ip:<addr>
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    number_questions = Column(Integer, nullable=False)
+    
+    # Usage (from response usage metadata)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    
+    # Outcome
+    latency_ms = Column(Float, nullable=False)
+    outcome = Column(String, nullable=False)  # success, parse_error, error
+    retries = Column(Integer, default=0)  # 0 for the first attempt of a generation
+    valid_questions = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_llm_calls_topic_difficulty", "topic", "difficulty"),
+    )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, JSON
+from datetime import datetime
+from .user import Base
+
+
+class MaintenanceRun(Base):
+    __tablename__ = "maintenance_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task = Column(String, nullable=False, index=True)  # e.g. retention
+    
+    # Outcome
+    status = Column(String, nullable=False)  # succeeded, failed
+    counts = Column(JSON, default={})  # rows affected per action
+    batches = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    
+    # Timing
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Float, nullable=True)
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, DateTime, Date, Float, ForeignKey, UniqueConstraint
+from datetime import datetime
+from .user import Base
+
+
+class UserDailyProgress(Base):
+    __tablename__ = "user_daily_progress"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Key
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)  # UTC day the quizzes were completed
+    topic_id = Column(Integer, nullable=False, default=0)  # canonical topic, 0 when unknown
+    
+    # Counters over completed quizzes
+    quizzes = Column(Integer, default=0, nullable=False)
+    questions = Column(Integer, default=0, nullable=False)
+    correct = Column(Integer, default=0, nullable=False)
+    score_sum = Column(Float, default=0.0, nullable=False)  # sum of percentages
+    time_taken_sum = Column(Integer, default=0, nullable=False)  # seconds
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "topic_id", name="uq_user_daily_progress_key"),
+    )
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .user import Base
+from .types import CompressedJSON
 
 
 class QuizAttempt(Base):
@@ -10,6 +11,7 @@ class QuizAttempt(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     topic = Column(String, nullable=False)  # User-entered topic name
+    topic_id = Column(Integer, ForeignKey("topics.id"), nullable=True, index=True)  # Canonical topic
     
     # Quiz Configuration
     difficulty = Column(String, nullable=False)  # easy, medium, hard
@@ -18,9 +20,11 @@ class QuizAttempt(Base):
     
     # Quiz State
     status = Column(String, default="ongoing")  # ongoing, completed, abandoned
+    version = Column(Integer, default=1, server_default="1", nullable=False)  # bumped on every saved state
+    idempotency_key = Column(String(64), nullable=True)  # client-generated per quiz session, dedupes creates
     current_question_index = Column(Integer, default=0)
-    questions_data = Column(JSON, nullable=True)  # Stores all questions and options (optional for completed quizzes)
-    user_answers = Column(JSON, default={})  # {question_index: selected_answer(s)}
+    questions_data = Column(CompressedJSON, nullable=True)  # Stores all questions and options (optional for completed quizzes)
+    user_answers = Column(CompressedJSON, default={})  # {question_index: selected_answer(s)}
     
     # Scoring
     score = Column(Float, default=0.0)
@@ -31,11 +35,22 @@ class QuizAttempt(Base):
     # Timing
     started_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # last saved state
     time_taken = Column(Integer, nullable=True)  # in seconds
     
     # Relationships
     user = relationship("User", back_populates="quiz_attempts")
+    canonical_topic = relationship("Topic")
     answers = relationship("QuestionAnswer", back_populates="quiz_attempt", cascade="all, delete-orphan")
+    
+    # ORM updates are compare-and-set on `version` (StaleDataError if the row changed since it was loaded)
+    __mapper_args__ = {"version_id_col": version}
+    
+    __table_args__ = (
+        Index("ix_quiz_attempts_status_updated", "status", "updated_at"),  # retention sweeps
+        Index("uq_quiz_attempts_idempotency", "user_id", "idempotency_key", unique=True),
+        {"sqlite_autoincrement": True},  # disjoint id ranges per shard, see utils.sharding
+    )
 
 
 class QuestionAnswer(Base):
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, JSON, ForeignKey, Index, UniqueConstraint
+from datetime import datetime
+from .user import Base
+
+
+class ReviewItem(Base):
+    __tablename__ = "review_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Key
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content_hash = Column(String(64), nullable=False)  # see utils.enrichment.content_hash
+
+    # Question (as generated: question, options, answers, explanation)
+    topic = Column(String, nullable=False)
+    difficulty = Column(String, nullable=False)
+    question = Column(JSON, nullable=False)
+
+    # SM-2 schedule
+    due_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    repetitions = Column(Integer, default=0, nullable=False)  # successful reviews in a row
+    interval_days = Column(Float, default=0.0, nullable=False)
+    ease_factor = Column(Float, default=2.5, nullable=False)
+    lapses = Column(Integer, default=0, nullable=False)  # times missed, in quizzes or reviews
+    reviews = Column(Integer, default=0, nullable=False)
+    last_grade = Column(Integer, nullable=True)  # 0-5
+    last_reviewed_at = Column(DateTime, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "content_hash", name="uq_review_items_key"),
+        Index("ix_review_items_due", "user_id", "due_at"),  # the due queue
+    )
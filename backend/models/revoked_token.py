@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+from .user import Base
+
+
+class RevokedToken(Base):
+    """Denylist of JWT ids (main database only); rows are purged once the tokens have expired."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(32), primary_key=True)  # token id, or a session id to revoke all of its tokens
+    username = Column(String(50), nullable=True)
+    kind = Column(String, nullable=False)  # access, refresh, session
+    expires_at = Column(DateTime, nullable=False, index=True)  # when the last token it covers expires
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, UniqueConstraint
+from datetime import datetime
+from .user import Base
+
+
+class UsageRollup(Base):
+    __tablename__ = "usage_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Key
+    bucket_start = Column(DateTime, nullable=False)  # start of the UTC hour
+    topic_id = Column(Integer, nullable=False, default=0)  # canonical topic, 0 when unknown
+    difficulty = Column(String, nullable=False)
+    
+    # Counters
+    generations = Column(Integer, default=0, nullable=False)  # successful generation requests
+    generated_questions = Column(Integer, default=0, nullable=False)
+    started = Column(Integer, default=0, nullable=False)  # ongoing attempts created (save-state)
+    completed = Column(Integer, default=0, nullable=False)
+    abandoned = Column(Integer, default=0, nullable=False)
+    score_sum = Column(Float, default=0.0, nullable=False)  # sum of completed percentages
+    time_taken_sum = Column(Integer, default=0, nullable=False)  # seconds, completed attempts
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("bucket_start", "topic_id", "difficulty", name="uq_usage_rollups_key"),
+    )
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from .user import Base
+
+
+class TenantShard(Base):
+    """Directory of which shard holds each tenant's rows (main database only)."""
+    __tablename__ = "tenant_shards"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant = Column(String(50), unique=True, index=True, nullable=False)  # username
+    email = Column(String(100), unique=True, nullable=True)  # kept here so emails stay unique across shards
+    shard = Column(Integer, nullable=False, default=0, index=True)
+    status = Column(String, nullable=False, default="active")  # active, moving
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from .user import Base
+
+
+class Topic(Base):
+    __tablename__ = "topics"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)  # Display name, as first entered
+    normalized_key = Column(String, unique=True, index=True, nullable=False)  # See utils.topics.normalize_topic
+    created_at = Column(DateTime, default=datetime.utcnow)
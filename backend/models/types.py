@@ -0,0 +1,79 @@
+import json
+import os
+import zlib
+
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
+
+# Version byte prefixed to every stored value
+FORMAT_RAW = 0x00  # uncompressed UTF-8 JSON (small values)
+FORMAT_ZLIB = 0x01
+FORMAT_ZSTD = 0x02
+
+JSON_COMPRESSION = os.getenv("JSON_COMPRESSION", "zstd" if zstandard else "zlib")
+JSON_COMPRESSION_LEVEL = int(os.getenv("JSON_COMPRESSION_LEVEL", "3" if JSON_COMPRESSION == "zstd" else "6"))
+JSON_COMPRESSION_MIN_BYTES = int(os.getenv("JSON_COMPRESSION_MIN_BYTES", "256"))
+
+
+def encode_json(value) -> bytes:
+    """Serialize a JSON value to the versioned, optionally compressed format."""
+    raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(raw) < JSON_COMPRESSION_MIN_BYTES:
+        return bytes([FORMAT_RAW]) + raw
+    if JSON_COMPRESSION == "zstd" and zstandard is not None:
+        return bytes([FORMAT_ZSTD]) + zstandard.ZstdCompressor(level=JSON_COMPRESSION_LEVEL).compress(raw)
+    return bytes([FORMAT_ZLIB]) + zlib.compress(raw, JSON_COMPRESSION_LEVEL)
+
+
+def decode_json(data):
+    """Inverse of encode_json; also accepts legacy plain JSON text written before compression."""
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    if isinstance(data, str):
+        return json.loads(data)
+
+    version, payload = data[0], data[1:]
+    if version == FORMAT_RAW:
+        return json.loads(payload)
+    if version == FORMAT_ZLIB:
+        return json.loads(zlib.decompress(payload))
+    if version == FORMAT_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Value is zstd-compressed but the 'zstandard' package is not installed")
+        return json.loads(zstandard.ZstdDecompressor().decompress(payload))
+    # Legacy JSON stored as bytes
+    return json.loads(data)
+
+
+def is_encoded(data) -> bool:
+    """True if a stored value already uses the versioned format."""
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return isinstance(data, bytes) and len(data) > 0 and data[0] in (FORMAT_RAW, FORMAT_ZLIB, FORMAT_ZSTD)
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    JSON column stored as a compressed blob.
+
+    Values are plain Python objects on both sides, exactly like `JSON`.
+    Stored bytes start with a version byte so the codec can change without
+    rewriting old rows.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_json(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decode_json(value)
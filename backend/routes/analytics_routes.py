@@ -0,0 +1,133 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime, timedelta
+from typing import Optional
+import os
+
+from database import get_db
+from models import UsageRollup, Topic
+from auth_utils import verify_token
+from utils.rollups import COUNTERS, hour_bucket, usage_rollups
+from utils.topics import normalize_topic
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+# Comma-separated usernames allowed to read platform-wide analytics
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
+def require_admin(token: str):
+    """Helper function to check that the token belongs to an admin"""
+    username = verify_token(token)
+    if username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return username
+
+def summarize(totals):
+    """Counter sums plus derived averages and rates"""
+    counters = {c: totals.get(c) or 0 for c in COUNTERS}
+    completed, abandoned = counters["completed"], counters["abandoned"]
+    finished = completed + abandoned
+    return {
+        "generations": counters["generations"],
+        "generated_questions": counters["generated_questions"],
+        "started": counters["started"],
+        "completed": completed,
+        "abandoned": abandoned,
+        "average_score": round(counters["score_sum"] / completed, 2) if completed else None,
+        "average_time_taken": round(counters["time_taken_sum"] / completed, 1) if completed else None,
+        "completion_rate": round(completed / finished, 4) if finished else None,
+        "abandonment_rate": round(abandoned / finished, 4) if finished else None,
+    }
+
+def rollup_filters(query, since: datetime, topic: Optional[str], difficulty: Optional[str]):
+    query = query.filter(UsageRollup.bucket_start >= since)
+    if difficulty:
+        query = query.filter(UsageRollup.difficulty == difficulty)
+    if topic:
+        topic_ids = query.session.query(Topic.id).filter(Topic.normalized_key == normalize_topic(topic))
+        query = query.filter(UsageRollup.topic_id.in_(topic_ids.scalar_subquery()))
+    return query
+
+@router.get("/usage")
+async def get_usage(
+    token: str,
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    hours: int = Query(24, ge=1, le=24 * 366),
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Generation, completion and abandonment per hour or day, read from the rollups"""
+    require_admin(token)
+    since = hour_bucket(datetime.utcnow() - timedelta(hours=hours - 1))
+
+    query = db.query(
+        UsageRollup.bucket_start,
+        *[func.sum(getattr(UsageRollup, c)).label(c) for c in COUNTERS]
+    ).group_by(UsageRollup.bucket_start).order_by(UsageRollup.bucket_start)
+    rows = rollup_filters(query, since, topic, difficulty).all()
+
+    # Hourly rows are folded into days here; at most `hours` rows come back from the database
+    buckets = {}
+    for row in rows:
+        bucket = row.bucket_start if granularity == "hour" else row.bucket_start.replace(hour=0)
+        totals = buckets.setdefault(bucket, {})
+        for c in COUNTERS:
+            totals[c] = totals.get(c, 0) + (getattr(row, c) or 0)
+
+    overall = {c: sum(t.get(c, 0) for t in buckets.values()) for c in COUNTERS}
+    return {
+        "granularity": granularity,
+        "since": since.isoformat(),
+        "totals": summarize(overall),
+        "buckets": [
+            {"bucket_start": bucket.isoformat(), **summarize(totals)}
+            for bucket, totals in buckets.items()
+        ],
+        "rollups": usage_rollups.metrics()
+    }
+
+@router.get("/topics")
+async def get_topic_usage(
+    token: str,
+    hours: int = Query(24 * 7, ge=1, le=24 * 366),
+    difficulty: Optional[str] = None,
+    sort: str = Query("generations", pattern="^(generations|started|completed|abandoned)$"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """Top canonical topics by usage, with per-difficulty breakdown, read from the rollups"""
+    require_admin(token)
+    since = hour_bucket(datetime.utcnow() - timedelta(hours=hours - 1))
+
+    query = db.query(
+        UsageRollup.topic_id,
+        UsageRollup.difficulty,
+        *[func.sum(getattr(UsageRollup, c)).label(c) for c in COUNTERS]
+    ).group_by(UsageRollup.topic_id, UsageRollup.difficulty)
+    rows = rollup_filters(query, since, None, difficulty).all()
+
+    by_topic = {}
+    for row in rows:
+        entry = by_topic.setdefault(row.topic_id, {"totals": {}, "by_difficulty": {}})
+        for c in COUNTERS:
+            entry["totals"][c] = entry["totals"].get(c, 0) + (getattr(row, c) or 0)
+        entry["by_difficulty"][row.difficulty] = summarize({c: getattr(row, c) for c in COUNTERS})
+
+    top = sorted(by_topic.items(), key=lambda item: item[1]["totals"][sort], reverse=True)[:limit]
+    names = dict(db.query(Topic.id, Topic.name).filter(Topic.id.in_([topic_id for topic_id, _ in top])).all())
+
+    return {
+        "window_hours": hours,
+        "sort": sort,
+        "topics": [
+            {
+                "topic_id": topic_id or None,
+                "topic": names.get(topic_id, "Unknown"),
+                **summarize(entry["totals"]),
+                "by_difficulty": entry["by_difficulty"]
+            }
+            for topic_id, entry in top
+        ]
+    }
@@ -1,105 +1,171 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Optional
 
-from database import get_db
+from utils.sharding import shard_router
 from models.user import User
-from schemas.auth import UserCreate, UserResponse, UserLogin, Token
+from schemas.auth import UserCreate, UserResponse, UserLogin, Token, RefreshRequest
 from auth_utils import (
     verify_password, 
     get_password_hash, 
-    create_access_token, 
+    create_token_pair,
+    decode_token,
     verify_token,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    REFRESH_TOKEN_EXPIRE_DAYS
 )
+from utils.revocation import token_denylist
+from utils.metrics import registry
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 security = HTTPBearer()
 
+refresh_token_reuse_total = registry.counter(
+    "refresh_token_reuse_total", "Refresh tokens presented again after rotation; their sessions were revoked")
+
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate):
     """Register a new user."""
-    # Check if user already exists
-    db_user = db.query(User).filter(
-        (User.username == user.username) | (User.email == user.email)
-    ).first()
+    # Reserve the username and email on a shard (no-op without sharding)
+    shard_router.claim(user.username, user.email)
     
-    if db_user:
-        if db_user.username == user.username:
+    with shard_router.tenant_session(user.username) as db:
+        # Check if user already exists
+        db_user = db.query(User).filter(
+            (User.username == user.username) | (User.email == user.email)
+        ).first()
+        
+        if db_user:
+            if db_user.username == user.username:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Username already registered"
+                )
+            else:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Email already registered"
+                )
+        
+        # Create new user
+        hashed_password = get_password_hash(user.password)
+        db_user = User(
+            username=user.username,
+            email=user.email,
+            hashed_password=hashed_password
+        )
+        
+        db.add(db_user)
+        try:
+            db.commit()
+        except Exception:
+            shard_router.release(user.username)
+            raise
+        db.refresh(db_user)
+        
+        return db_user
+
+@router.post("/login", response_model=Token)
+async def login(user_credentials: UserLogin):
+    """Login user and return JWT token."""
+    with shard_router.tenant_session(user_credentials.username) as db:
+        # Find user by username
+        user = db.query(User).filter(User.username == user_credentials.username).first()
+        
+        if not user or not verify_password(user_credentials.password, user.hashed_password):
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already registered"
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password",
+                headers={"WWW-Authenticate": "Bearer"},
             )
-        else:
+        
+        if not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already registered"
+                detail="Inactive user"
             )
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password
-    )
-    
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    return db_user
+        
+        # Access and refresh tokens for a new login session
+        return create_token_pair(user.username)
 
-@router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
-    """Login user and return JWT token."""
-    # Find user by username
-    user = db.query(User).filter(User.username == user_credentials.username).first()
-    
-    if not user or not verify_password(user_credentials.password, user.hashed_password):
+def _expiry(payload: dict) -> datetime:
+    return datetime.utcfromtimestamp(payload["exp"])
+
+def _session_revocation(username: str, session_id: str) -> dict:
+    """Revokes every token of a login session, for as long as any of them can be valid."""
+    return {
+        "jti": session_id,
+        "username": username,
+        "kind": "session",
+        "expires_at": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    }
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest):
+    """
+    Exchange a refresh token for a new access and refresh token pair. Each
+    refresh token works once: presenting one that was already exchanged
+    means it leaked, so the whole session is revoked.
+    """
+    payload = decode_token(request.refresh_token, "refresh")
+    username = payload["sub"]
+    jti, session_id = payload.get("jti"), payload.get("sid")
+    if await run_in_threadpool(token_denylist.is_revoked, session_id):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
+            detail="Session has been revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    if not user.is_active:
+    # Rotate: spending the presented refresh token is the compare-and-set, so of
+    # two requests racing with the same token only one gets a new pair
+    spent = await run_in_threadpool(token_denylist.spend, {
+        "jti": jti, "username": username, "kind": "refresh", "expires_at": _expiry(payload)
+    })
+    if not spent:
+        refresh_token_reuse_total.inc()
+        await run_in_threadpool(token_denylist.revoke, [_session_revocation(username, session_id)])
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token has already been used",
+            headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+
+    with shard_router.tenant_session(username) as db:
+        user = db.query(User).filter(User.username == username).first()
+        if not user or not user.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    return create_token_pair(username, session_id)
 
 @router.post("/logout")
 async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Logout user (client should discard the token)."""
-    # In a stateless JWT system, logout is typically handled client-side
-    # by discarding the token. This endpoint is for documentation purposes
-    # and could be used for token blacklisting in a more complex system.
+    """Logout user: revoke the access token and every other token of its session."""
+    username = verify_token(credentials.credentials)
+    payload = decode_token(credentials.credentials)
+    entries = [{"jti": payload.get("jti"), "username": username, "kind": "access", "expires_at": _expiry(payload)}]
+    if payload.get("sid"):
+        entries.append(_session_revocation(username, payload["sid"]))
+    await run_in_threadpool(token_denylist.revoke, entries)
     return {"message": "Successfully logged out"}
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     """Get current user information."""
     username = verify_token(credentials.credentials)
-    user = db.query(User).filter(User.username == username).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    return user
+    with shard_router.tenant_session(username) as db:
+        user = db.query(User).filter(User.username == username).first()
+        
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
+        return user
@@ -1,14 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from database import get_db
-from models import QuizAttempt, User
+from fastapi import APIRouter, Depends, HTTPException, Body, Query, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, defer
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, desc, update
+from models import QuizAttempt, User, Topic, UserDailyProgress
 from auth_utils import verify_token
-from typing import Dict, Any
-from datetime import datetime
+from utils.sharding import shard_router, get_tenant_db
+from utils.rollups import usage_rollups
+from utils.progress import record_completion, daily_series, streaks, topic_summary
+from utils.idempotency import dedupe_cache, payload_digest
+from utils.quiz_sessions import quiz_sessions, quiz_session_events_total, SessionClosed
+from utils.export import EXPORT_FORMATS, ATTEMPT_COLUMNS, QUESTION_COLUMNS, build_export_query, stream_export
+from utils.search import index_attempt, remove_attempts, search_attempts, search_supported
+from utils.enrichment import enrichment_pipeline, enrichments_for
+from utils.review import due_reviews, grade_reviews, next_due_at, queue_missed
+from utils.tracing import TracedRoute, traced
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
 
-router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+router = APIRouter(prefix="/dashboard", tags=["dashboard"], route_class=TracedRoute)
 
+@traced("auth.current_user")
 def get_current_user(db: Session, token: str):
     """Helper function to get current user from token"""
     username = verify_token(token)
@@ -20,7 +33,7 @@ def get_current_user(db: Session, token: str):
 @router.get("/stats")
 async def get_dashboard_stats(
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Get user dashboard statistics"""
     user = get_current_user(db, token)
@@ -70,7 +83,7 @@ async def get_quiz_history(
     token: str,
     limit: int = 20,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Get user quiz history"""
     user = get_current_user(db, token)
@@ -98,10 +111,152 @@ async def get_quiz_history(
         for quiz in quizzes
     ]
 
+@router.get("/export")
+async def export_quiz_history(
+    token: str,
+    fmt: str = Query("csv", alias="format"),
+    scope: str = "attempts",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    topic: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    db: Session = Depends(get_tenant_db)
+):
+    """Stream all of the user's attempts or per-question results as CSV or NDJSON"""
+    user = get_current_user(db, token)
+    
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if scope not in ("attempts", "questions"):
+        raise HTTPException(status_code=400, detail="scope must be 'attempts' or 'questions'")
+    
+    query = build_export_query(user.id, scope, start=start, end=end, topic=topic, difficulty=difficulty)
+    columns = QUESTION_COLUMNS if scope == "questions" else ATTEMPT_COLUMNS
+    filename = f"quiz-{scope}-{user.username}-{datetime.utcnow():%Y%m%d}.{fmt}"
+    
+    # Rows are read on a separate connection while the response is sent, not through this session
+    return StreamingResponse(
+        stream_export(query, fmt, columns, bind=db.get_bind()),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/search")
+async def search_quizzes(
+    token: str,
+    q: str,
+    outcome: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_tenant_db)
+):
+    """Full-text search over the user's quiz topics, questions, options and explanations"""
+    user = get_current_user(db, token)
+    
+    if outcome not in (None, "correct", "wrong"):
+        raise HTTPException(status_code=400, detail="outcome must be 'correct' or 'wrong'")
+    if not search_supported(db.get_bind()):
+        raise HTTPException(status_code=501, detail="Search is not available on this database")
+    
+    return search_attempts(db, user.id, q, outcome=outcome, limit=limit, offset=offset)
+
+@router.get("/review")
+async def get_due_reviews(
+    token: str,
+    limit: int = Query(20, ge=1, le=50),
+    db: Session = Depends(get_tenant_db)
+):
+    """A review quiz of the user's due missed questions, most overdue first; no question generation involved"""
+    user = get_current_user(db, token)
+    
+    questions = due_reviews(db, user.id, limit)
+    upcoming = next_due_at(db, user.id) if not questions else None
+    return {
+        "questions": questions,
+        "count": len(questions),
+        "next_due_at": upcoming.isoformat() if upcoming else None
+    }
+
+@router.post("/review")
+async def submit_reviews(
+    token: str,
+    review_data: Dict[str, Any] = Body(...),
+    db: Session = Depends(get_tenant_db)
+):
+    """Grade answers to review questions and schedule each one's next review (SM-2)"""
+    user = get_current_user(db, token)
+    
+    answers = review_data.get("answers")
+    if not isinstance(answers, list) or not answers:
+        raise HTTPException(status_code=400, detail="answers must be a non-empty list")
+    for answer in answers:
+        if not isinstance(answer, dict) or not isinstance(answer.get("review_id"), int):
+            raise HTTPException(status_code=400, detail="Each answer needs an integer review_id")
+        grade = answer.get("grade")
+        if grade is None and answer.get("answer") is None:
+            raise HTTPException(status_code=400, detail="Each answer needs an answer or a grade")
+        if grade is not None and (not isinstance(grade, int) or not 0 <= grade <= 5):
+            raise HTTPException(status_code=400, detail="grade must be an integer from 0 to 5")
+    
+    results = grade_reviews(db, user.id, answers)
+    db.commit()
+    return {"reviewed": len(results), "results": results}
+
+@router.get("/progress")
+async def get_progress(
+    token: str,
+    days: int = Query(30, ge=1, le=365),
+    window: int = Query(7, ge=1, le=90),
+    topic_id: Optional[int] = None,
+    db: Session = Depends(get_tenant_db)
+):
+    """Daily accuracy with rolling windows, streaks and per-topic trends"""
+    user = get_current_user(db, token)
+    
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    # Enough history for the first rolling window and for the previous-window topic trend
+    since = min(start - timedelta(days=window - 1), end - timedelta(days=2 * window - 1))
+    
+    rows = db.query(
+        UserDailyProgress.day,
+        UserDailyProgress.topic_id,
+        UserDailyProgress.quizzes,
+        UserDailyProgress.questions,
+        UserDailyProgress.correct,
+        UserDailyProgress.score_sum,
+        UserDailyProgress.time_taken_sum
+    ).filter(
+        UserDailyProgress.user_id == user.id,
+        UserDailyProgress.day >= since
+    ).all()
+    
+    active_days = [day for (day,) in db.query(UserDailyProgress.day).filter(
+        UserDailyProgress.user_id == user.id,
+        UserDailyProgress.quizzes > 0
+    ).distinct().order_by(UserDailyProgress.day)]
+    
+    topics = topic_summary(rows, start, end, window)
+    names = dict(db.query(Topic.id, Topic.name).filter(
+        Topic.id.in_([t["topic_id"] for t in topics if t["topic_id"]])
+    ).all()) if topics else {}
+    for t in topics:
+        t["topic"] = names.get(t["topic_id"], "Other")
+    
+    series_rows = [row for row in rows if topic_id is None or row.topic_id == topic_id]
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "window_days": window,
+        **streaks(active_days, end),
+        "daily": daily_series(series_rows, start, end, window),
+        "by_topic": topics
+    }
+
 @router.get("/ongoing")
 async def get_ongoing_quizzes(
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Get user's ongoing quizzes"""
     user = get_current_user(db, token)
@@ -130,7 +285,7 @@ async def get_ongoing_quizzes(
 async def get_quiz_details(
     quiz_id: int,
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Get detailed results for a specific quiz"""
     user = get_current_user(db, token)
@@ -157,6 +312,8 @@ async def get_quiz_details(
         "time_taken": quiz.time_taken,
         "questions": quiz.questions_data,
         "user_answers": quiz.user_answers,
+        # Detailed explanations and reference links of missed questions, once the background pipeline has them
+        "enrichments": enrichments_for(quiz.questions_data, quiz.user_answers) if quiz.status == "completed" else {},
         "started_at": quiz.started_at.isoformat() if quiz.started_at else None,
         "completed_at": quiz.completed_at.isoformat() if quiz.completed_at else None
     }
@@ -164,24 +321,31 @@ async def get_quiz_details(
 @router.get("/performance-by-category")
 async def get_performance_by_category(
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Get user performance breakdown by topic"""
     user = get_current_user(db, token)
     
-    # Get all completed quizzes
-    quizzes = db.query(QuizAttempt).filter(
+    # Get all completed quizzes with their canonical topic
+    quizzes = db.query(
+        QuizAttempt.topic,
+        QuizAttempt.topic_id,
+        QuizAttempt.percentage,
+        QuizAttempt.total_questions,
+        QuizAttempt.correct_answers,
+        Topic.name.label("canonical_name")
+    ).outerjoin(Topic, Topic.id == QuizAttempt.topic_id).filter(
         QuizAttempt.user_id == user.id,
         QuizAttempt.status == "completed"
     ).all()
     
-    # Group by topic
+    # Group by canonical topic (raw topic text for attempts not yet backfilled)
     topic_stats = {}
     for quiz in quizzes:
-        topic_name = quiz.topic
-        if topic_name not in topic_stats:
-            topic_stats[topic_name] = {
-                "category": topic_name,
+        topic_key = quiz.topic_id if quiz.topic_id is not None else quiz.topic
+        if topic_key not in topic_stats:
+            topic_stats[topic_key] = {
+                "category": quiz.canonical_name or quiz.topic,
                 "icon": "📚",
                 "total_quizzes": 0,
                 "total_score": 0,
@@ -189,14 +353,14 @@ async def get_performance_by_category(
                 "total_correct": 0
             }
         
-        topic_stats[topic_name]["total_quizzes"] += 1
-        topic_stats[topic_name]["total_score"] += quiz.percentage
-        topic_stats[topic_name]["total_questions"] += quiz.total_questions
-        topic_stats[topic_name]["total_correct"] += quiz.correct_answers
+        topic_stats[topic_key]["total_quizzes"] += 1
+        topic_stats[topic_key]["total_score"] += quiz.percentage
+        topic_stats[topic_key]["total_questions"] += quiz.total_questions
+        topic_stats[topic_key]["total_correct"] += quiz.correct_answers
     
     # Calculate averages
     result = []
-    for topic_name, stats in topic_stats.items():
+    for stats in topic_stats.values():
         result.append({
             "category": stats["category"],
             "icon": stats["icon"],
@@ -211,7 +375,7 @@ async def get_performance_by_category(
 async def delete_quiz_attempt(
     quiz_id: int,
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Delete a quiz attempt (for ongoing quizzes)"""
     user = get_current_user(db, token)
@@ -224,16 +388,27 @@ async def delete_quiz_attempt(
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
+    if quiz.status == "completed":
+        record_completion(db, quiz, sign=-1)
+    remove_attempts(db, [quiz.id])
     db.delete(quiz)
     db.commit()
     
     return {"message": "Quiz deleted successfully"}
 
+def get_idempotency_key(quiz_data: Dict[str, Any], header_value: Optional[str]) -> Optional[str]:
+    """Per-quiz-session key from the body (sendBeacon cannot set headers) or the Idempotency-Key header"""
+    key = quiz_data.get("idempotency_key") or header_value
+    if key is not None and (not isinstance(key, str) or len(key) > 64):
+        raise HTTPException(status_code=400, detail="idempotency_key must be a string of at most 64 characters")
+    return key
+
 @router.post("/save-quiz")
 async def save_quiz_result(
     token: str,
     quiz_data: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_tenant_db)
 ):
     """Save quiz results after completion"""
     try:
@@ -242,66 +417,99 @@ async def save_quiz_result(
         # Get topic name
         topic_name = quiz_data.get("subcategory_name", quiz_data.get("topic", "Custom Quiz"))
         quiz_id = quiz_data.get("quiz_id")
+        key = get_idempotency_key(quiz_data, idempotency_key)
         
         print(f"Saving quiz for user {user.username}: {topic_name}, quiz_id: {quiz_id}")
         
-        # Check if this is updating an existing quiz (from resume)
-        if quiz_id:
-            # Update existing ongoing quiz
-            quiz_attempt = db.query(QuizAttempt).filter(
-                QuizAttempt.id == quiz_id,
-                QuizAttempt.user_id == user.id
-            ).first()
+        # A retried completion gets the first response back without touching the database
+        if key:
+            cached = dedupe_cache.get(("complete", user.id, key))
+            if cached is not None:
+                return cached
+        
+        for _ in range(3):
+            # Complete the attempt being resumed, or the one created by save-state for this quiz session
+            quiz_attempt = None
+            if quiz_id or key:
+                quiz_attempt = db.query(QuizAttempt).options(
+                    defer(QuizAttempt.questions_data), defer(QuizAttempt.user_answers)
+                ).filter(
+                    QuizAttempt.user_id == user.id,
+                    QuizAttempt.id == quiz_id if quiz_id else QuizAttempt.idempotency_key == key
+                ).first()
+                if quiz_id and not quiz_attempt:
+                    raise HTTPException(status_code=404, detail="Quiz not found")
+            
+            if quiz_attempt and quiz_attempt.status == "completed":
+                response = {"message": "Quiz already saved", "quiz_id": quiz_attempt.id}
+                break
+            
+            newly_created = quiz_attempt is None
+            if newly_created:
+                # Create new quiz attempt (fresh quiz, not resumed)
+                quiz_attempt = QuizAttempt(
+                    user_id=user.id,
+                    topic=topic_name,
+                    topic_id=shard_router.resolve_topic_id(db, topic_name),
+                    difficulty=quiz_data.get("difficulty", "medium"),
+                    total_questions=quiz_data.get("total_questions", 0),
+                    questions_data=None,  # Not storing full questions for completed quizzes
+                    user_answers={},  # Not storing individual answers for completed quizzes
+                    idempotency_key=key
+                )
+                db.add(quiz_attempt)
+            
+            quiz_attempt.correct_answers = quiz_data.get("correct_answers", 0)
+            quiz_attempt.incorrect_answers = quiz_data.get("total_questions", 0) - quiz_data.get("correct_answers", 0)
+            quiz_attempt.percentage = quiz_data.get("percentage", 0)
+            quiz_attempt.score = quiz_data.get("correct_answers", 0)
+            quiz_attempt.time_taken = quiz_data.get("time_taken", 0)
+            quiz_attempt.completed_at = datetime.utcnow()
+            quiz_attempt.status = "completed"
             
-            if quiz_attempt:
-                # Update to completed status
-                quiz_attempt.correct_answers = quiz_data.get("correct_answers", 0)
-                quiz_attempt.incorrect_answers = quiz_data.get("total_questions", 0) - quiz_data.get("correct_answers", 0)
-                quiz_attempt.percentage = quiz_data.get("percentage", 0)
-                quiz_attempt.score = quiz_data.get("correct_answers", 0)
-                quiz_attempt.time_taken = quiz_data.get("time_taken", 0)
-                quiz_attempt.completed_at = datetime.utcnow()
-                quiz_attempt.status = "completed"
-                
+            try:
+                if newly_created:
+                    # A client may send the questions and answers of a fresh quiz; they are not stored
+                    questions, answers = quiz_data.get("questions_data"), quiz_data.get("user_answers")
+                    db.flush()
+                    index_attempt(db, quiz_attempt, replace=False)
+                else:
+                    # Re-index with the final answers, so wrong answers can be searched for
+                    questions, answers = db.query(QuizAttempt.questions_data, QuizAttempt.user_answers).filter(
+                        QuizAttempt.id == quiz_attempt.id
+                    ).first()
+                    index_attempt(db, quiz_attempt, questions, answers)
+                queue_missed(db, quiz_attempt, questions, answers)
+                record_completion(db, quiz_attempt)
                 db.commit()
-                db.refresh(quiz_attempt)
-                
-                print(f"Quiz updated successfully with ID: {quiz_attempt.id}")
-                
-                return {
-                    "message": "Quiz updated successfully",
-                    "quiz_id": quiz_attempt.id
-                }
-            else:
-                raise HTTPException(status_code=404, detail="Quiz not found")
-        
-        # Create new quiz attempt (fresh quiz, not resumed)
-        quiz_attempt = QuizAttempt(
-            user_id=user.id,
-            topic=topic_name,
-            difficulty=quiz_data.get("difficulty", "medium"),
-            total_questions=quiz_data.get("total_questions", 0),
-            correct_answers=quiz_data.get("correct_answers", 0),
-            incorrect_answers=quiz_data.get("total_questions", 0) - quiz_data.get("correct_answers", 0),
-            percentage=quiz_data.get("percentage", 0),
-            score=quiz_data.get("correct_answers", 0),
-            time_taken=quiz_data.get("time_taken", 0),
-            completed_at=datetime.utcnow(),
-            questions_data=None,  # Not storing full questions for completed quizzes
-            user_answers={},  # Not storing individual answers for completed quizzes
-            status="completed"
-        )
-        
-        db.add(quiz_attempt)
-        db.commit()
-        db.refresh(quiz_attempt)
-        
-        print(f"Quiz saved successfully with ID: {quiz_attempt.id}")
+            except (StaleDataError, IntegrityError):
+                # Saved concurrently (autosave bumped the version, or a retry created the same
+                # quiz session); reload and decide again
+                db.rollback()
+                continue
+            
+            usage_rollups.record(
+                quiz_attempt.difficulty, topic_id=quiz_attempt.topic_id, completed=1,
+                score_sum=quiz_attempt.percentage, time_taken_sum=quiz_attempt.time_taken
+            )
+            dedupe_cache.discard(("state", quiz_attempt.id))
+            # Queue missed questions for detailed explanations
+            enrichment_pipeline.submit(quiz_attempt.topic, quiz_attempt.difficulty, questions, answers)
+            
+            print(f"Quiz saved successfully with ID: {quiz_attempt.id}")
+            response = {
+                "message": "Quiz saved successfully" if newly_created else "Quiz updated successfully",
+                "quiz_id": quiz_attempt.id
+            }
+            break
+        else:
+            raise HTTPException(status_code=409, detail="Quiz was modified concurrently, please retry")
         
-        return {
-            "message": "Quiz saved successfully",
-            "quiz_id": quiz_attempt.id
-        }
+        if key:
+            dedupe_cache.set(("complete", user.id, key), response)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error saving quiz: {str(e)}")
         db.rollback()
@@ -311,32 +519,29 @@ async def save_quiz_result(
 async def save_quiz_state(
     token: str,
     quiz_data: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db)
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_tenant_db)
 ):
     """Save ongoing quiz state for resume functionality"""
     try:
         user = get_current_user(db, token)
         quiz_id = quiz_data.get("quiz_id")
+        key = get_idempotency_key(quiz_data, idempotency_key)
         
-        if quiz_id:
-            # Update existing quiz
-            quiz = db.query(QuizAttempt).filter(
-                QuizAttempt.id == quiz_id,
-                QuizAttempt.user_id == user.id
-            ).first()
-            
-            if not quiz:
-                raise HTTPException(status_code=404, detail="Quiz not found")
-            
-            quiz.current_question_index = quiz_data.get("current_question_index", 0)
-            quiz.questions_data = quiz_data.get("questions_data")
-            quiz.user_answers = quiz_data.get("user_answers", {})
-            quiz.time_taken = quiz_data.get("time_taken", 0)
-        else:
+        # A create racing an autosave or a beacon for the same quiz session becomes an update
+        if not quiz_id and key:
+            quiz_id = dedupe_cache.get(("create", user.id, key)) or db.query(QuizAttempt.id).filter(
+                QuizAttempt.user_id == user.id,
+                QuizAttempt.idempotency_key == key
+            ).scalar()
+        
+        if not quiz_id:
             # Create new ongoing quiz
+            topic_name = quiz_data.get("topic", "Custom Quiz")
             quiz = QuizAttempt(
                 user_id=user.id,
-                topic=quiz_data.get("topic", "Custom Quiz"),
+                topic=topic_name,
+                topic_id=shard_router.resolve_topic_id(db, topic_name),
                 difficulty=quiz_data.get("difficulty", "medium"),
                 total_questions=quiz_data.get("total_questions", 0),
                 current_question_index=quiz_data.get("current_question_index", 0),
@@ -344,27 +549,118 @@ async def save_quiz_state(
                 user_answers=quiz_data.get("user_answers", {}),
                 time_taken=quiz_data.get("time_taken", 0),
                 status="ongoing",
-                started_at=datetime.utcnow()
+                started_at=datetime.utcnow(),
+                idempotency_key=key
             )
             db.add(quiz)
+            try:
+                db.flush()
+                quiz_id = quiz.id
+                index_attempt(db, quiz, quiz.questions_data, replace=False)
+                db.commit()
+            except IntegrityError:
+                # Lost the race to create this quiz session: apply the state as an update below
+                db.rollback()
+                quiz_id = db.query(QuizAttempt.id).filter(
+                    QuizAttempt.user_id == user.id,
+                    QuizAttempt.idempotency_key == key
+                ).scalar()
+            else:
+                usage_rollups.record(quiz.difficulty, topic_id=quiz.topic_id, started=1)
+                if key:
+                    dedupe_cache.set(("create", user.id, key), quiz_id)
+                dedupe_cache.set(("state", quiz_id), (
+                    user.id, 1, payload_digest(quiz_state(quiz_data)), payload_digest(quiz_data.get("questions_data"))
+                ))
+                return {
+                    "message": "Quiz state saved successfully",
+                    "quiz_id": quiz_id,
+                    "version": 1,
+                    "applied": True
+                }
         
-        db.commit()
-        db.refresh(quiz)
-        
-        return {
-            "message": "Quiz state saved successfully",
-            "quiz_id": quiz.id
-        }
+        return update_quiz_state(db, user.id, quiz_id, quiz_data)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error saving quiz state: {str(e)}")
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save quiz state: {str(e)}")
 
+def quiz_state(quiz_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The mutable part of an ongoing quiz, as written by save-state"""
+    return {
+        "current_question_index": quiz_data.get("current_question_index", 0),
+        "user_answers": quiz_data.get("user_answers", {}),
+        "time_taken": quiz_data.get("time_taken", 0)
+    }
+
+def update_quiz_state(db: Session, user_id: int, quiz_id: int, quiz_data: Dict[str, Any]):
+    """
+    Compare-and-set update of an ongoing quiz. With `version` in the body the
+    write only applies if the row is still at that version; a repeat of the
+    last applied state, a stale version or a finished quiz is a no-op.
+    """
+    expected_version = quiz_data.get("version")
+    state = quiz_state(quiz_data)
+    questions = quiz_data.get("questions_data")
+    state_digest, questions_digest = payload_digest(state), payload_digest(questions)
+    
+    cached = dedupe_cache.get(("state", quiz_id))
+    if cached is not None and cached[0] != user_id:
+        cached = None
+    if (expected_version is not None and cached is not None and expected_version <= cached[1]
+            and cached[2] == state_digest and cached[3] == questions_digest):
+        # Same state as the last applied save (autosave and beacon racing): nothing to write.
+        # Versions only grow, so such a save cannot change the stored state; one based on a newer
+        # version than the cached one follows a save by another worker and goes to the database
+        return {"message": "Quiz state unchanged", "quiz_id": quiz_id, "version": cached[1], "applied": False}
+    
+    values = {**state, "version": QuizAttempt.version + 1}
+    if cached is None or cached[3] != questions_digest:
+        values["questions_data"] = questions  # questions never change after creation, skip rewriting the blob
+    
+    stmt = update(QuizAttempt).where(
+        QuizAttempt.id == quiz_id,
+        QuizAttempt.user_id == user_id,
+        QuizAttempt.status == "ongoing"
+    ).values(**values).execution_options(synchronize_session=False)
+    if expected_version is not None:
+        stmt = stmt.where(QuizAttempt.version == expected_version)
+    if db.get_bind().dialect.update_returning:
+        new_version = db.execute(stmt.returning(QuizAttempt.version)).scalar()
+    elif db.execute(stmt).rowcount:
+        new_version = expected_version + 1 if expected_version is not None else db.query(
+            QuizAttempt.version).filter(QuizAttempt.id == quiz_id).scalar()
+    else:
+        new_version = None
+    
+    if new_version is None:
+        db.rollback()
+        current = db.query(QuizAttempt.version, QuizAttempt.status).filter(
+            QuizAttempt.id == quiz_id,
+            QuizAttempt.user_id == user_id
+        ).first()
+        if not current:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        return {
+            "message": "Quiz state not saved: quiz is no longer ongoing" if current.status != "ongoing"
+            else "Quiz state not saved: a newer state was already saved",
+            "quiz_id": quiz_id,
+            "version": current.version,
+            "status": current.status,
+            "applied": False
+        }
+    
+    db.commit()
+    dedupe_cache.set(("state", quiz_id), (user_id, new_version, state_digest, questions_digest))
+    return {"message": "Quiz state saved successfully", "quiz_id": quiz_id, "version": new_version, "applied": True}
+
 @router.get("/resume/{quiz_id}")
 async def resume_quiz(
     quiz_id: int,
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Get saved quiz state to resume"""
     user = get_current_user(db, token)
@@ -387,5 +683,42 @@ async def resume_quiz(
         "questions_data": quiz.questions_data,
         "user_answers": quiz.user_answers,
         "time_taken": quiz.time_taken or 0,
-        "started_at": quiz.started_at.isoformat() if quiz.started_at else None
+        "started_at": quiz.started_at.isoformat() if quiz.started_at else None,
+        "version": quiz.version
     }
+
+@router.websocket("/session/{quiz_id}")
+async def quiz_session(websocket: WebSocket, quiz_id: int, token: str):
+    """
+    Live channel for an ongoing quiz: authenticate once, then stream answer,
+    navigation and timer events instead of posting the whole state to save-state
+    """
+    await websocket.accept()
+    try:
+        session = await quiz_sessions.open(token, quiz_id, websocket)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+    
+    try:
+        await websocket.send_json({"type": "ready", **session.state()})
+        while True:
+            try:
+                event = await websocket.receive_json()
+                if not isinstance(event, dict):
+                    raise ValueError("Events must be JSON objects")
+                session.apply(event)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            quiz_session_events_total.inc((event["type"],))
+            if event["type"] == "flush":
+                try:
+                    await quiz_sessions.flush(session)
+                except SessionClosed as e:
+                    await quiz_sessions.close_sockets(session, e.status)
+                    return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await quiz_sessions.close(session, websocket)
@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Optional
+import asyncio
+import json
+
+from database import get_db, SessionLocal
+from models import GenerationJob
+from routes.analytics_routes import require_admin
+from routes.question_routes import GenerateQuestionsRequest, get_client_key, question_controller
+from utils.job_queue import JobWorkerPool, enqueue_job, job_to_dict, TERMINAL_STATUSES
+from utils.rate_limiter import enforce_rate_limit
+from utils.tracing import TracedRoute
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"], route_class=TracedRoute)
+
+# Background workers, started and stopped with the app
+job_worker_pool = JobWorkerPool(handler=question_controller.handle_generation_job)
+
+def get_job_or_404(db: Session, job_id: str, client_key: str) -> GenerationJob:
+    """The job, if the caller may see it: jobs of a signed-in user are only shown to that user"""
+    job = db.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+    if not job or (job.client_key.startswith("user:") and job.client_key != client_key):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("", status_code=202)
+async def create_generation_job(
+    request: GenerateQuestionsRequest,
+    http_request: Request,
+    token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Queue a question generation job and return its id for polling"""
+    client_key = get_client_key(http_request, token)
+    enforce_rate_limit(client_key, cost=request.number_questions)
+
+    job = enqueue_job(
+        db,
+        client_key=client_key,
+        topic=request.topic,
+        number_questions=request.number_questions,
+        difficulty=request.difficulty
+    )
+    job_worker_pool.notify()
+
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/metrics")
+async def get_job_metrics(token: str, db: Session = Depends(get_db)):
+    """Worker counters and queue depth by status (admin only)"""
+    require_admin(token)
+    counts = db.query(GenerationJob.status, func.count(GenerationJob.id)).group_by(GenerationJob.status).all()
+    return {
+        **job_worker_pool.metrics(),
+        "jobs_by_status": {job_status: count for job_status, count in counts}
+    }
+
+@router.get("/{job_id}")
+async def get_generation_job(
+    job_id: str,
+    http_request: Request,
+    token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get job status, and the generated questions once it has succeeded"""
+    return job_to_dict(get_job_or_404(db, job_id, get_client_key(http_request, token)))
+
+@router.get("/{job_id}/stream")
+async def stream_generation_job(
+    job_id: str,
+    http_request: Request,
+    token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Stream job status changes as server-sent events until the job finishes"""
+    get_job_or_404(db, job_id, get_client_key(http_request, token))
+
+    def load_job():
+        session = SessionLocal()
+        try:
+            job = session.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+            return job_to_dict(job) if job else None
+        finally:
+            session.close()
+
+    async def events():
+        last_status = None
+        while True:
+            job = await run_in_threadpool(load_job)
+            if job is None:
+                return
+            if job["status"] != last_status or job["status"] in TERMINAL_STATUSES:
+                last_status = job["status"]
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
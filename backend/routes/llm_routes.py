@@ -0,0 +1,121 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, select, and_, or_
+from datetime import datetime, timedelta
+
+from database import get_db
+from models import LLMCall
+from utils.llm_ledger import llm_ledger, call_cost
+from utils.enrichment import enrichment_pipeline
+from routes.analytics_routes import require_admin
+from routes.question_routes import question_controller
+
+router = APIRouter(prefix="/api/llm", tags=["llm"])
+
+PERCENTILES = (50, 90, 95, 99)
+
+def latency_percentiles(db: Session, since: datetime, group=None):
+    """
+    Nearest-rank latency percentiles per value of `group` (one None group
+    without it), ranked in SQL so only the percentile rows are fetched
+    """
+    partition = [group] if group is not None else None
+    ranked = select(
+        (group if group is not None else LLMCall.model).label("group_key"),
+        LLMCall.latency_ms,
+        func.row_number().over(partition_by=partition, order_by=LLMCall.latency_ms).label("rank"),
+        func.count().over(partition_by=partition).label("calls")
+    ).where(LLMCall.created_at >= since).subquery()
+    # rank is ceil(pct * calls / 100): rank * 100 >= pct * calls > (rank - 1) * 100
+    at_rank = {
+        pct: and_(ranked.c.rank * 100 >= pct * ranked.c.calls, (ranked.c.rank - 1) * 100 < pct * ranked.c.calls)
+        for pct in PERCENTILES
+    }
+    rows = db.execute(
+        select(ranked.c.group_key, ranked.c.calls, ranked.c.latency_ms,
+               *[case((condition, 1), else_=0).label(f"p{pct}") for pct, condition in at_rank.items()])
+        .where(or_(*at_rank.values()))
+    ).all()
+
+    summaries = {}
+    for row in rows:
+        key = row.group_key if group is not None else None
+        summary = summaries.setdefault(key, {"calls": row.calls, **{f"p{pct}_ms": None for pct in PERCENTILES}})
+        for pct in PERCENTILES:
+            if getattr(row, f"p{pct}"):
+                summary[f"p{pct}_ms"] = round(row.latency_ms, 1)
+    return summaries
+
+@router.get("/latency")
+async def get_llm_latency(
+    token: str,
+    hours: int = Query(24, ge=1, le=24 * 90),
+    db: Session = Depends(get_db)
+):
+    """Latency percentiles and outcome counts of LLM calls in the last `hours` (admins only)"""
+    require_admin(token)
+    since = datetime.utcnow() - timedelta(hours=hours)
+
+    outcomes = dict(db.query(LLMCall.outcome, func.count(LLMCall.id)).filter(
+        LLMCall.created_at >= since
+    ).group_by(LLMCall.outcome).all())
+    overall = latency_percentiles(db, since).get(None, {})
+    by_model = latency_percentiles(db, since, LLMCall.model)
+
+    total = sum(outcomes.values())
+    return {
+        "window_hours": hours,
+        "calls": total,
+        "outcomes": outcomes,
+        "parse_error_rate": round(outcomes.get("parse_error", 0) / total, 4) if total else 0,
+        "latency": {f"p{pct}_ms": overall.get(f"p{pct}_ms") for pct in PERCENTILES},
+        "by_model": by_model,
+        "ledger": llm_ledger.metrics(),
+        "keys": question_controller.llm_key_status(),
+        "resilience": question_controller.llm_resilience_status(),
+        "enrichment": enrichment_pipeline.metrics()
+    }
+
+@router.get("/cost")
+async def get_llm_cost(
+    token: str,
+    hours: int = Query(24 * 7, ge=1, le=24 * 90),
+    db: Session = Depends(get_db)
+):
+    """Token usage, estimated cost and cost per valid question by topic and difficulty (admins only)"""
+    require_admin(token)
+    since = datetime.utcnow() - timedelta(hours=hours)
+
+    groups = db.query(
+        LLMCall.topic,
+        LLMCall.difficulty,
+        func.count(LLMCall.id).label("calls"),
+        func.sum(case((LLMCall.outcome == "parse_error", 1), else_=0)).label("parse_errors"),
+        func.sum(LLMCall.number_questions).label("requested_questions"),
+        func.sum(LLMCall.valid_questions).label("valid_questions"),
+        func.sum(LLMCall.prompt_tokens).label("prompt_tokens"),
+        func.sum(LLMCall.completion_tokens).label("completion_tokens"),
+        func.avg(LLMCall.latency_ms).label("avg_latency_ms")
+    ).filter(
+        LLMCall.created_at >= since
+    ).group_by(LLMCall.topic, LLMCall.difficulty).all()
+
+    result = []
+    for g in groups:
+        cost = call_cost(g.prompt_tokens or 0, g.completion_tokens or 0)
+        valid = g.valid_questions or 0
+        result.append({
+            "topic": g.topic,
+            "difficulty": g.difficulty,
+            "calls": g.calls,
+            "parse_error_rate": round((g.parse_errors or 0) / g.calls, 4) if g.calls else 0,
+            "requested_questions": g.requested_questions or 0,
+            "valid_questions": valid,
+            "prompt_tokens": g.prompt_tokens or 0,
+            "completion_tokens": g.completion_tokens or 0,
+            "cost_usd": round(cost, 6),
+            "cost_per_question_usd": round(cost / valid, 6) if valid else None,
+            "avg_latency_ms": round(g.avg_latency_ms or 0, 1)
+        })
+
+    return sorted(result, key=lambda x: x["cost_usd"], reverse=True)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
-from database import get_db
+from utils.sharding import shard_router, get_tenant_db
 from models import User, UserPreference
 from auth_utils import verify_token, get_password_hash
 
@@ -31,7 +31,7 @@ def get_current_user(db: Session, token: str):
     return user
 
 @router.get("/me")
-async def get_profile(token: str, db: Session = Depends(get_db)):
+async def get_profile(token: str, db: Session = Depends(get_tenant_db)):
     """Get current user profile"""
     user = get_current_user(db, token)
     
@@ -49,7 +49,7 @@ async def get_profile(token: str, db: Session = Depends(get_db)):
 async def update_profile(
     profile: ProfileUpdate,
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Update user profile"""
     user = get_current_user(db, token)
@@ -63,6 +63,8 @@ async def update_profile(
         ).first()
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
+        # Emails are unique across shards through the directory
+        shard_router.change_email(user.username, profile.email)
         user.email = profile.email
     
     if profile.avatar is not None:
@@ -85,7 +87,7 @@ async def update_profile(
 async def change_password(
     password_data: PasswordChange,
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Change user password"""
     from auth_utils import verify_password
@@ -103,7 +105,7 @@ async def change_password(
     return {"message": "Password changed successfully"}
 
 @router.get("/preferences")
-async def get_preferences(token: str, db: Session = Depends(get_db)):
+async def get_preferences(token: str, db: Session = Depends(get_tenant_db)):
     """Get user preferences"""
     user = get_current_user(db, token)
     
@@ -126,7 +128,7 @@ async def get_preferences(token: str, db: Session = Depends(get_db)):
 async def update_preferences(
     preferences: PreferenceUpdate,
     token: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_tenant_db)
 ):
     """Update user preferences"""
     user = get_current_user(db, token)
@@ -154,7 +156,7 @@ async def update_preferences(
     }
 
 @router.get("/stats")
-async def get_profile_stats(token: str, db: Session = Depends(get_db)):
+async def get_profile_stats(token: str, db: Session = Depends(get_tenant_db)):
     """Get user profile statistics"""
     from models import QuizAttempt
     
@@ -1,14 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Literal, Union
+from typing import List, Dict, Any, Literal, Optional, Union
+from datetime import datetime
+import json
 from controllers.question_controller import QuestionController
+from auth_utils import verify_token
+from routes.analytics_routes import require_admin
+from utils.rate_limiter import enforce_rate_limit, llm_slot, admission_metrics
+from utils.metrics import registry
+from utils.batch_generation import BATCH_MAX_ITEMS, build_archive, generate_batch, plan_batch
+from utils.tracing import TracedRoute
 
 # Create router
-router = APIRouter(prefix="/api", tags=["questions"])
+router = APIRouter(prefix="/api", tags=["questions"], route_class=TracedRoute)
 
-# Initialize controller
+# Initialize controller (cheap: the Gemini client is built on first use)
 question_controller = QuestionController()
 
+registry.gauge_callback(
+    "llm_key_available", "1 while a Gemini API key is in rotation, 0 during its cooldown", ("key",),
+    lambda: {(k["key"],): 1.0 if k["available"] else 0.0 for k in question_controller.llm_key_status()})
+
 # Request models
 class GenerateQuestionsRequest(BaseModel):
     topic: str = Field(..., min_length=1, max_length=200, description="Topic for question generation")
@@ -27,8 +40,26 @@ class Question(BaseModel):
 class GenerateQuestionsResponse(BaseModel):
     questions: List[Question]
 
+class BatchGenerateRequest(BaseModel):
+    items: List[GenerateQuestionsRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    reuse_banked: bool = Field(True, description="Fill items from earlier generations of the same topic and difficulty first")
+
+def get_client_key(http_request: Request, token: Optional[str]) -> str:
+    """Identify the caller for rate limiting: the user if a valid token is given, else the client IP"""
+    if token:
+        try:
+            return f"user:{verify_token(token)}"
+        except HTTPException:
+            pass
+    host = http_request.client.host if http_request.client else "unknown"
+    return f"ip:{host}"
+
 @router.post("/generate-questions", response_model=GenerateQuestionsResponse)
-async def generate_questions(request: GenerateQuestionsRequest):
+async def generate_questions(
+    request: GenerateQuestionsRequest,
+    http_request: Request,
+    token: Optional[str] = None
+):
     """
     Generate questions for a given topic using Gemini LLM
     
@@ -39,14 +70,20 @@ async def generate_questions(request: GenerateQuestionsRequest):
         GenerateQuestionsResponse: Response containing generated questions
         
     Raises:
-        HTTPException: If there's an error in question generation
+        HTTPException: If there's an error in question generation,
+            429 if the caller is over its rate limit, 503 if the LLM queue is full
     """
+    client_key = get_client_key(http_request, token)
+    enforce_rate_limit(client_key, cost=request.number_questions)
+
     try:
-        result = await question_controller.generate_questions(
-            topic=request.topic,
-            number_questions=request.number_questions,
-            difficulty=request.difficulty
-        )
+        async with llm_slot(client_key, charged=request.number_questions):
+            result = await question_controller.generate_questions(
+                topic=request.topic,
+                number_questions=request.number_questions,
+                difficulty=request.difficulty,
+                client_key=client_key
+            )
         return result
     except HTTPException:
         raise
@@ -54,4 +91,54 @@ async def generate_questions(request: GenerateQuestionsRequest):
         raise HTTPException(
             status_code=500,
             detail=f"Unexpected error: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/generate-batch")
+async def generate_batch_questions(
+    request: BatchGenerateRequest,
+    token: str,
+    fmt: str = Query("ndjson", alias="format")
+):
+    """
+    Generate quizzes for many (topic, difficulty, count) items at once
+
+    With format=ndjson (default) each item's result is streamed as one JSON
+    line as soon as it completes, in completion order, followed by a summary
+    line with throughput. format=zip returns a single archive once every
+    item is done. A failed item is reported on its own line (or file) and
+    does not stop the others.
+
+    Raises:
+        HTTPException: 401 without a valid token, 429 if the questions to
+            generate exceed the caller's rate limit
+    """
+    username = verify_token(token)
+    if fmt not in ("ndjson", "zip"):
+        raise HTTPException(status_code=400, detail="format must be one of: ndjson, zip")
+
+    client_key = f"user:{username}"
+    specs = [(item.topic, item.difficulty, item.number_questions) for item in request.items]
+    banked = await plan_batch(specs, client_key, reuse_banked=request.reuse_banked)
+    results = generate_batch(specs, banked, client_key, question_controller.generate_questions)
+
+    if fmt == "zip":
+        archive = build_archive([result async for result in results])
+        filename = f"quiz-batch-{username}-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"
+        return Response(archive, media_type="application/zip",
+                        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+    async def lines():
+        try:
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        finally:
+            # Cancels the items still generating if the client disconnects
+            await results.aclose()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.get("/admission-metrics")
+async def get_admission_metrics(token: str):
+    """Rate limiter and LLM queue counters (admin only)"""
+    require_admin(token)
+    return admission_metrics()
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from database import SessionLocal
+from models import GenerationJob, QuizAttempt, User
+from auth_utils import verify_token
+from routes.question_routes import Question
+from utils.rooms import room_manager, ROOM_QUESTION_SECONDS
+from utils.sharding import shard_router
+
+router = APIRouter(prefix="/rooms", tags=["rooms"])
+
+class RoomCreate(BaseModel):
+    # One source of questions: one of the host's quizzes, a finished generation job, or the questions themselves
+    quiz_id: Optional[int] = None
+    job_id: Optional[str] = None
+    questions: Optional[List[Question]] = None
+    topic: Optional[str] = None
+    difficulty: Optional[str] = None
+    question_seconds: int = Field(ROOM_QUESTION_SECONDS, ge=5, le=300)
+
+def load_questions(username: str, request: RoomCreate):
+    """The room's (topic, difficulty, questions) from the request's source"""
+    if request.quiz_id is not None:
+        with shard_router.tenant_session(username) as db:
+            quiz = db.query(
+                QuizAttempt.topic, QuizAttempt.difficulty, QuizAttempt.questions_data
+            ).join(User, User.id == QuizAttempt.user_id).filter(
+                QuizAttempt.id == request.quiz_id, User.username == username
+            ).first()
+        if not quiz:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        topic, difficulty, questions = quiz.topic, quiz.difficulty, quiz.questions_data
+    elif request.job_id is not None:
+        db = SessionLocal()
+        try:
+            job = db.query(
+                GenerationJob.topic, GenerationJob.difficulty, GenerationJob.status, GenerationJob.result
+            ).filter(GenerationJob.id == request.job_id, GenerationJob.client_key == f"user:{username}").first()
+        finally:
+            db.close()
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.status != "succeeded":
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+        topic, difficulty, questions = job.topic, job.difficulty, (job.result or {}).get("questions")
+    elif request.questions:
+        topic, difficulty = request.topic or "Live quiz", request.difficulty or "mixed"
+        questions = [question.model_dump() for question in request.questions]
+    else:
+        raise HTTPException(status_code=400, detail="Provide quiz_id, job_id or questions")
+
+    questions = [
+        {k: question.get(k) for k in ("question", "options", "answers", "explanation")}
+        for question in questions or []
+        if isinstance(question, dict) and question.get("question") and question.get("options")
+        and question.get("answers")
+    ]
+    if not questions:
+        raise HTTPException(status_code=400, detail="The quiz has no questions to play")
+    return request.topic or topic, request.difficulty or difficulty, questions
+
+@router.post("")
+async def create_room(request: RoomCreate, token: str):
+    """Open a live room for a quiz; players join with the returned code"""
+    username = verify_token(token)
+    topic, difficulty, questions = await run_in_threadpool(load_questions, username, request)
+    room = room_manager.create(username, topic, difficulty, questions, request.question_seconds)
+    return room.summary()
+
+@router.get("/{code}")
+async def get_room(code: str, token: str):
+    """Room status and the current top of the scoreboard"""
+    verify_token(token)
+    room = room_manager.get(code)
+    return {**room.summary(), "leaders": room.leaders()}
+
+@router.websocket("/{code}/ws")
+async def room_socket(websocket: WebSocket, code: str, token: str):
+    """
+    Live channel of a room: the host sends start/next/reveal/end, players
+    send answers, and everyone receives questions, scoreboards and results
+    """
+    await websocket.accept()
+    try:
+        username = verify_token(token)
+        room, connection = room_manager.join(code, username, websocket)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=str(e.detail))
+        return
+
+    try:
+        while True:
+            try:
+                event = await websocket.receive_json()
+                if not isinstance(event, dict):
+                    raise ValueError("Events must be JSON objects")
+                await room_manager.handle(room, connection, event)
+            except ValueError as e:
+                connection.send_json({"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await room_manager.leave(room, connection)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Summaries of exported traces (TRACE_FILE, JSON lines).
+
+    python trace_report.py [FILE] [--sort p95|total|self|max] [--top 20] [--operation PREFIX]
+    python trace_report.py [FILE] --slowest 10 [--operation PREFIX]
+    python trace_report.py [FILE] --trace <trace_id>
+
+The default report groups spans by operation (span name) with their
+count, latency percentiles and self time: the time not covered by child
+spans, e.g. request validation in a fastapi.handler span or output
+parsing in an llm.invoke span. --slowest lists the slowest traces (or
+spans of one operation) and --trace prints one trace as a tree.
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+from utils.tracing import TRACE_FILE
+
+
+def load_spans(path: str):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+
+def self_times(spans):
+    """span_id -> duration minus the time covered by its direct children (overlaps merged)."""
+    children = defaultdict(list)
+    for s in spans:
+        if s["parent_id"]:
+            children[(s["trace_id"], s["parent_id"])].append((s["start"], s["start"] + s["duration_ms"] / 1000))
+    result = {}
+    for s in spans:
+        covered, end = 0.0, None
+        for child_start, child_end in sorted(children.get((s["trace_id"], s["span_id"]), ())):
+            if end is None or child_start > end:
+                covered += child_end - child_start
+                end = child_end
+            elif child_end > end:
+                covered += child_end - end
+                end = child_end
+        result[s["span_id"]] = max(0.0, s["duration_ms"] - covered * 1000)
+    return result
+
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(pct / 100 * len(sorted_values)))]
+
+
+def print_summary(spans, own, sort: str, top: int):
+    by_operation = defaultdict(list)
+    for s in spans:
+        by_operation[s["name"]].append(s)
+
+    rows = []
+    for name, group in by_operation.items():
+        durations = sorted(s["duration_ms"] for s in group)
+        own_times = sorted(own[s["span_id"]] for s in group)
+        rows.append({
+            "operation": name,
+            "count": len(group),
+            "errors": sum(1 for s in group if s["status"] != "ok"),
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "max": durations[-1],
+            "total": sum(durations),
+            "self": percentile(own_times, 50),
+            "self_total": sum(own_times),
+        })
+    key = {"p95": "p95", "total": "total", "self": "self_total", "max": "max"}[sort]
+    rows.sort(key=lambda row: row[key], reverse=True)
+
+    width = max([len("operation")] + [len(row["operation"]) for row in rows[:top]])
+    print(f"{'operation':<{width}} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+          f"{'total ms':>10} {'self p50':>9} {'self total':>11}")
+    for row in rows[:top]:
+        print(f"{row['operation']:<{width}} {row['count']:>7} {row['errors']:>7} {row['p50']:>9.1f} "
+              f"{row['p95']:>9.1f} {row['max']:>9.1f} {row['total']:>10.0f} {row['self']:>9.1f} "
+              f"{row['self_total']:>11.0f}")
+    traces = len({s["trace_id"] for s in spans})
+    print(f"\n{len(spans):,} spans in {traces:,} traces; sorted by {sort}")
+
+
+def print_slowest(spans, count: int, operation):
+    if operation:
+        candidates = [s for s in spans if s["name"].startswith(operation)]
+    else:
+        candidates = [s for s in spans if not s["parent_id"]]
+    candidates.sort(key=lambda s: s["duration_ms"], reverse=True)
+    for s in candidates[:count]:
+        detail = s["attributes"].get("http.status_code", s["status"])
+        print(f"{s['duration_ms']:>10.1f} ms  {s['trace_id']}  {s['name']}  ({detail})")
+
+
+def print_trace(spans, trace_id: str):
+    trace = [s for s in spans if s["trace_id"].startswith(trace_id)]
+    if not trace:
+        sys.exit(f"No spans for trace {trace_id}")
+    own = self_times(trace)
+    children = defaultdict(list)
+    ids = {s["span_id"] for s in trace}
+    roots = []
+    for s in sorted(trace, key=lambda s: s["start"]):
+        if s["parent_id"] in ids:
+            children[s["parent_id"]].append(s)
+        else:
+            roots.append(s)
+    origin = min(s["start"] for s in trace)
+
+    def show(s, depth):
+        offset = (s["start"] - origin) * 1000
+        status = "" if s["status"] == "ok" else f"  [{s['status']}: {s['error']}]"
+        attributes = {k: v for k, v in s["attributes"].items() if k != "db.statement"}
+        statement = s["attributes"].get("db.statement")
+        print(f"{offset:>9.1f} {s['duration_ms']:>9.1f} {own[s['span_id']]:>9.1f}  {'  ' * depth}{s['name']}"
+              f"{'  ' + json.dumps(attributes) if attributes else ''}{status}")
+        if statement:
+            print(f"{'':>30}  {'  ' * depth}  {' '.join(statement.split())[:120]}")
+        for child in children[s["span_id"]]:
+            show(child, depth + 1)
+
+    print(f"{'start ms':>9} {'dur ms':>9} {'self ms':>9}  span")
+    for root in roots:
+        show(root, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summaries of exported traces")
+    parser.add_argument("file", nargs="?", default=TRACE_FILE, help=f"JSON lines of spans (default {TRACE_FILE})")
+    parser.add_argument("--sort", choices=("p95", "total", "self", "max"), default="p95")
+    parser.add_argument("--top", type=int, default=20, help="operations to show")
+    parser.add_argument("--operation", help="only spans whose name starts with this")
+    parser.add_argument("--slowest", type=int, help="list the slowest traces (or spans of --operation)")
+    parser.add_argument("--trace", help="print one trace (id or prefix) as a tree")
+    args = parser.parse_args()
+
+    try:
+        spans = load_spans(args.file)
+    except FileNotFoundError:
+        sys.exit(f"{args.file} not found; set TRACE_SAMPLE_RATE or TRACE_SLOW_MS to record traces")
+    if args.trace:
+        print_trace(spans, args.trace)
+    elif args.slowest:
+        print_slowest(spans, args.slowest, args.operation)
+    else:
+        own = self_times(spans)
+        if args.operation:
+            spans = [s for s in spans if s["name"].startswith(args.operation)]
+        if not spans:
+            sys.exit("No spans")
+        print_summary(spans, own, args.sort, args.top)
+
+
+if __name__ == "__main__":
+    main()
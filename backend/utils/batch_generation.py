@@ -0,0 +1,251 @@
+import asyncio
+import io
+import json
+import os
+import re
+import time
+import zipfile
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from database import SessionLocal
+from models import GenerationJob
+from utils.job_queue import record_job
+from utils.metrics import registry
+from utils.rate_limiter import LLM_MAX_CONCURRENCY, QueueFullError, enforce_rate_limit, generation_limiter, llm_queue
+from utils.topics import normalize_topic
+from utils.tracing import span
+
+load_dotenv()
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+# Items of one batch generating at once; each still needs a slot in the global LLM queue
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+BATCH_QUEUE_WAIT = float(os.getenv("BATCH_QUEUE_WAIT", "120"))  # seconds an item waits while the LLM queue is full
+BATCH_BANK_SCAN = int(os.getenv("BATCH_BANK_SCAN", "5000"))  # most recent succeeded jobs searched for banked questions
+BANK_LOAD_CHUNK = 50
+
+QUESTION_FIELDS = ("question", "options", "answers", "explanation")
+
+Generate = Callable[..., Awaitable[Dict[str, List[Dict[str, Any]]]]]
+
+batch_items_total = registry.counter(
+    "batch_items_total", "Bulk generation items by outcome", ("outcome",))
+batch_questions_total = registry.counter(
+    "batch_questions_total", "Questions returned by bulk generation, by where they came from", ("source",))
+
+
+def _question_key(question: Dict[str, Any]) -> str:
+    return " ".join(str(question.get("question", "")).split()).casefold()
+
+
+def load_banked_questions(specs: Sequence[Tuple[str, str, int]]) -> List[List[Dict[str, Any]]]:
+    """
+    Questions from earlier succeeded generation jobs for each (topic, difficulty, count) spec.
+
+    Jobs match on the canonical topic key and the difficulty, newest first.
+    Specs sharing a key draw from one pool in order, so the same question is
+    not handed to two of them; each gets at most its count.
+    """
+    needed: Dict[Tuple[str, str], int] = defaultdict(int)
+    for topic, difficulty, count in specs:
+        needed[(normalize_topic(topic), difficulty)] += count
+
+    pools: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    seen: Dict[Tuple[str, str], set] = defaultdict(set)
+    db = SessionLocal()
+    try:
+        rows = db.query(GenerationJob.id, GenerationJob.topic, GenerationJob.difficulty).filter(
+            GenerationJob.status == "succeeded",
+            GenerationJob.difficulty.in_({difficulty for _, difficulty in needed})
+        ).order_by(GenerationJob.finished_at.desc()).limit(BATCH_BANK_SCAN).all()
+        matches = [(row.id, (normalize_topic(row.topic), row.difficulty)) for row in rows]
+        matches = [(job_id, key) for job_id, key in matches if key in needed]
+
+        # Load results a chunk of jobs at a time, only for keys whose pool is still short
+        while matches:
+            chunk = [(job_id, key) for job_id, key in matches[:BANK_LOAD_CHUNK] if len(pools[key]) < needed[key]]
+            matches = matches[BANK_LOAD_CHUNK:]
+            if not chunk:
+                continue
+            results = dict(db.query(GenerationJob.id, GenerationJob.result).filter(
+                GenerationJob.id.in_([job_id for job_id, _ in chunk])).all())
+            for job_id, key in chunk:
+                for question in (results.get(job_id) or {}).get("questions") or []:
+                    text = _question_key(question)
+                    if text and text not in seen[key] and len(pools[key]) < needed[key]:
+                        seen[key].add(text)
+                        pools[key].append({field: question.get(field) for field in QUESTION_FIELDS})
+    finally:
+        db.close()
+
+    banked = []
+    for topic, difficulty, count in specs:
+        pool = pools[(normalize_topic(topic), difficulty)]
+        banked.append(pool[:count])
+        del pool[:count]
+    return banked
+
+
+async def _generate_item(generate: Generate, client_key: str, topic: str, count: int, difficulty: str):
+    """Generate with a slot in the global LLM queue, waiting out QueueFullError for up to BATCH_QUEUE_WAIT."""
+    deadline = time.monotonic() + BATCH_QUEUE_WAIT
+    while True:
+        try:
+            async with llm_queue.slot(client_key):
+                return await generate(topic=topic, number_questions=count, difficulty=difficulty,
+                                      client_key=client_key)
+        except QueueFullError as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise HTTPException(status_code=503, detail="Question generation is busy, please retry shortly")
+            await asyncio.sleep(min(e.retry_after, remaining, 2.0))
+
+
+async def plan_batch(specs: Sequence[Tuple[str, str, int]], client_key: str,
+                     reuse_banked: bool = True) -> List[List[Dict[str, Any]]]:
+    """
+    Banked questions for each (topic, difficulty, count) spec, charging the
+    rate limit for the shortfall that will be generated (429 if over).
+    A shortfall larger than the whole bucket is rejected with 400, since
+    the limiter caps a single charge at its capacity.
+    Runs before the response starts, so a rejection is a plain error.
+    """
+    if reuse_banked:
+        banked = await run_in_threadpool(load_banked_questions, specs)
+    else:
+        banked = [[] for _ in specs]
+    shortfall = sum(count - len(questions) for (_, _, count), questions in zip(specs, banked))
+    if shortfall > generation_limiter.capacity:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch needs {shortfall} new questions, at most {int(generation_limiter.capacity)} "
+                   "can be generated per batch; split it up or reuse banked questions")
+    if shortfall:
+        enforce_rate_limit(client_key, cost=shortfall)
+    return banked
+
+
+async def generate_batch(
+    specs: Sequence[Tuple[str, str, int]],
+    banked: Sequence[List[Dict[str, Any]]],
+    client_key: str,
+    generate: Generate,
+    concurrency: int = BATCH_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield one result per (topic, difficulty, count) spec as it completes,
+    then a summary with throughput.
+
+    Each spec starts from its banked questions (see plan_batch) and only
+    the shortfall is generated, `concurrency` specs at a time. A failed
+    item yields {"status": "failed"} and the others carry on. Successful
+    items are recorded as succeeded generation jobs, so their job_id can be
+    fetched from /api/jobs or played in a room, and they join the bank.
+    """
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_item(index: int) -> Dict[str, Any]:
+        topic, difficulty, count = specs[index]
+        questions = list(banked[index])
+        charged = count - len(questions)
+        result = {"type": "item", "index": index, "topic": topic, "difficulty": difficulty,
+                  "number_questions": count}
+        item_started = time.perf_counter()
+        with span("batch.item", index=index, topic=topic, banked=len(questions)) as trace_span:
+            try:
+                generated = 0
+                if charged:
+                    async with semaphore:
+                        response = await _generate_item(generate, client_key, topic, charged, difficulty)
+                    known = {_question_key(question) for question in questions}
+                    for question in response["questions"]:
+                        if _question_key(question) not in known:
+                            known.add(_question_key(question))
+                            questions.append(question)
+                            generated += 1
+                job_id = await run_in_threadpool(
+                    _record, client_key, topic, len(questions), difficulty, {"questions": questions})
+            except HTTPException as e:
+                if trace_span is not None:
+                    trace_span.fail(e)
+                if charged:
+                    generation_limiter.refund(client_key, charged)
+                batch_items_total.inc(("failed",))
+                return {**result, "status": "failed", "status_code": e.status_code, "error": e.detail,
+                        "elapsed_ms": round((time.perf_counter() - item_started) * 1000, 1)}
+            except Exception as e:
+                if trace_span is not None:
+                    trace_span.fail(e)
+                if charged:
+                    generation_limiter.refund(client_key, charged)
+                batch_items_total.inc(("failed",))
+                return {**result, "status": "failed", "status_code": 500, "error": f"Unexpected error: {str(e)}",
+                        "elapsed_ms": round((time.perf_counter() - item_started) * 1000, 1)}
+
+        batch_items_total.inc(("succeeded",))
+        batch_questions_total.inc(("banked",), len(questions) - generated)
+        batch_questions_total.inc(("generated",), generated)
+        return {**result, "status": "succeeded", "job_id": job_id, "banked": len(questions) - generated,
+                "generated": generated, "questions": questions,
+                "elapsed_ms": round((time.perf_counter() - item_started) * 1000, 1)}
+
+    tasks = [asyncio.create_task(run_item(index)) for index in range(len(specs))]
+    totals = {"succeeded": 0, "failed": 0, "questions": 0, "banked_questions": 0, "generated_questions": 0}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result["status"] == "succeeded":
+                totals["succeeded"] += 1
+                totals["questions"] += len(result["questions"])
+                totals["banked_questions"] += result["banked"]
+                totals["generated_questions"] += result["generated"]
+            else:
+                totals["failed"] += 1
+            yield result
+    finally:
+        # The client went away (or the caller stopped reading): don't keep generating for nobody
+        for task in tasks:
+            task.cancel()
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "type": "summary",
+        "items": len(specs),
+        **totals,
+        "elapsed_seconds": round(elapsed, 3),
+        "items_per_minute": round(totals["succeeded"] / elapsed * 60, 1) if elapsed > 0 else None,
+        "questions_per_second": round(totals["questions"] / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def _record(client_key: str, topic: str, number_questions: int, difficulty: str, result: Dict[str, Any]) -> str:
+    db = SessionLocal()
+    try:
+        return record_job(db, client_key, topic, number_questions, difficulty, result).id
+    finally:
+        db.close()
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.casefold()).strip("-")[:60] or "quiz"
+
+
+def build_archive(results: List[Dict[str, Any]]) -> bytes:
+    """Zip of one JSON file per item, in request order, plus summary.json."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for result in sorted((r for r in results if r["type"] == "item"), key=lambda r: r["index"]):
+            name = f"{result['index'] + 1:02d}-{_slug(result['topic'])}-{result['difficulty']}.json"
+            if result["status"] != "succeeded":
+                name = name.replace(".json", ".failed.json")
+            archive.writestr(name, json.dumps(result, indent=2))
+        summary = next((r for r in results if r["type"] == "summary"), {})
+        archive.writestr("summary.json", json.dumps({**summary, "created_at": datetime.utcnow().isoformat()}, indent=2))
+    return buffer.getvalue()
@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, select, update
+
+from database import SessionLocal
+from models import QuestionEnrichment
+from utils.metrics import registry
+from utils.rollups import upsert_counters
+from utils.search import question_outcome
+
+load_dotenv()
+
+ENRICHMENT_INTERVAL = float(os.getenv("ENRICHMENT_INTERVAL", "30"))  # seconds between cycles, 0 disables
+ENRICHMENT_BATCH_SIZE = int(os.getenv("ENRICHMENT_BATCH_SIZE", "20"))  # questions per LLM call
+ENRICHMENT_MAX_BATCHES = int(os.getenv("ENRICHMENT_MAX_BATCHES", "5"))  # LLM calls per cycle
+ENRICHMENT_MAX_ATTEMPTS = int(os.getenv("ENRICHMENT_MAX_ATTEMPTS", "3"))
+ENRICHMENT_TIMEOUT = float(os.getenv("ENRICHMENT_TIMEOUT", "120"))  # seconds per LLM call
+ENRICHMENT_MAX_BUFFER = int(os.getenv("ENRICHMENT_MAX_BUFFER", "10000"))  # distinct questions waiting to be queued
+
+enrichment_questions_total = registry.counter(
+    "enrichment_questions_total", "Missed questions through the enrichment pipeline by outcome", ("outcome",))
+enrichment_batch_duration_seconds = registry.histogram(
+    "enrichment_batch_duration_seconds", "Duration of enrichment LLM calls by outcome", ("status",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0))
+
+
+def content_hash(question: Dict[str, Any]) -> str:
+    """Identity of a question's content; the same question in any quiz, for any user, has the same hash."""
+    def norm(value) -> str:
+        return " ".join(str(value).split()).casefold()
+
+    return hashlib.sha256(json.dumps([
+        norm(question.get("question") or ""),
+        sorted(norm(option) for option in question.get("options") or []),
+        sorted(norm(answer) for answer in question.get("answers") or []),
+    ], ensure_ascii=False).encode()).hexdigest()
+
+
+def missed_questions(questions, user_answers) -> List[Tuple[int, Dict[str, Any]]]:
+    """(index, question) of every question answered wrongly in a completed quiz."""
+    user_answers = user_answers or {}
+    return [
+        (index, question) for index, question in enumerate(questions or [])
+        if isinstance(question, dict) and question.get("question")
+        and question_outcome(question, user_answers.get(str(index))) == "wrong"
+    ]
+
+
+def enrichments_for(questions, user_answers) -> Dict[str, Dict[str, Any]]:
+    """Finished enrichments of a quiz's missed questions, by question index."""
+    hashes: Dict[str, List[int]] = {}
+    for index, question in missed_questions(questions, user_answers):
+        hashes.setdefault(content_hash(question), []).append(index)
+    if not hashes:
+        return {}
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(QuestionEnrichment.content_hash, QuestionEnrichment.detailed_explanation,
+                   QuestionEnrichment.reference_links)
+            .where(QuestionEnrichment.content_hash.in_(list(hashes)), QuestionEnrichment.status == "done")
+        ).all()
+    finally:
+        db.close()
+    return {
+        str(index): {"detailed_explanation": row.detailed_explanation, "reference_links": row.reference_links or []}
+        for row in rows for index in hashes[row.content_hash]
+    }
+
+
+class EnrichmentPipeline:
+    """
+    Deferred detailed explanations and reference links for missed questions.
+
+    Completing a quiz only hashes its wrongly answered questions into an
+    in-memory buffer (`submit`), so nothing is added to the save or to
+    question generation. Every ENRICHMENT_INTERVAL seconds a background task
+    upserts the buffer into `question_enrichments`, one row per content hash
+    shared by all users, then claims up to ENRICHMENT_BATCH_SIZE pending rows
+    at a time (most missed first) and explains each batch in a single LLM
+    call. A question that is already queued or enriched only has its miss
+    count bumped, so each unique question costs one call slot however many
+    users miss it. Questions the model skipped are retried with backoff up
+    to ENRICHMENT_MAX_ATTEMPTS. Cycles are skipped while the generation
+    circuit breaker is open.
+    """
+
+    def __init__(self, interval: float = ENRICHMENT_INTERVAL, batch_size: int = ENRICHMENT_BATCH_SIZE,
+                 max_batches: int = ENRICHMENT_MAX_BATCHES, max_attempts: int = ENRICHMENT_MAX_ATTEMPTS,
+                 timeout: float = ENRICHMENT_TIMEOUT, max_buffer: int = ENRICHMENT_MAX_BUFFER):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.max_buffer = max_buffer
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._client_factory: Optional[Callable[[], Any]] = None
+        self.queued = 0
+        self.enriched = 0
+        self.failed = 0
+        self.dropped = 0
+        self.calls = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    def start(self, client_factory: Callable[[], Any]):
+        """Run cycles in the background; `client_factory` returns the GeminiClient."""
+        self._client_factory = client_factory
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Keep what was submitted since the last cycle
+        await run_in_threadpool(self.flush)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Enrichment cycle failed: {str(e)}")
+
+    def submit(self, topic: str, difficulty: str, questions, user_answers) -> int:
+        """Queue the missed questions of a completed quiz; returns how many were missed."""
+        missed = missed_questions(questions, user_answers)
+        with self._lock:
+            for _, question in missed:
+                key = content_hash(question)
+                row = self._pending.get(key)
+                if row is not None:
+                    row["misses"] += 1
+                elif len(self._pending) >= self.max_buffer:
+                    self.dropped += 1
+                    enrichment_questions_total.inc(("dropped",))
+                else:
+                    self._pending[key] = {
+                        "content_hash": key,
+                        "topic": topic or "",
+                        "difficulty": difficulty or "",
+                        "question": {k: question.get(k) for k in ("question", "options", "answers", "explanation")},
+                        "misses": 1,
+                        "status": "pending",
+                        "attempts": 0,
+                        "available_at": datetime.utcnow(),
+                    }
+        return len(missed)
+
+    def flush(self):
+        """Upsert everything submitted so far into `question_enrichments`."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        db = SessionLocal()
+        try:
+            upsert_counters(db, QuestionEnrichment, ("content_hash",), ("misses",), pending.values())
+            db.commit()
+            self.queued += len(pending)
+            enrichment_questions_total.inc(("queued",), len(pending))
+        except Exception as e:
+            db.rollback()
+            self.dropped += len(pending)
+            enrichment_questions_total.inc(("dropped",), len(pending))
+            print(f"Error queueing questions for enrichment: {str(e)}")
+        finally:
+            db.close()
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Queue submitted questions, then enrich up to `max_batches` batches; returns the cycle's summary."""
+        started = time.perf_counter()
+        await run_in_threadpool(self.flush)
+        summary = {"batches": 0, "enriched": 0, "retried": 0, "failed": 0, "skipped": None}
+
+        try:
+            client = await run_in_threadpool(self._client_factory)
+        except ValueError as e:
+            # Missing configuration such as GOOGLE_API_KEY; questions stay queued
+            client = None
+            summary["skipped"] = str(e)
+        if client is not None and client.breaker.state != "closed":
+            # Generation is failing; don't add load, and don't steal the half-open probe
+            client = None
+            summary["skipped"] = "circuit breaker open"
+
+        while client is not None and summary["batches"] < self.max_batches:
+            batch = await run_in_threadpool(self._claim)
+            if not batch:
+                break
+            summary["batches"] += 1
+            call_started = time.perf_counter()
+            error = None
+            try:
+                results = await client.enrich_questions([row["question"] for row in batch], self.timeout)
+            except asyncio.TimeoutError:
+                results, error = {}, f"Timed out after {self.timeout:.0f}s"
+            except Exception as e:
+                results, error = {}, str(e)
+            self.calls += 1
+            enrichment_batch_duration_seconds.observe(
+                time.perf_counter() - call_started, ("failed" if error else "succeeded",))
+            for outcome, count in (await run_in_threadpool(self._finish, batch, results, error)).items():
+                summary[outcome] += count
+            if error:
+                break
+
+        summary["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.last_run = summary
+        return summary
+
+    def _claimable(self, now: datetime):
+        return or_(
+            and_(QuestionEnrichment.status == "pending", QuestionEnrichment.available_at <= now),
+            and_(QuestionEnrichment.status == "running", QuestionEnrichment.locked_until < now),
+        )
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        """Lock up to `batch_size` rows for this cycle, most missed first."""
+        now = datetime.utcnow()
+        worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        db = SessionLocal()
+        try:
+            ids = db.execute(
+                select(QuestionEnrichment.id).where(self._claimable(now))
+                .order_by(QuestionEnrichment.misses.desc(), QuestionEnrichment.id).limit(self.batch_size)
+            ).scalars().all()
+            if not ids:
+                return []
+            # Re-check claimability, so rows another process claimed since the SELECT are skipped
+            db.execute(
+                update(QuestionEnrichment)
+                .where(QuestionEnrichment.id.in_(ids), self._claimable(now))
+                .values(status="running", worker_id=worker_id, attempts=QuestionEnrichment.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.timeout * 2), updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            rows = db.execute(
+                select(QuestionEnrichment.id, QuestionEnrichment.question, QuestionEnrichment.attempts)
+                .where(QuestionEnrichment.id.in_(ids), QuestionEnrichment.worker_id == worker_id,
+                       QuestionEnrichment.status == "running")
+                .order_by(QuestionEnrichment.id)
+            ).all()
+            return [{"id": row.id, "question": row.question, "attempts": row.attempts, "worker_id": worker_id}
+                    for row in rows]
+        finally:
+            db.close()
+
+    def _finish(self, batch: List[Dict[str, Any]], results: Dict[int, Dict[str, Any]],
+                error: Optional[str]) -> Dict[str, int]:
+        now = datetime.utcnow()
+        counts = {"enriched": 0, "retried": 0, "failed": 0}
+        db = SessionLocal()
+        try:
+            for position, row in enumerate(batch):
+                result = results.get(position)
+                if result is not None:
+                    values = {"status": "done", "error": None, "enriched_at": now, **result}
+                    outcome = "enriched"
+                elif row["attempts"] < self.max_attempts:
+                    values = {"status": "pending", "error": error or "Not in the model's response",
+                              "available_at": now + timedelta(seconds=max(self.interval, 1) * 2 ** row["attempts"])}
+                    outcome = "retried"
+                else:
+                    values = {"status": "failed", "error": error or "Not in the model's response"}
+                    outcome = "failed"
+                db.execute(
+                    update(QuestionEnrichment)
+                    .where(QuestionEnrichment.id == row["id"], QuestionEnrichment.worker_id == row["worker_id"])
+                    .values(locked_until=None, updated_at=now, **values)
+                )
+                counts[outcome] += 1
+            db.commit()
+        finally:
+            db.close()
+        self.enriched += counts["enriched"]
+        self.failed += counts["failed"]
+        for outcome, count in counts.items():
+            enrichment_questions_total.inc((outcome,), count)
+        return counts
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._pending)
+        return {
+            "interval_seconds": self.interval,
+            "running": self._task is not None,
+            "buffered": buffered,
+            "queued_total": self.queued,
+            "enriched_total": self.enriched,
+            "failed_total": self.failed,
+            "dropped_total": self.dropped,
+            "llm_calls_total": self.calls,
+            "last_run": self.last_run,
+        }
+
+
+enrichment_pipeline = EnrichmentPipeline()
+
+registry.gauge_callback(
+    "enrichment_buffered_questions", "Missed questions waiting to be queued for enrichment", (),
+    lambda: {(): enrichment_pipeline.metrics()["buffered"]})
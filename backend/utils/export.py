@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select
+
+from database import engine
+from models import QuizAttempt, QuestionAnswer, Topic
+from utils.topics import normalize_topic
+
+load_dotenv()
+
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))  # rows per cursor fetch
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", "65536"))  # bytes per response chunk
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+ATTEMPT_COLUMNS = [
+    "quiz_id", "topic", "canonical_topic", "difficulty", "status", "total_questions", "correct_answers",
+    "incorrect_answers", "score", "percentage", "time_taken", "started_at", "completed_at",
+]
+QUESTION_COLUMNS = [
+    "quiz_id", "topic", "difficulty", "question_index", "question_text", "user_answer", "correct_answer",
+    "is_correct", "time_spent", "started_at",
+]
+
+
+def build_export_query(user_id: int, scope: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       topic: Optional[str] = None, difficulty: Optional[str] = None):
+    """SELECT of a user's attempts (scope "attempts") or per-question results (scope "questions")."""
+    if scope == "questions":
+        query = select(
+            QuizAttempt.id.label("quiz_id"), QuizAttempt.topic, QuizAttempt.difficulty,
+            QuestionAnswer.question_index, QuestionAnswer.question_text, QuestionAnswer.user_answer,
+            QuestionAnswer.correct_answer, QuestionAnswer.is_correct, QuestionAnswer.time_spent,
+            QuizAttempt.started_at,
+        ).join(QuestionAnswer, QuestionAnswer.quiz_attempt_id == QuizAttempt.id)
+        order_by = (QuizAttempt.id, QuestionAnswer.question_index)
+    else:
+        # Only scalar columns: the question/answer JSON is never loaded
+        query = select(
+            QuizAttempt.id.label("quiz_id"), QuizAttempt.topic, Topic.name.label("canonical_topic"),
+            QuizAttempt.difficulty, QuizAttempt.status, QuizAttempt.total_questions, QuizAttempt.correct_answers,
+            QuizAttempt.incorrect_answers, QuizAttempt.score, QuizAttempt.percentage, QuizAttempt.time_taken,
+            QuizAttempt.started_at, QuizAttempt.completed_at,
+        ).outerjoin(Topic, Topic.id == QuizAttempt.topic_id)
+        order_by = (QuizAttempt.id,)
+
+    query = query.where(QuizAttempt.user_id == user_id)
+    if start is not None:
+        query = query.where(QuizAttempt.started_at >= start)
+    if end is not None:
+        query = query.where(QuizAttempt.started_at < end)
+    if difficulty:
+        query = query.where(QuizAttempt.difficulty == difficulty)
+    if topic:
+        # Same canonical topic, or the exact text for attempts without one
+        key = normalize_topic(topic)
+        topic_ids = select(Topic.id).where(Topic.normalized_key == key).scalar_subquery()
+        query = query.where(or_(QuizAttempt.topic_id == topic_ids, QuizAttempt.topic == topic))
+    return query.order_by(*order_by)
+
+
+def _iter_rows(query, bind) -> Iterator[Dict[str, Any]]:
+    # stream_results uses a server-side cursor where the driver has one (PostgreSQL);
+    # SQLite's cursor already fetches lazily, so only one fetch of rows is in memory
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(query)
+        for row in result.mappings():
+            yield row
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def stream_export(query, fmt: str, columns: List[str], bind=engine) -> Iterator[bytes]:
+    """Encode rows read through `bind` as CSV or NDJSON, yielding chunks of about EXPORT_CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+
+    for row in _iter_rows(query, bind):
+        if writer is not None:
+            writer.writerow([_cell(row[c]) for c in columns])
+        else:
+            buffer.write(json.dumps(
+                {c: row[c].isoformat() if isinstance(row[c], datetime) else row[c] for c in columns},
+                ensure_ascii=False
+            ))
+            buffer.write("\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
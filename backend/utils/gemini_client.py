@@ -1,12 +1,36 @@
+import asyncio
+import json
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
+from utils.llm_ledger import llm_ledger
+from utils.llm_resilience import (
+    CircuitBreaker, CircuitOpenError, HedgePolicy, LLMDeadlineExceeded, TailLatency,
+    llm_attempt_duration_seconds, llm_hedges_total, llm_request_duration_seconds, request_deadline, size_band,
+)
+from utils.metrics import registry
+from utils.tracing import langchain_config, span
 
 load_dotenv()
 
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+# Alternative API endpoint, e.g. a local stand-in server for load tests
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+# Retries inside the SDK on the same key; rate-limited calls are moved to another key instead
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))
+# A key that gets a 429 (or LLM_KEY_FAILURE_THRESHOLD errors in a row) sits out for
+# LLM_KEY_COOLDOWN seconds, doubling on each repeat up to LLM_KEY_MAX_COOLDOWN
+LLM_KEY_COOLDOWN = float(os.getenv("LLM_KEY_COOLDOWN", "30"))
+LLM_KEY_MAX_COOLDOWN = float(os.getenv("LLM_KEY_MAX_COOLDOWN", "300"))
+LLM_KEY_FAILURE_THRESHOLD = int(os.getenv("LLM_KEY_FAILURE_THRESHOLD", "3"))
+# Extra attempts when the structured output cannot be parsed
+LLM_PARSE_RETRIES = int(os.getenv("LLM_PARSE_RETRIES", "1"))
+
 
 class QuestionModel(BaseModel):
     question: str = Field(..., description="The question text")
@@ -19,18 +43,85 @@ class QuestionsResponse(BaseModel):
     questions: List[QuestionModel]
 
 
+class ReferenceLink(BaseModel):
+    title: str = Field(..., description="Name of the page or resource")
+    url: str = Field(..., description="Absolute https URL")
+
+
+class EnrichmentModel(BaseModel):
+    id: int = Field(..., description="The id of the question being explained")
+    detailed_explanation: str = Field(..., description="A paragraph explaining why the answers are right and the others wrong")
+    reference_links: List[ReferenceLink] = Field(..., description="1-3 well-known resources for further reading")
+
+
+class EnrichmentResponse(BaseModel):
+    explanations: List[EnrichmentModel]
+
+
+llm_key_calls_total = registry.counter(
+    "llm_key_calls_total", "Gemini calls per API key by outcome", ("key", "outcome"))
+
+
+def configured_api_keys() -> List[str]:
+    """GOOGLE_API_KEYS (comma-separated), or the single GOOGLE_API_KEY."""
+    keys = [key.strip() for key in os.getenv("GOOGLE_API_KEYS", "").split(",") if key.strip()]
+    if not keys and os.getenv("GOOGLE_API_KEY"):
+        keys = [os.getenv("GOOGLE_API_KEY")]
+    return list(dict.fromkeys(keys))
+
+
+def is_rate_limited(error: Optional[BaseException]) -> bool:
+    """True for quota errors (HTTP 429 / RESOURCE_EXHAUSTED), however deeply the SDK wrapped them."""
+    while error is not None:
+        if getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error):
+            return True
+        error = error.__cause__
+    return False
+
+
+class KeySlot:
+    """One API key with its own model instance, prebuilt chains and HTTP connection pool."""
+
+    def __init__(self, name: str, chain, enrichment_chain=None):
+        self.name = name
+        self.chain = chain
+        self.enrichment_chain = enrichment_chain
+        self.in_flight = 0
+        self.calls = 0
+        self.consecutive_failures = 0
+        self.cooldowns = 0  # cooldowns in a row, for the backoff
+        self.cooldown_until = 0.0  # time.monotonic()
+
+    def available(self, now: float) -> bool:
+        return self.cooldown_until <= now
+
+
 class GeminiClient:
-    def __init__(self):
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        if not self.api_key:
+    """
+    Gemini question generation over a pool of API keys.
+
+    Each configured key gets its own model instance and prebuilt chain, so
+    calls reuse the SDK's HTTP connections and nothing is rebuilt per call.
+    A call goes to the healthy key with the fewest calls in flight; a key
+    that is rate limited is taken out of rotation for a cooldown and the
+    call moves on to the next key.
+
+    Every generation has an end-to-end deadline derived from the number of
+    questions. A call slower than the recent p95 gets a hedged duplicate on
+    another key; the first parsed result wins and the other call is
+    cancelled. A circuit breaker fails generations fast while most recent
+    calls fail.
+
+    The same keys also serve batched explanation enrichment
+    (`enrich_questions`), which runs in the background without hedging.
+    """
+
+    def __init__(self, api_keys: Optional[List[str]] = None, base_url: Optional[str] = GEMINI_BASE_URL):
+        api_keys = api_keys or configured_api_keys()
+        if not api_keys:
             raise ValueError("GOOGLE_API_KEY is not set. Please define it in your environment or .env file.")
 
-        # Chat model from LangChain's Google GenAI integration
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            api_key=self.api_key,
-            temperature=0.4,
-        )
+        self.model = GEMINI_MODEL
 
         # Prompt that strictly defines the structure and constraints
         self.prompt = ChatPromptTemplate.from_messages([
@@ -51,33 +142,364 @@ class GeminiClient:
             )),
         ])
 
-        # Force the model to return Pydantic-validated structure
-        self.structured_llm = self.llm.with_structured_output(QuestionsResponse)
+        # Background enrichment of missed questions, see utils.enrichment
+        self.enrichment_prompt = ChatPromptTemplate.from_messages([
+            ("system", (
+                "You are a patient tutor explaining multiple-choice questions that learners got wrong. "
+                "Always follow the requested structure."
+            )),
+            ("human", (
+                "For each question below, write a detailed explanation (one paragraph) of why the correct "
+                "answer(s) are right and why each other option is wrong, and list 1-3 reference links to "
+                "well-known, stable learning resources (official documentation, encyclopedias, textbooks) "
+                "on the concept. Only give URLs you are confident exist.\n"
+                "Return one entry per question with its id.\n\n"
+                "{questions}"
+            )),
+        ])
+
+        self.slots = []
+        for index, api_key in enumerate(api_keys):
+            llm = self._llm(api_key, base_url)
+            self.slots.append(KeySlot(
+                f"key{index}",
+                # Force the model to return Pydantic-validated structure; keep the raw
+                # message so usage metadata and parse failures can be recorded
+                self.prompt | llm.with_structured_output(QuestionsResponse, include_raw=True),
+                self.enrichment_prompt | llm.with_structured_output(EnrichmentResponse, include_raw=True),
+            ))
+        self._lock = threading.Lock()
+        self._next = 0  # round-robin start among equally loaded keys
+        self.breaker = CircuitBreaker()
+        self.hedging = HedgePolicy()
+        self.tail = TailLatency()
+
+    def _llm(self, api_key: str, base_url: Optional[str]):
+        # Chat model from LangChain's Google GenAI integration
+        return ChatGoogleGenerativeAI(
+            model=self.model,
+            api_key=api_key,
+            temperature=0.4,
+            max_retries=LLM_MAX_RETRIES,
+            **({"base_url": base_url} if base_url else {}),
+        )
+
+    def _acquire(self, tried: Set[str]) -> KeySlot:
+        """Reserve the least-loaded healthy key not tried yet; if all are cooling down, the one that recovers first."""
+        with self._lock:
+            now = time.monotonic()
+            count = len(self.slots)
+            candidates = [s for s in self.slots if s.name not in tried] or self.slots
+            healthy = [s for s in candidates if s.available(now)]
+            if healthy:
+                slot = min(healthy, key=lambda s: (s.in_flight, (self.slots.index(s) - self._next) % count))
+            else:
+                slot = min(candidates, key=lambda s: s.cooldown_until)
+            self._next = (self.slots.index(slot) + 1) % count
+            slot.in_flight += 1
+            slot.calls += 1
+            return slot
+
+    def _release(self, slot: KeySlot, outcome: str):
+        with self._lock:
+            slot.in_flight -= 1
+            if outcome == "success":
+                slot.consecutive_failures = 0
+                slot.cooldowns = 0
+            elif outcome != "cancelled":
+                slot.consecutive_failures += 1
+                if outcome == "rate_limited" or slot.consecutive_failures >= LLM_KEY_FAILURE_THRESHOLD:
+                    slot.cooldowns += 1
+                    cooldown = min(LLM_KEY_COOLDOWN * 2 ** (slot.cooldowns - 1), LLM_KEY_MAX_COOLDOWN)
+                    slot.cooldown_until = time.monotonic() + cooldown
+                    slot.consecutive_failures = 0
+        llm_key_calls_total.inc((slot.name, outcome))
+
+    def _finish(self, slot: KeySlot, started: float, kind: str, outcome: str,
+                entry: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> float:
+        seconds = time.perf_counter() - started
+        self._release(slot, outcome)
+        llm_attempt_duration_seconds.observe(seconds, (kind, outcome))
+        if entry is not None:
+            llm_ledger.record(**entry, latency_ms=seconds * 1000, outcome=outcome, error=error)
+        return seconds
+
+    async def _invoke(self, inputs: Dict[str, Any], entry: Dict[str, Any], kind: str) -> Tuple[Dict[str, Any], float]:
+        """Run the chain on a pooled key, moving to the next key while calls are rate limited."""
+        tried: Set[str] = set()
+        while True:
+            slot = self._acquire(tried)
+            tried.add(slot.name)
+            started = time.perf_counter()
+            with span("llm.invoke", key=slot.name, kind=kind) as trace_span:
+                try:
+                    chain = slot.enrichment_chain if kind == "enrichment" else slot.chain
+                    # Under a trace, LangChain callbacks add spans for the prompt, model call and parser
+                    output = await chain.ainvoke(inputs, config=langchain_config())
+                except asyncio.CancelledError as e:
+                    # The other hedged call won, or the deadline passed
+                    outcome = "timeout" if e.args and e.args[0] == "timeout" else "cancelled"
+                    self._finish(slot, started, kind, outcome, entry)
+                    raise
+                except Exception as e:
+                    outcome = "rate_limited" if is_rate_limited(e) else "error"
+                    self._finish(slot, started, kind, outcome, entry, error=str(e))
+                    if trace_span is not None:
+                        trace_span.set(outcome=outcome)
+                    if outcome == "rate_limited" and len(tried) < len(self.slots):
+                        continue
+                    # Surface a concise error upward to controller
+                    action = "enriching questions" if kind == "enrichment" else "generating questions"
+                    raise Exception(f"Error {action}: {str(e)}") from e
+                if trace_span is not None:
+                    trace_span.set(outcome="success", parsed=output.get("parsed") is not None)
+            return output, self._finish(slot, started, kind, "success") * 1000
 
-    def generate_questions(self, topic: str, number_questions: int, difficulty: str) -> List[Dict[str, Any]]:
+    async def _hedged_invoke(self, inputs: Dict[str, Any], entry: Dict[str, Any], deadline: float,
+                             band: str) -> Tuple[Dict[str, Any], float]:
+        """
+        The primary call, plus a hedge once the primary is slower than the
+        hedge delay. Returns the first parsed output (or an unparsed one if
+        no call parsed) and cancels whatever is still running.
+        """
+        self.breaker.before_call()
+        self.hedging.primary_started()
+        started = time.monotonic()
+        pending = {asyncio.create_task(self._invoke(inputs, entry, "primary"))}
+        hedge: Optional[asyncio.Task] = None
+        hedge_decided = False
+        unparsed: Optional[Tuple[Dict[str, Any], float]] = None
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    self.breaker.record(True)
+                    raise LLMDeadlineExceeded(
+                        f"Question generation timed out after {now - started:.1f}s")
+                timeout = deadline - now
+                if not hedge_decided:
+                    timeout = min(timeout, max(0.0, started + self.hedging.delay(band) - now))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    output, latency_ms = task.result()
+                    self.hedging.observe(band, latency_ms / 1000)
+                    if output.get("parsed") is None:
+                        unparsed = unparsed or (output, latency_ms)
+                        continue
+                    if task is hedge:
+                        llm_hedges_total.inc(("won",))
+                    self.breaker.record(False)
+                    return output, latency_ms
+
+                if not done and not hedge_decided and pending and time.monotonic() < deadline:
+                    # The primary is slower than the recent p95: race a duplicate on another key
+                    hedge_decided = True
+                    if self.hedging.take():
+                        hedge = asyncio.create_task(self._invoke(inputs, entry, "hedge"))
+                        pending.add(hedge)
+                        llm_hedges_total.inc(("fired",))
+                    else:
+                        llm_hedges_total.inc(("skipped",))
+
+            if unparsed is not None:
+                self.breaker.record(False)
+                return unparsed
+            if is_rate_limited(error):
+                # Every key is out of quota: the key cooldowns handle that, it is not an outage
+                self.breaker.skip()
+            else:
+                self.breaker.record(True)
+            raise error
+        finally:
+            reason = "timeout" if time.monotonic() >= deadline else "cancelled"
+            for task in pending:
+                task.cancel(reason)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def resilience_status(self) -> Dict[str, Any]:
+        return {
+            "breaker": self.breaker.status(),
+            "hedging": self.hedging.status(),
+            "latency": self.tail.summary(),
+        }
+
+    def key_status(self) -> List[Dict[str, Any]]:
+        """Per-key load and health, without the keys themselves."""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "key": slot.name,
+                    "available": slot.available(now),
+                    "cooldown_remaining": round(max(0.0, slot.cooldown_until - now), 1),
+                    "in_flight": slot.in_flight,
+                    "calls": slot.calls,
+                }
+                for slot in self.slots
+            ]
+
+    async def generate_questions(
+        self,
+        topic: str,
+        number_questions: int,
+        difficulty: str,
+        client_key: Optional[str] = None,
+        validator: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Generate questions using Gemini via LangChain with Pydantic-validated structured output.
 
+        Every attempt is recorded in the LLM call ledger. Raises LLMDeadlineExceeded when the
+        deadline passes and CircuitOpenError while the circuit breaker is open.
+
         Args:
             topic: The topic for question generation
             number_questions: Number of questions to generate
             difficulty: Difficulty level (e.g., easy, medium, hard)
+            client_key: Requesting user/IP, recorded in the ledger
+            validator: Optional per-question check used to count valid questions in the ledger
 
         Returns:
             List[Dict[str, Any]]: List of question dicts with keys: question, options, answers, explanation
         """
 
-        chain = self.prompt | self.structured_llm
-
+        started = time.perf_counter()
+        outcome = "error"
         try:
-            result: QuestionsResponse = chain.invoke({
+            with span("llm.generate", model=self.model, number_questions=number_questions):
+                questions = await self._generate(topic, number_questions, difficulty, client_key, validator)
+            outcome = "success"
+            return questions
+        except LLMDeadlineExceeded:
+            outcome = "timeout"
+            raise
+        except CircuitOpenError:
+            outcome = "rejected"
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            llm_request_duration_seconds.observe(seconds, (outcome,))
+            if outcome != "rejected":
+                self.tail.observe(seconds)
+
+    async def _generate(
+        self,
+        topic: str,
+        number_questions: int,
+        difficulty: str,
+        client_key: Optional[str],
+        validator: Optional[Callable[[Dict[str, Any]], bool]],
+    ) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + request_deadline(number_questions)
+        band = size_band(number_questions)
+        inputs = {
+            "topic": topic,
+            "number_questions": number_questions,
+            "difficulty": difficulty,
+        }
+
+        for attempt in range(LLM_PARSE_RETRIES + 1):
+            entry = {
+                "model": self.model,
+                "client_key": client_key,
                 "topic": topic,
-                "number_questions": number_questions,
                 "difficulty": difficulty,
-            })
+                "number_questions": number_questions,
+                "retries": attempt,
+            }
+
+            output, latency_ms = await self._hedged_invoke(inputs, entry, deadline, band)
+            usage = getattr(output.get("raw"), "usage_metadata", None) or {}
+            entry.update(
+                latency_ms=latency_ms,
+                prompt_tokens=usage.get("input_tokens", 0),
+                completion_tokens=usage.get("output_tokens", 0),
+                total_tokens=usage.get("total_tokens", 0),
+            )
+
+            result: Optional[QuestionsResponse] = output.get("parsed")
+            if result is None:
+                error = output.get("parsing_error")
+                llm_ledger.record(**entry, outcome="parse_error", error=str(error) if error else None)
+                if attempt < LLM_PARSE_RETRIES:
+                    continue
+                raise Exception(f"Error generating questions: could not parse model output ({error})")
 
             # Convert Pydantic models to plain dicts
-            return [q.model_dump() for q in result.questions]
-        except Exception as e:
-            # Surface a concise error upward to controller
-            raise Exception(f"Error generating questions: {str(e)}")
\ No newline at end of file
+            questions = [q.model_dump() for q in result.questions]
+            valid = sum(1 for q in questions if validator(q)) if validator else len(questions)
+            llm_ledger.record(**entry, outcome="success", valid_questions=valid)
+            return questions
+
+    async def enrich_questions(self, questions: List[Dict[str, Any]], timeout: float) -> Dict[int, Dict[str, Any]]:
+        """
+        Detailed explanations and reference links for a batch of questions in one call.
+
+        Background work: it uses the key pool and the ledger but skips hedging, the
+        circuit breaker and the generation latency stats, so it never competes with
+        or skews user-facing generations.
+
+        Args:
+            questions: Question dicts (question, options, answers, explanation) by position
+            timeout: Seconds before the call is abandoned
+
+        Returns:
+            Dict[int, Dict[str, Any]]: Position -> {"detailed_explanation", "reference_links"}; questions
+            the model skipped are missing
+        """
+        inputs = {"questions": json.dumps([
+            {
+                "id": index,
+                "question": question.get("question"),
+                "options": question.get("options"),
+                "answers": question.get("answers"),
+                "explanation": question.get("explanation"),
+            }
+            for index, question in enumerate(questions)
+        ], ensure_ascii=False)}
+
+        for attempt in range(LLM_PARSE_RETRIES + 1):
+            entry = {
+                "model": self.model,
+                "client_key": "enrichment",
+                "topic": "enrichment",
+                "difficulty": "mixed",
+                "number_questions": len(questions),
+                "retries": attempt,
+            }
+            output, latency_ms = await asyncio.wait_for(self._invoke(inputs, entry, "enrichment"), timeout)
+            usage = getattr(output.get("raw"), "usage_metadata", None) or {}
+            entry.update(
+                latency_ms=latency_ms,
+                prompt_tokens=usage.get("input_tokens", 0),
+                completion_tokens=usage.get("output_tokens", 0),
+                total_tokens=usage.get("total_tokens", 0),
+            )
+
+            result: Optional[EnrichmentResponse] = output.get("parsed")
+            if result is None:
+                error = output.get("parsing_error")
+                llm_ledger.record(**entry, outcome="parse_error", error=str(error) if error else None)
+                if attempt < LLM_PARSE_RETRIES:
+                    continue
+                raise Exception(f"Error enriching questions: could not parse model output ({error})")
+
+            enriched = {
+                item.id: {
+                    "detailed_explanation": item.detailed_explanation.strip(),
+                    "reference_links": [
+                        link.model_dump() for link in item.reference_links
+                        if link.url.startswith(("https://", "http://"))
+                    ],
+                }
+                for item in result.explanations
+                if 0 <= item.id < len(questions) and item.detailed_explanation.strip()
+            }
+            llm_ledger.record(**entry, outcome="success", valid_questions=len(enriched))
+            return enriched
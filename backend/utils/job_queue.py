@@ -0,0 +1,310 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, and_, update
+
+from database import SessionLocal
+from models import GenerationJob
+from utils.rate_limiter import QueueFullError
+
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))  # seconds
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def enqueue_job(db, client_key: str, topic: str, number_questions: int, difficulty: str) -> GenerationJob:
+    """Persist a new generation job in the queued state."""
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        client_key=client_key,
+        topic=topic,
+        number_questions=number_questions,
+        difficulty=difficulty,
+        status="queued",
+        max_attempts=JOB_MAX_ATTEMPTS,
+        available_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def record_job(db, client_key: str, topic: str, number_questions: int, difficulty: str,
+               result: Dict[str, Any]) -> GenerationJob:
+    """Persist a generation done outside the workers (e.g. a batch item) as a succeeded job."""
+    now = datetime.utcnow()
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        client_key=client_key,
+        topic=topic,
+        number_questions=number_questions,
+        difficulty=difficulty,
+        status="succeeded",
+        attempts=1,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        available_at=now,
+        result=result,
+        finished_at=now,
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def job_to_dict(job: GenerationJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "topic": job.topic,
+        "difficulty": job.difficulty,
+        "number_questions": job.number_questions,
+        "attempts": job.attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobWorkerPool:
+    """
+    Background workers executing generation jobs from the `generation_jobs` table.
+
+    A job is claimed with a compare-and-set UPDATE that sets a visibility
+    timeout (`locked_until`). Running jobs extend it with a heartbeat; if a
+    worker or the whole process dies, the lock expires and another worker
+    reclaims the job. Failures are retried with exponential backoff up to
+    `max_attempts`; 4xx errors from the handler are treated as permanent.
+    A job turned away by a full LLM queue is put back without using an attempt.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        workers: int = JOB_WORKERS,
+        visibility_timeout: int = JOB_VISIBILITY_TIMEOUT,
+        poll_interval: float = JOB_POLL_INTERVAL,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.deferred = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        for i in range(self.workers):
+            worker_id = f"{os.getpid()}-{i}"
+            self._tasks.append(asyncio.create_task(self._run(worker_id)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after a job has been enqueued."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self, worker_id: str):
+        while True:
+            try:
+                job = await run_in_threadpool(self._claim, worker_id)
+            except Exception as e:
+                print(f"Job worker {worker_id} failed to claim: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._execute(worker_id, job)
+            except Exception as e:
+                # The job stays locked and is reclaimed once its lock expires
+                print(f"Job worker {worker_id} failed to finish job {job['id']}: {str(e)}")
+
+    def _claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            # Jobs whose lock expired after their last attempt (the process died or hung) are not retried again
+            exhausted = db.execute(
+                update(GenerationJob)
+                .where(
+                    GenerationJob.status == "running",
+                    GenerationJob.locked_until < now,
+                    GenerationJob.attempts >= GenerationJob.max_attempts,
+                )
+                .values(status="failed", error="Worker lost the job on its last attempt",
+                        locked_until=None, finished_at=now, updated_at=now)
+            )
+            db.commit()
+            self.failed += exhausted.rowcount
+
+            stale = and_(
+                GenerationJob.status == "running",
+                GenerationJob.locked_until < now,
+                GenerationJob.attempts < GenerationJob.max_attempts,
+            )
+            candidates = db.query(GenerationJob.id).filter(
+                or_(
+                    and_(GenerationJob.status == "queued", GenerationJob.available_at <= now),
+                    stale,
+                )
+            ).order_by(GenerationJob.available_at).limit(self.workers).all()
+
+            for (job_id,) in candidates:
+                claimed = db.execute(
+                    update(GenerationJob)
+                    .where(
+                        GenerationJob.id == job_id,
+                        or_(GenerationJob.status == "queued", stale),
+                    )
+                    .values(
+                        status="running",
+                        worker_id=worker_id,
+                        attempts=GenerationJob.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.visibility_timeout),
+                        updated_at=now,
+                    )
+                )
+                db.commit()
+                if claimed.rowcount == 1:
+                    job = db.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+                    return {
+                        "id": job.id,
+                        "client_key": job.client_key,
+                        "topic": job.topic,
+                        "number_questions": job.number_questions,
+                        "difficulty": job.difficulty,
+                        "attempts": job.attempts,
+                        "max_attempts": job.max_attempts,
+                    }
+            return None
+        finally:
+            db.close()
+
+    async def _heartbeat(self, worker_id: str, job_id: str):
+        interval = max(self.visibility_timeout / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            await run_in_threadpool(self._extend_lock, worker_id, job_id)
+
+    def _extend_lock(self, worker_id: str, job_id: str):
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.worker_id == worker_id, GenerationJob.status == "running")
+                .values(locked_until=datetime.utcnow() + timedelta(seconds=self.visibility_timeout))
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def _execute(self, worker_id: str, job: Dict[str, Any]):
+        heartbeat = asyncio.create_task(self._heartbeat(worker_id, job["id"]))
+        try:
+            result = await self.handler(job)
+        except asyncio.CancelledError:
+            # Shutting down: leave the job locked, it is reclaimed once the lock expires
+            raise
+        except QueueFullError as e:
+            # Not an attempt: the job never reached the LLM
+            await run_in_threadpool(self._defer, worker_id, job, e.retry_after)
+        except Exception as e:
+            retryable = not (isinstance(e, HTTPException) and e.status_code < 500)
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            await run_in_threadpool(self._finish_failure, worker_id, job, str(detail), retryable)
+        else:
+            await run_in_threadpool(self._finish_success, worker_id, job["id"], result)
+        finally:
+            heartbeat.cancel()
+
+    def _finish_success(self, worker_id: str, job_id: str, result: Dict[str, Any]):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.worker_id == worker_id)
+                .values(status="succeeded", result=result, error=None, locked_until=None, finished_at=now, updated_at=now)
+            )
+            db.commit()
+            self.completed += 1
+        finally:
+            db.close()
+
+    def _defer(self, worker_id: str, job: Dict[str, Any], delay: float):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job["id"], GenerationJob.worker_id == worker_id)
+                .values(status="queued", attempts=GenerationJob.attempts - 1, locked_until=None,
+                        available_at=now + timedelta(seconds=delay), updated_at=now)
+            )
+            db.commit()
+            self.deferred += 1
+        finally:
+            db.close()
+
+    def _finish_failure(self, worker_id: str, job: Dict[str, Any], error: str, retryable: bool):
+        now = datetime.utcnow()
+        if retryable and job["attempts"] < job["max_attempts"]:
+            values = {
+                "status": "queued",
+                "available_at": now + timedelta(seconds=2 ** job["attempts"]),
+            }
+            self.retried += 1
+        else:
+            values = {"status": "failed", "finished_at": now}
+            self.failed += 1
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job["id"], GenerationJob.worker_id == worker_id)
+                .values(error=error, locked_until=None, updated_at=now, **values)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "completed_total": self.completed,
+            "failed_total": self.failed,
+            "retried_total": self.retried,
+            "deferred_total": self.deferred,
+        }
@@ -0,0 +1,138 @@
+import math
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from database import SessionLocal
+from models import LLMCall
+from utils.metrics import registry
+
+load_dotenv()
+
+LEDGER_BATCH_SIZE = int(os.getenv("LEDGER_BATCH_SIZE", "50"))
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "2.0"))  # seconds
+LEDGER_MAX_BUFFER = int(os.getenv("LEDGER_MAX_BUFFER", "10000"))
+
+# USD per 1M tokens, defaults match gemini-2.0-flash list prices
+LLM_PRICE_INPUT_PER_1M = float(os.getenv("LLM_PRICE_INPUT_PER_1M", "0.10"))
+LLM_PRICE_OUTPUT_PER_1M = float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", "0.40"))
+
+
+def call_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call from its token counts."""
+    return (
+        (prompt_tokens or 0) * LLM_PRICE_INPUT_PER_1M
+        + (completion_tokens or 0) * LLM_PRICE_OUTPUT_PER_1M
+    ) / 1_000_000
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class LLMLedger:
+    """
+    Write-behind ledger of LLM calls.
+
+    `record` only appends to an in-memory queue, so it is safe to call from
+    the request path or a threadpool worker. A daemon thread drains the queue
+    and inserts rows in batches; if the buffer is full, entries are dropped
+    and counted rather than blocking the caller.
+    """
+
+    def __init__(self, batch_size: int = LEDGER_BATCH_SIZE, flush_interval: float = LEDGER_FLUSH_INTERVAL,
+                 max_buffer: int = LEDGER_MAX_BUFFER):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_buffer)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, **entry: Any):
+        entry.setdefault("created_at", datetime.utcnow())
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="llm-ledger", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._write(batch)
+        # Final drain on shutdown
+        batch = self._drain(block=False)
+        while batch:
+            self._write(batch)
+            batch = self._drain(block=False)
+
+    def _drain(self, block: bool) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        if block:
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(LLMCall, batch)
+            db.commit()
+            self.written += len(batch)
+        except Exception as e:
+            db.rollback()
+            self.dropped += len(batch)
+            print(f"Error writing LLM ledger batch: {str(e)}")
+        finally:
+            db.close()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the writer thread after writing everything buffered so far."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        self._thread = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "buffered": self._queue.qsize(),
+            "written_total": self.written,
+            "dropped_total": self.dropped,
+        }
+
+
+llm_ledger = LLMLedger()
+
+registry.gauge_callback(
+    "llm_ledger_buffered", "LLM call ledger entries waiting to be written", (),
+    lambda: {(): llm_ledger.metrics()["buffered"]})
@@ -0,0 +1,195 @@
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from dotenv import load_dotenv
+
+from utils.llm_ledger import percentile
+from utils.metrics import registry
+
+load_dotenv()
+
+# End-to-end deadline per generation: base + per requested question, capped
+LLM_DEADLINE_BASE = float(os.getenv("LLM_DEADLINE_BASE", "10"))  # seconds
+LLM_DEADLINE_PER_QUESTION = float(os.getenv("LLM_DEADLINE_PER_QUESTION", "1.5"))
+LLM_DEADLINE_MAX = float(os.getenv("LLM_DEADLINE_MAX", "90"))
+
+# Hedging: fire a duplicate call once the first one is slower than the recent LLM_HEDGE_PERCENTILE
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))  # recent latencies kept per size band
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))  # seconds, until enough samples
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+# Hedges allowed per primary call, so a slow backend is not hit with twice the load
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+
+# Circuit breaker over the most recent LLM_BREAKER_WINDOW calls
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds open before a probe
+
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0)
+
+llm_request_duration_seconds = registry.histogram(
+    "llm_request_duration_seconds", "End-to-end question generation latency, hedges and retries included",
+    ("outcome",), buckets=LATENCY_BUCKETS)
+llm_attempt_duration_seconds = registry.histogram(
+    "llm_attempt_duration_seconds", "Latency of single Gemini calls by kind (primary/hedge) and outcome",
+    ("kind", "outcome"), buckets=LATENCY_BUCKETS)
+llm_hedges_total = registry.counter(
+    "llm_hedges_total", "Hedged Gemini calls by result (fired, won, skipped)", ("result",))
+llm_circuit_rejections_total = registry.counter(
+    "llm_circuit_rejections_total", "Generations rejected while the LLM circuit breaker was open")
+
+
+class LLMDeadlineExceeded(Exception):
+    """Generation did not finish within its deadline."""
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open; `retry_after` is the time in seconds until the next probe."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"LLM circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def request_deadline(number_questions: int) -> float:
+    """Seconds a generation of `number_questions` questions may take end to end."""
+    return min(LLM_DEADLINE_BASE + LLM_DEADLINE_PER_QUESTION * number_questions, LLM_DEADLINE_MAX)
+
+
+def size_band(number_questions: int) -> str:
+    """Latency grows with the number of questions, so hedge thresholds are kept per band."""
+    for upper in (5, 10, 20):
+        if number_questions <= upper:
+            return f"<={upper}"
+    return ">20"
+
+
+class HedgePolicy:
+    """
+    Adaptive hedge delay from recent successful call latencies per size band,
+    with a budget of LLM_HEDGE_BUDGET hedges per primary call.
+    """
+
+    def __init__(self, enabled: bool = LLM_HEDGE, pct: float = LLM_HEDGE_PERCENTILE, window: int = LLM_HEDGE_WINDOW,
+                 budget: float = LLM_HEDGE_BUDGET):
+        self.enabled = enabled
+        self.pct = pct
+        self.window = window
+        self.budget = budget
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._credit = 1.0
+
+    def observe(self, band: str, seconds: float):
+        self._latencies.setdefault(band, deque(maxlen=self.window)).append(seconds)
+
+    def delay(self, band: str) -> float:
+        samples = self._latencies.get(band)
+        if not samples or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, percentile(sorted(samples), self.pct))
+
+    def primary_started(self):
+        # Credit accrues per primary call and is capped at one hedge, so a slowdown cannot set off a burst of hedges
+        self._credit = min(self._credit + self.budget, 1.0)
+
+    def take(self) -> bool:
+        """Spend budget for one hedge; False when hedging is off or the budget is used up."""
+        if not self.enabled or self._credit < 1.0:
+            return False
+        self._credit -= 1.0
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "delay_seconds": {band: round(self.delay(band), 3) for band in sorted(self._latencies)},
+            "credit": round(self._credit, 2),
+        }
+
+
+class CircuitBreaker:
+    """
+    Closed while the failure rate over the last `window` calls stays below
+    `failure_rate`. Once it is exceeded the breaker opens and calls fail
+    fast; after `cooldown` seconds one probe call is let through
+    (half-open), and its outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 failure_rate: float = LLM_BREAKER_FAILURE_RATE, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failure
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        if self.state == "closed":
+            return
+        remaining = self._opened_at + self.cooldown - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        # A probe whose caller went away never reports back; give up on it after a cooldown
+        if self.state == "half_open" and (not self._probing or time.monotonic() - self._probe_started > self.cooldown):
+            self._probing = True
+            self._probe_started = time.monotonic()
+            return
+        llm_circuit_rejections_total.inc()
+        raise CircuitOpenError(max(remaining, 1.0))
+
+    def record(self, failed: bool):
+        if self.state == "half_open":
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                self.state = "closed"
+                self._outcomes.clear()
+            return
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+            self._open()
+
+    def skip(self):
+        """The call ended without saying anything about the backend's health."""
+        self._probing = False
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self._outcomes.clear()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": sum(self._outcomes),
+        }
+
+
+class TailLatency:
+    """Recent end-to-end latencies, for p50/p95/p99 in the API next to the histograms."""
+
+    def __init__(self, window: int = 1000):
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        ordered = sorted(self._latencies)
+        return {
+            f"p{pct}_ms": round(percentile(ordered, pct) * 1000, 1) if ordered else None
+            for pct in (50, 95, 99)
+        }
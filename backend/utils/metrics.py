@@ -0,0 +1,356 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set to a shared directory when running several uvicorn workers; each worker
+# writes its snapshot there and /metrics merges all of them
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5.0"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[str, ...]
+
+
+class _Metric:
+    """
+    Base for metrics whose values live in per-thread shards.
+
+    Recording only touches the calling thread's own dict, so the hot path
+    takes no lock; shards are summed when the registry is collected.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, Any]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict[Labels, Any]:
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = {}
+            self._local.values = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> List[Dict[Labels, Any]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1.0):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0.0) + amount
+
+    def collect(self) -> Dict[Labels, float]:
+        merged: Dict[Labels, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                merged[labels] = merged.get(labels, 0.0) + value
+        return merged
+
+
+class Gauge(Counter):
+    """Up/down gauge; increments and decrements may come from any thread."""
+
+    type = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1.0):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket (non-cumulative) counts plus the +Inf bucket, sum
+            state = [[0] * (len(self.buckets) + 1), 0.0]
+            shard[labels] = state
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def collect(self) -> Dict[Labels, Tuple[List[int], float]]:
+        merged: Dict[Labels, Tuple[List[int], float]] = {}
+        for shard in self._snapshots():
+            for labels, (counts, total) in shard.items():
+                current = merged.get(labels)
+                if current is None:
+                    merged[labels] = (list(counts), total)
+                else:
+                    merged[labels] = ([a + b for a, b in zip(current[0], counts)], current[1] + total)
+        return merged
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._callbacks: List[Tuple[str, str, Sequence[str], Callable[[], Dict[Labels, float]]]] = []
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name: str, help: str, labelnames: Sequence[str],
+                       callback: Callable[[], Dict[Labels, float]]):
+        """Register a gauge whose values are read from `callback` at collection time."""
+        self._callbacks.append((name, help, tuple(labelnames), callback))
+
+    # Collection
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Merged values of this process, in a JSON-serialisable form."""
+        families: Dict[str, Any] = {}
+        for metric in self._metrics:
+            family = {"type": metric.type, "help": metric.help, "labelnames": list(metric.labelnames)}
+            if isinstance(metric, Histogram):
+                family["buckets"] = list(metric.buckets)
+                family["samples"] = [[list(k), [counts, total]] for k, (counts, total) in metric.collect().items()]
+            else:
+                family["samples"] = [[list(k), v] for k, v in metric.collect().items()]
+            families[metric.name] = family
+
+        for name, help, labelnames, callback in self._callbacks:
+            try:
+                values = callback()
+            except Exception as e:
+                print(f"Metrics callback {name} failed: {str(e)}")
+                continue
+            families[name] = {
+                "type": "gauge",
+                "help": help,
+                "labelnames": list(labelnames),
+                "samples": [[list(k), v] for k, v in values.items()],
+            }
+        return families
+
+    def write_snapshot(self):
+        if not METRICS_MULTIPROC_DIR:
+            return
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        path = os.path.join(METRICS_MULTIPROC_DIR, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def start_snapshots(self):
+        """Periodically publish this worker's snapshot when running multi-process."""
+        if not METRICS_MULTIPROC_DIR or self._snapshot_thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.write_snapshot()
+                except Exception as e:
+                    print(f"Error writing metrics snapshot: {str(e)}")
+                time.sleep(METRICS_SNAPSHOT_INTERVAL)
+
+        self._snapshot_thread = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def _all_snapshots(self) -> List[Tuple[bool, Dict[str, Any]]]:
+        """(is_live, families) for this process and every other worker's snapshot."""
+        if not METRICS_MULTIPROC_DIR:
+            return [(True, self.snapshot())]
+
+        self.write_snapshot()
+        snapshots = []
+        for filename in os.listdir(METRICS_MULTIPROC_DIR):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(METRICS_MULTIPROC_DIR, filename)) as f:
+                    families = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((_pid_alive(int(filename[:-5])), families))
+        return snapshots
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for live, families in self._all_snapshots():
+            for name, family in families.items():
+                # Gauges describe current state, so only live workers count
+                if family["type"] == "gauge" and not live:
+                    continue
+                target = merged.setdefault(name, {**family, "values": {}})
+                values = target["values"]
+                for labels, value in family["samples"]:
+                    key = tuple(labels)
+                    if family["type"] == "histogram":
+                        counts, total = value
+                        if key in values:
+                            prev_counts, prev_total = values[key]
+                            values[key] = ([a + b for a, b in zip(prev_counts, counts)], prev_total + total)
+                        else:
+                            values[key] = (list(counts), total)
+                    else:
+                        values[key] = values.get(key, 0.0) + value
+
+        lines = []
+        for name, family in merged.items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            labelnames = family["labelnames"]
+            for labels, value in sorted(family["values"].items()):
+                if family["type"] == "histogram":
+                    counts, total = value
+                    cumulative = 0
+                    for bound, count in zip(family["buckets"] + ["+Inf"], counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labels: Sequence[str], le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+# HTTP
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by method, route template and status code", ("method", "route", "status"))
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route template", ("method", "route"))
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served")
+
+# Database
+db_pool_checkout_wait_seconds = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a connection from the SQLAlchemy pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+
+# Caches: every cache reports lookups as result="hit" or result="miss"
+cache_requests_total = registry.counter(
+    "cache_requests_total", "Cache lookups by cache name and result", ("cache", "result"))
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    cache_requests_total.inc((cache, "hit" if hit else "miss"))
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request counts, latency and in-flight requests.
+
+    Requests are labelled by route template (e.g. /dashboard/quiz/{quiz_id})
+    rather than the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_requests_total.inc((method, template, str(status_code)))
+            http_request_duration_seconds.observe(time.perf_counter() - started, (method, template))
+
+
+def instrument_pool(engine):
+    """Time connection checkouts from the engine's pool."""
+    pool = engine.pool
+    do_get = pool._do_get
+
+    def timed_do_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - started)
+
+    pool._do_get = timed_do_get
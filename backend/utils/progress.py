@@ -0,0 +1,159 @@
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, select
+
+from models import QuizAttempt, UserDailyProgress
+from utils.rollups import upsert_counters
+from utils.tracing import traced
+
+PROGRESS_COUNTERS = ("quizzes", "questions", "correct", "score_sum", "time_taken_sum")
+PROGRESS_KEY = ("user_id", "day", "topic_id")
+
+
+@traced("progress.record_completion")
+def record_completion(db, quiz: QuizAttempt, sign: int = 1):
+    """
+    Add a completed quiz to the user's daily series (sign=-1 removes it).
+    Runs in the caller's transaction, so the series commits with the quiz.
+    """
+    upsert_counters(db, UserDailyProgress, PROGRESS_KEY, PROGRESS_COUNTERS, [{
+        "user_id": quiz.user_id,
+        "day": (quiz.completed_at or datetime.utcnow()).date(),
+        "topic_id": quiz.topic_id or 0,
+        "quizzes": sign,
+        "questions": sign * (quiz.total_questions or 0),
+        "correct": sign * (quiz.correct_answers or 0),
+        "score_sum": sign * (quiz.percentage or 0),
+        "time_taken_sum": sign * (quiz.time_taken or 0),
+    }])
+
+
+def _ratio(numerator: float, denominator: float, scale: float = 1.0) -> Optional[float]:
+    return round(numerator / denominator * scale, 2) if denominator else None
+
+
+def _window_sums(prefix: Sequence[float], window: int) -> List[float]:
+    """Sum of the trailing `window` values at each position, from a prefix-sum array (prefix[0] == 0)."""
+    return [prefix[i + 1] - prefix[max(0, i + 1 - window)] for i in range(len(prefix) - 1)]
+
+
+def daily_series(rows, start: date, end: date, window: int) -> List[Dict[str, Any]]:
+    """
+    Per-day totals with rolling accuracy and moving average score over the
+    trailing `window` days. `rows` must cover `window - 1` days before
+    `start` so the first windows are complete. Prefix sums make every
+    window O(1), so the cost depends only on the number of days.
+    """
+    first = start - timedelta(days=window - 1)
+    span = (end - first).days + 1
+    columns = {c: [0.0] * span for c in PROGRESS_COUNTERS}
+    for row in rows:
+        i = (row.day - first).days
+        if 0 <= i < span:
+            for c in PROGRESS_COUNTERS:
+                columns[c][i] += getattr(row, c) or 0
+
+    windows = {
+        c: _window_sums([0.0, *accumulate(columns[c])], window)
+        for c in ("quizzes", "questions", "correct", "score_sum")
+    }
+
+    series = []
+    for i in range(window - 1, span):
+        series.append({
+            "date": (first + timedelta(days=i)).isoformat(),
+            "quizzes": int(columns["quizzes"][i]),
+            "questions": int(columns["questions"][i]),
+            "correct": int(columns["correct"][i]),
+            "accuracy": _ratio(columns["correct"][i], columns["questions"][i], 100),
+            "average_score": _ratio(columns["score_sum"][i], columns["quizzes"][i]),
+            "rolling_accuracy": _ratio(windows["correct"][i], windows["questions"][i], 100),
+            "moving_average_score": _ratio(windows["score_sum"][i], windows["quizzes"][i]),
+        })
+    return series
+
+
+def streaks(active_days: Sequence[date], today: date) -> Dict[str, int]:
+    """Current and longest runs of consecutive days with at least one completed quiz."""
+    longest = run = 0
+    previous = None
+    for day in active_days:
+        run = run + 1 if previous is not None and (day - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = day
+    # A streak is still current if the last quiz was today or yesterday
+    current = run if previous is not None and (today - previous).days <= 1 else 0
+    return {"current_streak": current, "longest_streak": longest}
+
+
+def topic_summary(rows, start: date, end: date, window: int) -> List[Dict[str, Any]]:
+    """Totals per topic over [start, end], plus accuracy in the last window and the one before it."""
+    recent_start = end - timedelta(days=window - 1)
+    previous_start = recent_start - timedelta(days=window)
+    topics: Dict[int, Dict[str, float]] = {}
+    for row in rows:
+        if row.day < previous_start:
+            continue
+        totals = topics.setdefault(row.topic_id, {
+            **{c: 0.0 for c in PROGRESS_COUNTERS},
+            "recent_questions": 0.0, "recent_correct": 0.0, "previous_questions": 0.0, "previous_correct": 0.0,
+        })
+        if row.day >= start:
+            for c in PROGRESS_COUNTERS:
+                totals[c] += getattr(row, c) or 0
+        period = "recent" if row.day >= recent_start else "previous"
+        totals[f"{period}_questions"] += row.questions or 0
+        totals[f"{period}_correct"] += row.correct or 0
+
+    summary = []
+    for topic_id, totals in topics.items():
+        recent = _ratio(totals["recent_correct"], totals["recent_questions"], 100)
+        previous = _ratio(totals["previous_correct"], totals["previous_questions"], 100)
+        summary.append({
+            "topic_id": topic_id or None,
+            "quizzes": int(totals["quizzes"]),
+            "accuracy": _ratio(totals["correct"], totals["questions"], 100),
+            "average_score": _ratio(totals["score_sum"], totals["quizzes"]),
+            "rolling_accuracy": recent,
+            "trend": round(recent - previous, 2) if recent is not None and previous is not None else None,
+        })
+    return sorted(summary, key=lambda t: t["quizzes"], reverse=True)
+
+
+def backfill_user_progress(db, chunk_size: int = 5000) -> int:
+    """Rebuild every user's daily series from completed attempts. Returns attempts read."""
+    db.execute(delete(UserDailyProgress))
+    db.commit()
+
+    read = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.topic_id, QuizAttempt.completed_at,
+                   QuizAttempt.total_questions, QuizAttempt.correct_answers, QuizAttempt.percentage,
+                   QuizAttempt.time_taken)
+            .where(QuizAttempt.id > last_id, QuizAttempt.status == "completed",
+                   QuizAttempt.completed_at.isnot(None))
+            .order_by(QuizAttempt.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return read
+        last_id = rows[-1].id
+        read += len(rows)
+
+        merged: Dict[tuple, Dict[str, float]] = {}
+        for row in rows:
+            totals = merged.setdefault((row.user_id, row.completed_at.date(), row.topic_id or 0),
+                                       {c: 0 for c in PROGRESS_COUNTERS})
+            totals["quizzes"] += 1
+            totals["questions"] += row.total_questions or 0
+            totals["correct"] += row.correct_answers or 0
+            totals["score_sum"] += row.percentage or 0
+            totals["time_taken_sum"] += row.time_taken or 0
+        upsert_counters(db, UserDailyProgress, PROGRESS_KEY, PROGRESS_COUNTERS, (
+            {"user_id": user_id, "day": day, "topic_id": topic_id, **totals}
+            for (user_id, day, topic_id), totals in merged.items()
+        ))
+        db.commit()
@@ -0,0 +1,296 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional, Set
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+
+from models import QuizAttempt, User
+from auth_utils import verify_token
+from utils.idempotency import dedupe_cache
+from utils.metrics import registry
+from utils.sharding import shard_router
+
+load_dotenv()
+
+# Seconds between writes of a session's buffered events; answers are durable within this delay
+QUIZ_SESSION_FLUSH_INTERVAL = float(os.getenv("QUIZ_SESSION_FLUSH_INTERVAL", "2.0"))
+
+quiz_session_events_total = registry.counter(
+    "quiz_session_events_total", "Events received on quiz session sockets by type", ("type",))
+quiz_session_writes_total = registry.counter(
+    "quiz_session_writes_total", "Quiz session state writes by outcome", ("outcome",))
+
+
+class SessionClosed(Exception):
+    """The quiz is no longer ongoing (completed, abandoned or deleted)."""
+
+    def __init__(self, status: Optional[str]):
+        super().__init__(status)
+        self.status = status
+
+
+class LiveQuizSession:
+    """In-memory state of one ongoing quiz, shared by all of its open sockets."""
+
+    def __init__(self, user_id: int, quiz_id: int, total_questions: int, version: int,
+                 current_question_index: int, user_answers: Dict[str, Any], time_taken: int,
+                 tenant: Optional[str] = None):
+        self.user_id = user_id
+        self.tenant = tenant  # username, picks the shard the state is written to
+        self.quiz_id = quiz_id
+        self.total_questions = total_questions
+        self.version = version
+        self.current_question_index = current_question_index
+        self.user_answers = user_answers
+        self.time_taken = time_taken
+        self.sockets: Set[Any] = set()
+        # Bumped by every event; the session is dirty until a write covers the latest revision
+        self.revision = 0
+        self.written_revision = 0
+        self.lock = asyncio.Lock()
+
+    @property
+    def dirty(self) -> bool:
+        return self.revision != self.written_revision
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "quiz_id": self.quiz_id,
+            "version": self.version,
+            "current_question_index": self.current_question_index,
+            "user_answers": self.user_answers,
+            "time_taken": self.time_taken,
+        }
+
+    def apply(self, event: Dict[str, Any]):
+        """Apply one client event. Raises ValueError for malformed events."""
+        kind = event.get("type")
+        if kind == "answer":
+            index = _question_index(event.get("question"), self.total_questions)
+            selected = event.get("selected")
+            if not isinstance(selected, list) or not all(isinstance(s, str) for s in selected):
+                raise ValueError("selected must be a list of strings")
+            self.user_answers = {**self.user_answers, str(index): selected}
+        elif kind == "navigate":
+            self.current_question_index = _question_index(event.get("question"), self.total_questions)
+        elif kind == "sync":
+            # Full client state, sent when a socket (re)connects
+            self.current_question_index = _question_index(
+                event.get("current_question_index", self.current_question_index), self.total_questions)
+            answers = event.get("user_answers")
+            if not isinstance(answers, dict):
+                raise ValueError("user_answers must be an object")
+            self.user_answers = {str(k): v for k, v in answers.items()}
+        elif kind not in ("tick", "flush"):
+            raise ValueError(f"Unknown event type: {kind}")
+
+        # Every event may carry the client's quiz timer
+        if "time_taken" in event:
+            time_taken = event["time_taken"]
+            if not isinstance(time_taken, int) or time_taken < 0:
+                raise ValueError("time_taken must be a non-negative integer")
+            self.time_taken = max(self.time_taken, time_taken)
+        if kind != "flush":
+            self.revision += 1
+
+
+def _question_index(value: Any, total_questions: int) -> int:
+    if not isinstance(value, int) or not 0 <= value < max(total_questions, 1):
+        raise ValueError("question index out of range")
+    return value
+
+
+class QuizSessionManager:
+    """
+    Live quiz sessions behind the /dashboard/session WebSocket.
+
+    Clients authenticate once when the socket opens and then send small
+    answer/navigation/timer events. Events only update the in-memory
+    session; a background task writes dirty sessions every
+    QUIZ_SESSION_FLUSH_INTERVAL seconds, so a burst of answers costs one
+    UPDATE, and the last socket to disconnect writes whatever is left. The
+    write bumps the attempt's version like save-state does, so late HTTP
+    autosaves carrying an older version no longer apply.
+    """
+
+    def __init__(self, flush_interval: float = QUIZ_SESSION_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.sessions: Dict[int, LiveQuizSession] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush_all()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_all()
+
+    async def flush_all(self):
+        for session in list(self.sessions.values()):
+            if session.dirty:
+                try:
+                    await self.flush(session)
+                except SessionClosed as e:
+                    await self.close_sockets(session, e.status)
+                except Exception as e:
+                    print(f"Error saving quiz session {session.quiz_id}: {str(e)}")
+
+    async def open(self, token: str, quiz_id: int, websocket) -> LiveQuizSession:
+        """Authenticate and attach `websocket` to the quiz's session, loading it on first use."""
+        username = verify_token(token)
+        session = self.sessions.get(quiz_id)
+        if session is None:
+            loaded = await run_in_threadpool(_load_session, username, quiz_id)
+            # Another socket may have loaded it while this one waited for the database
+            session = self.sessions.setdefault(quiz_id, loaded)
+        elif await run_in_threadpool(_user_id_for, username) != session.user_id:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        session.sockets.add(websocket)
+        return session
+
+    async def close(self, session: LiveQuizSession, websocket):
+        """Detach `websocket`; the last socket out writes the session and drops it from memory."""
+        session.sockets.discard(websocket)
+        if session.sockets:
+            return
+        try:
+            if session.dirty:
+                await self.flush(session)
+        except SessionClosed:
+            pass
+        finally:
+            if not session.sockets and self.sessions.get(session.quiz_id) is session:
+                del self.sessions[session.quiz_id]
+
+    async def flush(self, session: LiveQuizSession):
+        """Write the session's current state and tell its sockets the new version."""
+        async with session.lock:
+            if not session.dirty:
+                return
+            revision = session.revision
+            state = session.state()
+            try:
+                version = await run_in_threadpool(_write_state, session.tenant, session.user_id, state)
+            except SessionClosed:
+                quiz_session_writes_total.inc(("closed",))
+                raise
+            except Exception:
+                quiz_session_writes_total.inc(("error",))
+                raise
+            quiz_session_writes_total.inc(("saved",))
+            session.version = version
+            session.written_revision = revision
+        await self._broadcast(session, {"type": "saved", "version": version})
+
+    async def _broadcast(self, session: LiveQuizSession, message: Dict[str, Any]):
+        for websocket in list(session.sockets):
+            try:
+                await websocket.send_json(message)
+            except Exception:
+                session.sockets.discard(websocket)
+
+    async def close_sockets(self, session: LiveQuizSession, status: Optional[str]):
+        await self._broadcast(session, {"type": "closed", "status": status})
+        for websocket in list(session.sockets):
+            try:
+                await websocket.close(code=1000)
+            except Exception:
+                pass
+        session.sockets.clear()
+        self.sessions.pop(session.quiz_id, None)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.sessions),
+            "sockets": sum(len(s.sockets) for s in self.sessions.values()),
+        }
+
+
+def _user_id_for(username: str) -> int:
+    db = shard_router.session(username)
+    try:
+        user_id = db.query(User.id).filter(User.username == username).scalar()
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user_id
+    finally:
+        db.close()
+
+
+def _load_session(username: str, quiz_id: int) -> LiveQuizSession:
+    db = shard_router.session(username)
+    try:
+        user_id = db.query(User.id).filter(User.username == username).scalar()
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        quiz = db.query(
+            QuizAttempt.total_questions, QuizAttempt.version, QuizAttempt.status,
+            QuizAttempt.current_question_index, QuizAttempt.user_answers, QuizAttempt.time_taken
+        ).filter(QuizAttempt.id == quiz_id, QuizAttempt.user_id == user_id).first()
+        if not quiz:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        if quiz.status != "ongoing":
+            raise HTTPException(status_code=409, detail=f"Quiz is {quiz.status}")
+        return LiveQuizSession(
+            user_id, quiz_id, quiz.total_questions or 0, quiz.version,
+            quiz.current_question_index or 0, dict(quiz.user_answers or {}), quiz.time_taken or 0,
+            tenant=username
+        )
+    finally:
+        db.close()
+
+
+def _write_state(tenant: str, user_id: int, state: Dict[str, Any]) -> int:
+    """
+    Write the live state of an ongoing quiz and return its new version. The
+    socket session is the quiz's current writer, so it does not compare
+    versions; it only refuses to touch a quiz that is no longer ongoing.
+    """
+    db = shard_router.session(tenant)
+    try:
+        quiz_id = state["quiz_id"]
+        stmt = update(QuizAttempt).where(
+            QuizAttempt.id == quiz_id,
+            QuizAttempt.user_id == user_id,
+            QuizAttempt.status == "ongoing"
+        ).values(
+            current_question_index=state["current_question_index"],
+            user_answers=state["user_answers"],
+            time_taken=state["time_taken"],
+            version=QuizAttempt.version + 1
+        ).execution_options(synchronize_session=False)
+        if db.get_bind().dialect.update_returning:
+            version = db.execute(stmt.returning(QuizAttempt.version)).scalar()
+        elif db.execute(stmt).rowcount:
+            version = db.query(QuizAttempt.version).filter(QuizAttempt.id == quiz_id).scalar()
+        else:
+            version = None
+
+        if version is None:
+            db.rollback()
+            raise SessionClosed(db.query(QuizAttempt.status).filter(QuizAttempt.id == quiz_id).scalar())
+        db.commit()
+        # save-state's cached digest now describes an older version
+        dedupe_cache.discard(("state", quiz_id))
+        return version
+    finally:
+        db.close()
+
+
+quiz_sessions = QuizSessionManager()
+
+registry.gauge_callback(
+    "quiz_sessions_active", "Open quiz session sockets", (),
+    lambda: {(): quiz_sessions.metrics()["sockets"]})
@@ -0,0 +1,292 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+
+from utils.metrics import registry
+from utils.tracing import span
+
+load_dotenv()
+
+# Per-user token bucket, measured in generated questions
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "100"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+
+# Global LLM work queue
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_PENDING = int(os.getenv("LLM_MAX_PENDING", "32"))
+LLM_MAX_PENDING_PER_KEY = int(os.getenv("LLM_MAX_PENDING_PER_KEY", "2"))
+
+
+class RateLimitStore(ABC):
+    """Storage backend for token bucket state, keyed by client."""
+
+    @abstractmethod
+    def take(self, key: str, cost: float, capacity: float, refill_rate: float) -> Tuple[bool, float]:
+        """
+        Try to take `cost` tokens from the bucket for `key`.
+
+        Returns:
+            Tuple[bool, float]: (allowed, seconds until enough tokens are available)
+        """
+
+    @abstractmethod
+    def give_back(self, key: str, amount: float, capacity: float):
+        """Return `amount` tokens taken from the bucket for `key`, up to `capacity`."""
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of buckets currently tracked."""
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Process-local bucket store keeping at most `max_keys` buckets, least recently used dropped first."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, capacity: float, refill_rate: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * refill_rate)
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                self._buckets.move_to_end(key)
+                self._evict()
+                return True, 0.0
+
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            self._evict()
+            retry_after = (cost - tokens) / refill_rate if refill_rate > 0 else math.inf
+            return False, retry_after
+
+    def give_back(self, key: str, amount: float, capacity: float):
+        with self._lock:
+            if key in self._buckets:  # an evicted bucket starts full anyway
+                tokens, last = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + amount), last)
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self):
+        # Least recently used buckets go first; a dropped bucket simply starts full again
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity: float, per_minute: float, store: Optional[RateLimitStore] = None):
+        self.capacity = capacity
+        self.refill_rate = per_minute / 60.0
+        self.store = store or InMemoryRateLimitStore()
+        self.allowed = 0
+        self.rejected = 0
+        self.refunded = 0
+
+    def check(self, key: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Charge `cost` tokens to `key`.
+
+        A request larger than the whole bucket is charged as a full bucket,
+        so it is still admitted once the bucket has refilled.
+        """
+        ok, retry_after = self.store.take(key, min(cost, self.capacity), self.capacity, self.refill_rate)
+        if ok:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return ok, retry_after
+
+    def refund(self, key: str, cost: float = 1.0):
+        """Give back what `check` charged for a request that was then turned away."""
+        self.store.give_back(key, min(cost, self.capacity), self.capacity)
+        self.refunded += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "allowed_total": self.allowed,
+            "rejected_total": self.rejected,
+            "refunded_total": self.refunded,
+            "tracked_keys": self.store.size(),
+            "capacity": self.capacity,
+            "refill_per_second": self.refill_rate,
+        }
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("LLM work queue is full")
+        self.retry_after = retry_after
+
+
+class FairWorkQueue:
+    """
+    Bounded admission queue for LLM work.
+
+    At most `max_concurrency` callers hold a slot at once. Waiting callers are
+    grouped per key and slots are handed out round-robin across keys, so one
+    client with many queued requests cannot starve the others.
+    """
+
+    def __init__(self, max_concurrency: int, max_pending: int, max_pending_per_key: int):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.max_pending_per_key = max_pending_per_key
+        self._active = 0
+        self._pending = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._avg_service_time = 5.0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def estimated_wait(self) -> float:
+        """Rough seconds until a newly queued caller would get a slot."""
+        waves = (self._pending // max(self.max_concurrency, 1)) + 1
+        return waves * self._avg_service_time
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        if self._active < self.max_concurrency and self._pending == 0:
+            self._active += 1
+        else:
+            waiters = self._waiters.get(key)
+            if self._pending >= self.max_pending or (
+                waiters is not None and len(waiters) >= self.max_pending_per_key
+            ):
+                self.rejected += 1
+                raise QueueFullError(self.estimated_wait())
+
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(key, deque()).append(future)
+            self._pending += 1
+            try:
+                with span("llm.queue_wait", pending=self._pending):
+                    await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as we were cancelled
+                    self._release()
+                else:
+                    self._discard(key, future)
+                raise
+
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+            self._release()
+
+    def _discard(self, key: str, future: asyncio.Future):
+        waiters = self._waiters.get(key)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            self._pending -= 1
+            if not waiters:
+                del self._waiters[key]
+
+    def _release(self):
+        # Hand the slot directly to the next key in round-robin order
+        while self._waiters:
+            key, waiters = next(iter(self._waiters.items()))
+            future = waiters.popleft()
+            self._pending -= 1
+            if waiters:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "pending": self._pending,
+            "waiting_keys": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "admitted_total": self.admitted,
+            "rejected_total": self.rejected,
+            "avg_service_seconds": round(self._avg_service_time, 3),
+        }
+
+
+generation_limiter = TokenBucketLimiter(RATE_LIMIT_BURST, RATE_LIMIT_PER_MINUTE)
+llm_queue = FairWorkQueue(LLM_MAX_CONCURRENCY, LLM_MAX_PENDING, LLM_MAX_PENDING_PER_KEY)
+
+admission_rejected_total = registry.counter(
+    "admission_rejected_total", "Generation requests rejected by admission control", ("reason",))
+registry.gauge_callback(
+    "llm_queue_depth", "Requests waiting for an LLM slot", (), lambda: {(): llm_queue.pending})
+registry.gauge_callback(
+    "llm_queue_active", "LLM calls currently holding a slot", (), lambda: {(): llm_queue.active})
+
+
+def _retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def enforce_rate_limit(key: str, cost: float = 1.0):
+    """Raise 429 with Retry-After if `key` has exhausted its token bucket."""
+    allowed, retry_after = generation_limiter.check(key, cost)
+    if not allowed:
+        admission_rejected_total.inc(("rate_limit",))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many generation requests, please slow down",
+            headers=_retry_after_header(retry_after),
+        )
+
+
+@asynccontextmanager
+async def llm_slot(key: str, charged: float = 0):
+    """
+    Hold a slot in the global LLM queue, raising 503 with Retry-After when it
+    is full. `charged` is what enforce_rate_limit took for this request; it is
+    refunded on a 503, so a client turned away by the queue does not pay.
+    """
+    try:
+        async with llm_queue.slot(key):
+            yield
+    except QueueFullError as e:
+        if charged:
+            generation_limiter.refund(key, charged)
+        admission_rejected_total.inc(("queue_full",))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Question generation is busy, please retry shortly",
+            headers=_retry_after_header(e.retry_after),
+        )
+
+
+def admission_metrics() -> Dict[str, Any]:
+    return {
+        "rate_limiter": generation_limiter.metrics(),
+        "llm_queue": llm_queue.metrics(),
+    }
@@ -0,0 +1,243 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, delete, func, select, update
+
+from database import SessionLocal
+from models import QuizAttempt, QuestionAnswer, GenerationJob, LLMCall, MaintenanceRun, RevokedToken
+from utils.job_queue import TERMINAL_STATUSES
+from utils.metrics import registry
+from utils.rollups import usage_rollups
+from utils.search import remove_attempts
+from utils.sharding import shard_router
+
+load_dotenv()
+
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))  # seconds between sweeps, 0 disables
+RETENTION_ABANDON_AFTER_HOURS = float(os.getenv("RETENTION_ABANDON_AFTER_HOURS", "72"))
+RETENTION_PURGE_ABANDONED_DAYS = float(os.getenv("RETENTION_PURGE_ABANDONED_DAYS", "90"))
+RETENTION_JOB_DAYS = float(os.getenv("RETENTION_JOB_DAYS", "7"))
+RETENTION_LLM_CALL_DAYS = float(os.getenv("RETENTION_LLM_CALL_DAYS", "90"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "200"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))  # seconds, lets other writers in
+# Directory for gzipped JSON lines of abandoned quizzes' questions and answers; unset strips them
+RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR")
+
+retention_rows_total = registry.counter(
+    "retention_rows_total", "Rows changed by the retention sweeper by action", ("action",))
+retention_sweep_duration_seconds = registry.histogram(
+    "retention_sweep_duration_seconds", "Duration of retention sweeps by outcome", ("status",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+class RetentionSweeper:
+    """
+    Periodic maintenance of quiz and log tables.
+
+    Each sweep marks ongoing attempts that have not been saved for
+    RETENTION_ABANDON_AFTER_HOURS as abandoned and drops their question and
+    answer JSON and search index rows (archiving the JSON first when
+    RETENTION_ARCHIVE_DIR is set), then
+    deletes long-abandoned attempts, finished generation jobs, old LLM
+    call rows and revocations of tokens that have expired anyway. All work
+    happens in short transactions of at most RETENTION_BATCH_SIZE rows with
+    a pause in between, so SQLite's write lock is never held for long. Every sweep is recorded in `maintenance_runs`.
+    """
+
+    def __init__(self, interval: int = RETENTION_INTERVAL, batch_size: int = RETENTION_BATCH_SIZE,
+                 batch_pause: float = RETENTION_BATCH_PAUSE, archive_dir: Optional[str] = RETENTION_ARCHIVE_DIR):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.archive_dir = archive_dir
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.last_run_at: Optional[float] = None  # unix time
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await run_in_threadpool(self.sweep)
+
+    def sweep(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Run one sweep and return its summary."""
+        now = now or datetime.utcnow()
+        started = time.perf_counter()
+        self._batches = 0
+        counts: Dict[str, int] = {}
+        error = None
+        try:
+            counts["abandoned"] = self._abandon_idle(now - timedelta(hours=RETENTION_ABANDON_AFTER_HOURS))
+            counts["purged_attempts"] = self._purge_abandoned(now - timedelta(days=RETENTION_PURGE_ABANDONED_DAYS))
+            counts["purged_jobs"] = self._purge_rows(
+                GenerationJob, GenerationJob.id,
+                and_(GenerationJob.status.in_(TERMINAL_STATUSES),
+                     GenerationJob.finished_at < now - timedelta(days=RETENTION_JOB_DAYS)))
+            counts["purged_llm_calls"] = self._purge_rows(
+                LLMCall, LLMCall.id, LLMCall.created_at < now - timedelta(days=RETENTION_LLM_CALL_DAYS))
+            counts["purged_revoked_tokens"] = self._purge_rows(
+                RevokedToken, RevokedToken.jti, RevokedToken.expires_at < now)
+        except Exception as e:
+            error = str(e)
+            print(f"Retention sweep failed: {error}")
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        status = "failed" if error else "succeeded"
+        for action, rows in counts.items():
+            retention_rows_total.inc((action,), rows)
+        retention_sweep_duration_seconds.observe(duration_ms / 1000, (status,))
+
+        self.last_run_at = time.time()
+        self.last_run = {
+            "status": status,
+            "counts": counts,
+            "batches": self._batches,
+            "error": error,
+            "started_at": now.isoformat(),
+            "duration_ms": round(duration_ms, 1),
+        }
+        self._record_run(now, status, counts, error, duration_ms)
+        return self.last_run
+
+    def _record_run(self, now: datetime, status: str, counts: Dict[str, int], error: Optional[str],
+                    duration_ms: float):
+        db = SessionLocal()
+        try:
+            db.add(MaintenanceRun(
+                task="retention", status=status, counts=counts, batches=self._batches, error=error,
+                started_at=now, finished_at=datetime.utcnow(), duration_ms=duration_ms,
+            ))
+            db.commit()
+        except Exception as e:
+            print(f"Failed to record retention run: {str(e)}")
+        finally:
+            db.close()
+
+    def _batch(self, work, session_factory=SessionLocal) -> Tuple[int, int]:
+        """Run `work(db)` in its own transaction and pause before the next batch."""
+        db = session_factory()
+        try:
+            selected, changed = work(db)
+            db.commit()
+        finally:
+            db.close()
+        self._batches += 1
+        if selected and self.batch_pause:
+            time.sleep(self.batch_pause)
+        return selected, changed
+
+    def _abandon_idle(self, cutoff: datetime) -> int:
+        last_saved = func.coalesce(QuizAttempt.updated_at, QuizAttempt.started_at)
+        idle = and_(QuizAttempt.status == "ongoing", last_saved < cutoff)
+
+        def work(db) -> Tuple[int, int]:
+            rows = db.execute(
+                select(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.topic, QuizAttempt.topic_id,
+                       QuizAttempt.difficulty, QuizAttempt.questions_data, QuizAttempt.user_answers)
+                .where(idle).order_by(QuizAttempt.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                return 0, 0
+            if self.archive_dir:
+                self._archive(rows)
+            # Re-check idleness so a quiz saved since the SELECT is left alone
+            result = db.execute(
+                update(QuizAttempt)
+                .where(QuizAttempt.id.in_([row.id for row in rows]), idle)
+                .values(status="abandoned", questions_data=None, user_answers=None, updated_at=datetime.utcnow(),
+                        version=QuizAttempt.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            abandoned = rows
+            if result.rowcount != len(rows):
+                # Some were saved in the meantime; count only the ones that were abandoned
+                abandoned_ids = set(db.execute(
+                    select(QuizAttempt.id).where(QuizAttempt.id.in_([row.id for row in rows]),
+                                                 QuizAttempt.status == "abandoned")
+                ).scalars())
+                abandoned = [row for row in rows if row.id in abandoned_ids]
+            for row in abandoned:
+                usage_rollups.record(row.difficulty, topic_id=row.topic_id, abandoned=1)
+            remove_attempts(db, [row.id for row in abandoned])
+            return len(rows), result.rowcount
+
+        return self._on_every_shard(work)
+
+    def _archive(self, rows: List[Any]):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"abandoned-{datetime.utcnow():%Y%m%d}.jsonl.gz")
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({
+                    "quiz_id": row.id,
+                    "user_id": row.user_id,
+                    "topic": row.topic,
+                    "questions_data": row.questions_data,
+                    "user_answers": row.user_answers,
+                }) + "\n")
+
+    def _purge_abandoned(self, cutoff: datetime) -> int:
+        expired = and_(QuizAttempt.status == "abandoned",
+                       func.coalesce(QuizAttempt.updated_at, QuizAttempt.started_at) < cutoff)
+
+        def work(db) -> Tuple[int, int]:
+            ids = db.execute(select(QuizAttempt.id).where(expired).limit(self.batch_size)).scalars().all()
+            if ids:
+                db.execute(delete(QuestionAnswer).where(QuestionAnswer.quiz_attempt_id.in_(ids)))
+                db.execute(delete(QuizAttempt).where(QuizAttempt.id.in_(ids)))
+                remove_attempts(db, ids)
+            return len(ids), len(ids)
+
+        return self._on_every_shard(work)
+
+    def _purge_rows(self, model, id_column, condition) -> int:
+        def work(db) -> Tuple[int, int]:
+            ids = db.execute(select(id_column).where(condition).limit(self.batch_size)).scalars().all()
+            if ids:
+                db.execute(delete(model).where(id_column.in_(ids)))
+            return len(ids), len(ids)
+
+        return self._until_done(work)
+
+    def _until_done(self, work, session_factory=SessionLocal) -> int:
+        total = 0
+        while True:
+            selected, changed = self._batch(work, session_factory)
+            total += changed
+            if selected < self.batch_size:
+                return total
+
+    def _on_every_shard(self, work) -> int:
+        """Quiz tables are per tenant; sweep each shard in turn."""
+        return sum(self._until_done(work, session_factory) for session_factory in shard_router.sessionmakers)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "running": self._task is not None,
+            "last_run": self.last_run,
+        }
+
+
+retention_sweeper = RetentionSweeper()
+
+registry.gauge_callback(
+    "retention_last_run_timestamp_seconds", "Unix time of the last retention sweep by outcome", ("status",),
+    lambda: {(retention_sweeper.last_run["status"],): retention_sweeper.last_run_at} if retention_sweeper.last_run else {})
@@ -0,0 +1,251 @@
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from models import QuestionAnswer, QuizAttempt, ReviewItem
+from utils.enrichment import content_hash
+from utils.metrics import registry
+from utils.search import question_outcome
+
+load_dotenv()
+
+# A failed review comes back after this many minutes, so it is relearned in the same sitting
+REVIEW_RELEARN_MINUTES = float(os.getenv("REVIEW_RELEARN_MINUTES", "10"))
+REVIEW_MAX_INTERVAL_DAYS = float(os.getenv("REVIEW_MAX_INTERVAL_DAYS", "365"))
+
+MIN_EASE = 1.3
+PASSING_GRADE = 3  # SM-2 grades: 0-2 failed, 3 correct with difficulty (low confidence), 4 correct, 5 perfect
+
+review_answers_total = registry.counter(
+    "review_answers_total", "Graded review answers by result", ("result",))
+
+
+def sm2(repetitions: int, interval_days: float, ease_factor: float, grade: int) -> Tuple[int, float, float]:
+    """Next (repetitions, interval_days, ease_factor) after a review graded 0-5, per SuperMemo 2."""
+    if grade < PASSING_GRADE:
+        # Start over; SM-2 leaves the ease factor alone on a failure
+        return 0, 0.0, ease_factor
+    if repetitions == 0:
+        interval_days = 1.0
+    elif repetitions == 1:
+        interval_days = 6.0
+    else:
+        interval_days = min(round(interval_days * ease_factor), REVIEW_MAX_INTERVAL_DAYS)
+    ease_factor = max(MIN_EASE, ease_factor + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return repetitions + 1, interval_days, ease_factor
+
+
+def missed_rows(user_id: int, topic: str, difficulty: str, questions, user_answers=None,
+                answer_rows: Iterable[Any] = (), at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Review items for the questions a user got wrong in one completed quiz.
+    Results come from `answer_rows` (question_answers) where there are any,
+    otherwise from user_answers; the questions themselves always come from
+    questions_data, since question_answers rows have no options.
+    """
+    at = at or datetime.utcnow()
+    user_answers = user_answers or {}
+    answered = {answer.question_index: answer.is_correct for answer in answer_rows if answer.user_answer is not None}
+    rows = []
+    for index, question in enumerate(questions or []):
+        if not isinstance(question, dict) or not question.get("question") or not question.get("options"):
+            continue
+        if index in answered:
+            missed = not answered[index]
+        else:
+            missed = question_outcome(question, user_answers.get(str(index))) == "wrong"
+        if missed:
+            rows.append({
+                "user_id": user_id,
+                "content_hash": content_hash(question),
+                "topic": topic or "",
+                "difficulty": difficulty or "",
+                "question": {k: question.get(k) for k in ("question", "options", "answers", "explanation")},
+                "due_at": at,
+                "lapses": 1,
+            })
+    return rows
+
+
+def upsert_review_items(db: Session, rows: Iterable[Dict[str, Any]]):
+    """
+    Put missed questions at the front of their owners' queues in the
+    caller's transaction: new ones are due at once, and ones already being
+    reviewed start their schedule over.
+    """
+    merged: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["user_id"], row["content_hash"])
+        if key in merged:
+            # One statement may not touch a row twice (PostgreSQL); fold repeats first
+            merged[key] = {**row, "lapses": merged[key]["lapses"] + row["lapses"],
+                           "due_at": max(merged[key]["due_at"], row["due_at"])}
+        else:
+            merged[key] = row
+    rows = [{"repetitions": 0, "interval_days": 0.0, "ease_factor": 2.5, "reviews": 0, **row}
+            for row in merged.values()]
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(ReviewItem)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "content_hash"],
+            set_={
+                "question": stmt.excluded.question,
+                "due_at": stmt.excluded.due_at,
+                "repetitions": 0,
+                "interval_days": 0.0,
+                "lapses": ReviewItem.lapses + stmt.excluded.lapses,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    for row in rows:
+        changed = db.execute(
+            update(ReviewItem)
+            .where(ReviewItem.user_id == row["user_id"], ReviewItem.content_hash == row["content_hash"])
+            .values(question=row["question"], due_at=row["due_at"], repetitions=0, interval_days=0.0,
+                    lapses=ReviewItem.lapses + row["lapses"])
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not changed:
+            db.add(ReviewItem(**row))
+            db.flush()
+
+
+def queue_missed(db: Session, quiz: QuizAttempt, questions, user_answers) -> int:
+    """Queue a completed quiz's missed questions for review; returns how many were missed."""
+    rows = missed_rows(quiz.user_id, quiz.topic, quiz.difficulty, questions, user_answers,
+                       at=quiz.completed_at)
+    upsert_review_items(db, rows)
+    return len(rows)
+
+
+def review_to_dict(item) -> Dict[str, Any]:
+    question = item.question or {}
+    return {
+        "review_id": item.id,
+        "topic": item.topic,
+        "difficulty": item.difficulty,
+        "question": question.get("question"),
+        "options": question.get("options") or [],
+        "answers": question.get("answers") or [],
+        "explanation": question.get("explanation"),
+        "repetitions": item.repetitions,
+        "lapses": item.lapses,
+        "due_at": item.due_at.isoformat() if item.due_at else None,
+    }
+
+
+def due_reviews(db: Session, user_id: int, limit: int, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """The user's `limit` most overdue review items: one range scan of ix_review_items_due."""
+    now = now or datetime.utcnow()
+    items = db.execute(
+        select(ReviewItem.id, ReviewItem.topic, ReviewItem.difficulty, ReviewItem.question,
+               ReviewItem.repetitions, ReviewItem.lapses, ReviewItem.due_at)
+        .where(ReviewItem.user_id == user_id, ReviewItem.due_at <= now)
+        .order_by(ReviewItem.due_at).limit(limit)
+    ).all()
+    return [review_to_dict(item) for item in items]
+
+
+def next_due_at(db: Session, user_id: int) -> Optional[datetime]:
+    return db.execute(select(func.min(ReviewItem.due_at)).where(ReviewItem.user_id == user_id)).scalar()
+
+
+def grade_reviews(db: Session, user_id: int, answers: List[Dict[str, Any]],
+                  now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Reschedule reviewed items with SM-2 in the caller's transaction. Each
+    answer has a `review_id` and the selected `answer` and/or a `grade`
+    (0-5); without a grade, correct answers get 4 and wrong ones 1, and a
+    grade never contradicts the answer (correct answers pass, wrong ones
+    fail). Unknown ids are skipped.
+    """
+    now = now or datetime.utcnow()
+    graded = {answer["review_id"]: answer for answer in answers}
+    items = db.execute(
+        select(ReviewItem.id, ReviewItem.question, ReviewItem.repetitions, ReviewItem.interval_days,
+               ReviewItem.ease_factor, ReviewItem.lapses, ReviewItem.reviews)
+        .where(ReviewItem.user_id == user_id, ReviewItem.id.in_(list(graded)))
+    ).all()
+
+    updates, results = [], []
+    for item in items:
+        answer = graded[item.id]
+        selected = answer.get("answer")
+        grade = answer.get("grade")
+        correct = None
+        if selected is not None:
+            correct = question_outcome(item.question or {}, selected) == "correct"
+            if grade is None:
+                grade = 4 if correct else 1
+            grade = max(grade, PASSING_GRADE) if correct else min(grade, PASSING_GRADE - 1)
+        repetitions, interval_days, ease_factor = sm2(item.repetitions, item.interval_days, item.ease_factor, grade)
+        failed = grade < PASSING_GRADE
+        due_at = now + (timedelta(minutes=REVIEW_RELEARN_MINUTES) if failed else timedelta(days=interval_days))
+        updates.append({
+            "id": item.id, "repetitions": repetitions, "interval_days": interval_days, "ease_factor": ease_factor,
+            "lapses": item.lapses + failed, "reviews": item.reviews + 1, "last_grade": grade,
+            "last_reviewed_at": now, "due_at": due_at, "updated_at": now,
+        })
+        results.append({
+            "review_id": item.id, "correct": correct, "grade": grade, "due_at": due_at.isoformat(),
+            "interval_days": interval_days, "repetitions": repetitions, "ease_factor": round(ease_factor, 2),
+        })
+        review_answers_total.inc(("failed" if failed else "passed",))
+    if updates:
+        # ORM bulk UPDATE by primary key: one executemany
+        db.execute(update(ReviewItem), updates)
+    return results
+
+
+def backfill_review_items(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Queue the missed questions of every completed attempt that still has
+    its questions_data, oldest first, one committed chunk of ids at a time.
+    Does nothing once the table has items, since replaying history would
+    reset their schedules. Returns the number of missed questions queued.
+    """
+    if db.execute(select(ReviewItem.id).limit(1)).first() is not None:
+        return 0
+    queued = 0
+    last_id = 0
+    while True:
+        attempts = db.execute(
+            select(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.topic, QuizAttempt.difficulty,
+                   QuizAttempt.questions_data, QuizAttempt.user_answers, QuizAttempt.completed_at)
+            .where(QuizAttempt.id > last_id, QuizAttempt.status == "completed",
+                   QuizAttempt.questions_data.isnot(None))
+            .order_by(QuizAttempt.id).limit(chunk_size)
+        ).all()
+        if not attempts:
+            return queued
+        answers = {}
+        for answer in db.execute(
+            select(QuestionAnswer.quiz_attempt_id, QuestionAnswer.question_index, QuestionAnswer.user_answer,
+                   QuestionAnswer.is_correct)
+            .where(QuestionAnswer.quiz_attempt_id.in_([attempt.id for attempt in attempts]))
+        ):
+            answers.setdefault(answer.quiz_attempt_id, []).append(answer)
+
+        rows = []
+        for attempt in attempts:
+            rows.extend(missed_rows(attempt.user_id, attempt.topic, attempt.difficulty, attempt.questions_data,
+                                    attempt.user_answers, answers.get(attempt.id, ()), at=attempt.completed_at))
+        upsert_review_items(db, rows)
+        db.commit()
+        queued += len(rows)
+        last_id = attempts[-1].id
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import RevokedToken
+from utils.metrics import registry
+
+load_dotenv()
+
+# Expected revocations alive at once (the filter grows past this on its next rebuild) and target false positive rate
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+# Seconds between reads of revocations made by other processes, and between full rebuilds that drop expired ones
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "5"))
+REVOCATION_REBUILD_INTERVAL = float(os.getenv("REVOCATION_REBUILD_INTERVAL", "3600"))
+
+SYNC_LOOKBACK_SECONDS = 60
+
+revocation_checks_total = registry.counter(
+    "revocation_checks_total", "Token denylist checks by result", ("result",))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; no false negatives, about `error_rate` false positives at capacity."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class TokenDenylist:
+    """
+    Revoked JWT ids, checked on every authenticated request.
+
+    Revocations are rows in `revoked_tokens` (main database), and every
+    process keeps an in-memory Bloom filter of them. A token whose ids are
+    not in the filter is valid without touching the database, which is
+    nearly every request; only filter hits are confirmed with a primary key
+    lookup. The filter picks up other processes' revocations every
+    REVOCATION_SYNC_INTERVAL seconds, and is rebuilt from the table every
+    REVOCATION_REBUILD_INTERVAL seconds (or once it is over capacity), which
+    drops rows the retention sweeper has purged after their tokens expired.
+    """
+
+    def __init__(self, capacity: int = REVOCATION_BLOOM_CAPACITY, error_rate: float = REVOCATION_BLOOM_ERROR_RATE,
+                 sync_interval: float = REVOCATION_SYNC_INTERVAL, rebuild_interval: float = REVOCATION_REBUILD_INTERVAL):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter: Optional[BloomFilter] = None
+        self._confirmed: Dict[str, datetime] = {}  # revoked ids already looked up -> expiry
+        self._synced_to: Optional[datetime] = None  # revoked_at of the newest row read
+        self._rebuilt_at = 0.0  # time.monotonic()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.lookups = 0
+        self.false_positives = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        await run_in_threadpool(self.rebuild)
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                if time.monotonic() - self._rebuilt_at >= self.rebuild_interval:
+                    await run_in_threadpool(self.rebuild)
+                else:
+                    await run_in_threadpool(self.sync)
+            except Exception as e:
+                print(f"Token denylist refresh failed: {str(e)}")
+
+    def rebuild(self):
+        """Replace the filter with one built from every unexpired revocation."""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(RevokedToken.jti, RevokedToken.revoked_at).where(RevokedToken.expires_at > now)
+            ).all()
+        finally:
+            db.close()
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for row in rows:
+            bloom.add(row.jti)
+        with self._lock:
+            self._filter = bloom
+            self._synced_to = max((row.revoked_at for row in rows), default=self._synced_to or now)
+            self._confirmed = {jti: expires for jti, expires in self._confirmed.items() if expires > now}
+            self._rebuilt_at = time.monotonic()
+
+    def sync(self):
+        """Add revocations made since the last read (by any process) to the filter."""
+        if self._filter is None:
+            return self.rebuild()
+        db = SessionLocal()
+        try:
+            # Look back a little: a revocation stamped earlier may commit after a later one
+            rows = db.execute(
+                select(RevokedToken.jti, RevokedToken.revoked_at)
+                .where(RevokedToken.revoked_at >= self._synced_to - timedelta(seconds=SYNC_LOOKBACK_SECONDS))
+            ).all()
+        finally:
+            db.close()
+        with self._lock:
+            for row in rows:
+                if row.jti not in self._filter:
+                    self._filter.add(row.jti)
+                self._synced_to = max(self._synced_to, row.revoked_at)
+            over_capacity = self._filter.count > self._filter.capacity
+        if over_capacity:
+            self.rebuild()
+
+    def revoke(self, entries: Iterable[Dict[str, Any]]):
+        """
+        Persist revocations, each a dict of jti, username, kind and
+        expires_at, and add them to this process's filter at once.
+        """
+        entries = [{**entry, "revoked_at": datetime.utcnow()} for entry in entries if entry.get("jti")]
+        if not entries:
+            return
+        db = SessionLocal()
+        try:
+            dialect = db.get_bind().dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "sqlite":
+                    from sqlalchemy.dialects.sqlite import insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert
+                db.execute(insert(RevokedToken).on_conflict_do_nothing(index_elements=["jti"]), entries)
+                db.commit()
+            else:
+                for entry in entries:
+                    try:
+                        db.add(RevokedToken(**entry))
+                        db.commit()
+                    except IntegrityError:
+                        db.rollback()  # already revoked
+        finally:
+            db.close()
+        if self._filter is None:
+            self.rebuild()
+        with self._lock:
+            for entry in entries:
+                if entry["jti"] not in self._filter:
+                    self._filter.add(entry["jti"])
+                self._confirmed[entry["jti"]] = entry["expires_at"]
+
+    def spend(self, entry: Dict[str, Any]) -> bool:
+        """
+        Revoke one single-use token (jti, username, kind, expires_at) as a
+        compare-and-set: True only for the caller whose insert created the
+        row, False if it was already revoked.
+        """
+        entry = {**entry, "revoked_at": datetime.utcnow()}
+        db = SessionLocal()
+        try:
+            dialect = db.get_bind().dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "sqlite":
+                    from sqlalchemy.dialects.sqlite import insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert
+                inserted = db.execute(
+                    insert(RevokedToken).values(**entry).on_conflict_do_nothing(index_elements=["jti"])
+                ).rowcount == 1
+                db.commit()
+            else:
+                try:
+                    db.add(RevokedToken(**entry))
+                    db.commit()
+                    inserted = True
+                except IntegrityError:
+                    db.rollback()
+                    inserted = False
+        finally:
+            db.close()
+        if self._filter is None:
+            self.rebuild()
+        with self._lock:
+            if entry["jti"] not in self._filter:
+                self._filter.add(entry["jti"])
+            self._confirmed[entry["jti"]] = entry["expires_at"]
+        return inserted
+
+    def is_revoked(self, *ids: Optional[str]) -> bool:
+        """True if any of the ids (a token's jti and session) is revoked."""
+        if self._filter is None:
+            # Scripts and tests that never ran the lifespan
+            self.rebuild()
+        candidates = [jti for jti in ids if jti and jti in self._filter]
+        if not candidates:
+            revocation_checks_total.inc(("negative",))
+            return False
+        if any(jti in self._confirmed for jti in candidates):
+            revocation_checks_total.inc(("revoked",))
+            return True
+
+        self.lookups += 1
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(RevokedToken.jti, RevokedToken.expires_at)
+                .where(RevokedToken.jti.in_(candidates), RevokedToken.expires_at > datetime.utcnow())
+            ).all()
+        finally:
+            db.close()
+        if not rows:
+            self.false_positives += 1
+            revocation_checks_total.inc(("false_positive",))
+            return False
+        with self._lock:
+            for row in rows:
+                self._confirmed[row.jti] = row.expires_at
+        revocation_checks_total.inc(("revoked",))
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        bloom = self._filter
+        return {
+            "entries": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else self.capacity,
+            "filter_bytes": len(bloom._bits) if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+            "database_lookups_total": self.lookups,
+            "false_positives_total": self.false_positives,
+        }
+
+
+token_denylist = TokenDenylist()
+
+registry.gauge_callback(
+    "revocation_filter_entries", "Revoked token ids in this process's Bloom filter", (),
+    lambda: {(): token_denylist.metrics()["entries"]})
@@ -0,0 +1,255 @@
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import and_, delete, select, update
+
+from database import SessionLocal
+from models import QuizAttempt, LLMCall, UsageRollup
+from utils.metrics import registry
+from utils.topics import resolve_topic_id
+
+load_dotenv()
+
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "5.0"))  # seconds
+
+COUNTERS = ("generations", "generated_questions", "started", "completed", "abandoned", "score_sum", "time_taken_sum")
+
+# (bucket_start, topic_id, topic text, difficulty); topic text is set only until the topic is resolved
+PendingKey = Tuple[datetime, Optional[int], Optional[str], str]
+
+
+def hour_bucket(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def upsert_counters(db, model, key_columns: Tuple[str, ...], counters: Tuple[str, ...],
+                    rows: Iterable[Dict[str, Any]]):
+    """Add each row's counters to the `model` row with the same key columns, creating it if needed."""
+    rows = [{**{c: 0 for c in counters}, **row} for row in rows]
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_columns),
+            set_={
+                **{c: getattr(model, c) + getattr(stmt.excluded, c) for c in counters},
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    for row in rows:
+        key = and_(*[getattr(model, k) == row[k] for k in key_columns])
+        changed = db.execute(
+            update(model).where(key)
+            .values({c: getattr(model, c) + row[c] for c in counters})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not changed:
+            db.add(model(**row))
+            db.flush()
+
+
+def upsert_rollups(db, rows: Iterable[Dict[str, Any]]):
+    """Add each row's counters to its (bucket_start, topic_id, difficulty) rollup, creating it if needed."""
+    upsert_counters(db, UsageRollup, ("bucket_start", "topic_id", "difficulty"), COUNTERS, rows)
+
+
+class UsageRollups:
+    """
+    Write-behind hourly usage counters per canonical topic and difficulty.
+
+    `record` only adds to an in-memory dict, so it is cheap on the request
+    path. A daemon thread flushes the accumulated deltas every
+    ROLLUP_FLUSH_INTERVAL seconds as one additive upsert per key; events
+    that only know the topic text (generations) are resolved to canonical
+    topics at flush time.
+    """
+
+    def __init__(self, flush_interval: float = ROLLUP_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending: Dict[PendingKey, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.flushed = 0
+        self.dropped = 0
+
+    def record(self, difficulty: str, topic_id: Optional[int] = None, topic: Optional[str] = None,
+               at: Optional[datetime] = None, **increments: float):
+        """Add `increments` (counter name -> amount) to the current hour's rollup."""
+        key = (hour_bucket(at or datetime.utcnow()), topic_id, None if topic_id is not None else topic, difficulty)
+        with self._lock:
+            counters = self._pending.setdefault(key, {})
+            for name, amount in increments.items():
+                counters[name] = counters.get(name, 0) + (amount or 0)
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="usage-rollups", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Write everything recorded so far."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            db = SessionLocal()
+            try:
+                topic_ids: Dict[str, Optional[int]] = {}
+                merged: Dict[Tuple[datetime, int, str], Dict[str, float]] = {}
+                for (bucket, topic_id, topic, difficulty), counters in pending.items():
+                    if topic_id is None and topic is not None:
+                        if topic not in topic_ids:
+                            topic_ids[topic] = resolve_topic_id(db, topic)
+                        topic_id = topic_ids[topic]
+                    row = merged.setdefault((bucket, topic_id or 0, difficulty), {})
+                    for name, amount in counters.items():
+                        row[name] = row.get(name, 0) + amount
+
+                upsert_rollups(db, (
+                    {"bucket_start": bucket, "topic_id": topic_id, "difficulty": difficulty, **counters}
+                    for (bucket, topic_id, difficulty), counters in merged.items()
+                ))
+                db.commit()
+                self.flushed += len(merged)
+            except Exception as e:
+                db.rollback()
+                self.dropped += len(pending)
+                print(f"Error writing usage rollups: {str(e)}")
+            finally:
+                db.close()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flush thread after writing everything recorded so far."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        self._thread = None
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._pending)
+        return {
+            "buffered_keys": buffered,
+            "flushed_total": self.flushed,
+            "dropped_total": self.dropped,
+        }
+
+
+usage_rollups = UsageRollups()
+
+registry.gauge_callback(
+    "usage_rollups_buffered", "Usage rollup keys waiting to be written", (),
+    lambda: {(): usage_rollups.metrics()["buffered_keys"]})
+
+
+def backfill_usage_rollups(db, chunk_size: int = 5000, attempt_sessions=None) -> int:
+    """
+    Rebuild all rollups before the current hour from quiz attempts and the
+    LLM call ledger, reading `chunk_size` rows per transaction. Attempts are
+    read from `attempt_sessions` (one per shard) when given, else from `db`.
+    The current hour keeps its live counters. Returns the number of source
+    rows read.
+    """
+    usage_rollups.flush()
+    cutoff = hour_bucket(datetime.utcnow())
+    db.execute(delete(UsageRollup).where(UsageRollup.bucket_start < cutoff))
+    db.commit()
+
+    topic_ids: Dict[str, Optional[int]] = {}
+    read = 0
+
+    def add(chunk: Dict[Tuple[datetime, int, str], Dict[str, float]], at: datetime, topic_id, difficulty,
+            **increments):
+        if at is None or at >= cutoff:
+            return
+        row = chunk.setdefault((hour_bucket(at), topic_id or 0, difficulty), {})
+        for name, amount in increments.items():
+            row[name] = row.get(name, 0) + (amount or 0)
+
+    def write(chunk):
+        upsert_rollups(db, (
+            {"bucket_start": bucket, "topic_id": topic_id, "difficulty": difficulty, **counters}
+            for (bucket, topic_id, difficulty), counters in chunk.items()
+        ))
+        db.commit()
+
+    # Quiz attempts: started (created through save-state), completed, abandoned
+    for source in attempt_sessions or [db]:
+        last_id = 0
+        while True:
+            rows = source.execute(
+                select(QuizAttempt.id, QuizAttempt.topic_id, QuizAttempt.difficulty, QuizAttempt.status,
+                       QuizAttempt.started_at, QuizAttempt.completed_at, QuizAttempt.updated_at,
+                       QuizAttempt.percentage, QuizAttempt.time_taken,
+                       QuizAttempt.questions_data.isnot(None).label("has_questions"))
+                .where(QuizAttempt.id > last_id).order_by(QuizAttempt.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            read += len(rows)
+
+            chunk: Dict[Tuple[datetime, int, str], Dict[str, float]] = {}
+            for row in rows:
+                # Fresh results from save-quiz never went through save-state
+                if row.status != "completed" or row.has_questions:
+                    add(chunk, row.started_at, row.topic_id, row.difficulty, started=1)
+                if row.status == "completed":
+                    add(chunk, row.completed_at, row.topic_id, row.difficulty, completed=1,
+                        score_sum=row.percentage, time_taken_sum=row.time_taken)
+                elif row.status == "abandoned":
+                    add(chunk, row.updated_at or row.started_at, row.topic_id, row.difficulty, abandoned=1)
+            write(chunk)
+
+    # Successful generations from the LLM call ledger
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(LLMCall.id, LLMCall.created_at, LLMCall.topic, LLMCall.difficulty, LLMCall.valid_questions)
+            .where(LLMCall.id > last_id, LLMCall.outcome == "success")
+            .order_by(LLMCall.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        read += len(rows)
+
+        chunk = {}
+        for row in rows:
+            if row.topic not in topic_ids:
+                topic_ids[row.topic] = resolve_topic_id(db, row.topic)
+            add(chunk, row.created_at, topic_ids[row.topic], row.difficulty,
+                generations=1, generated_questions=row.valid_questions)
+        write(chunk)
+
+    return read
@@ -0,0 +1,514 @@
+import asyncio
+import heapq
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from utils.metrics import registry
+from utils.search import question_outcome
+
+load_dotenv()
+
+# Default time to answer each question, in seconds (a room may pick its own)
+ROOM_QUESTION_SECONDS = int(os.getenv("ROOM_QUESTION_SECONDS", "20"))
+ROOM_MAX_PLAYERS = int(os.getenv("ROOM_MAX_PLAYERS", "500"))
+# Seconds between scoreboard and lobby updates; answers and joins in between are sent as one message
+ROOM_UPDATE_INTERVAL = float(os.getenv("ROOM_UPDATE_INTERVAL", "0.5"))
+# Messages queued for one socket before it is dropped as too slow
+ROOM_SEND_QUEUE = int(os.getenv("ROOM_SEND_QUEUE", "32"))
+# Rooms with no sockets are dropped after this many seconds
+ROOM_IDLE_SECONDS = float(os.getenv("ROOM_IDLE_SECONDS", "900"))
+
+SCOREBOARD_SIZE = 10
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # no 0/O or 1/I
+CODE_LENGTH = 6
+
+room_broadcasts_total = registry.counter(
+    "room_broadcasts_total", "Messages broadcast to quiz rooms by type", ("type",))
+room_broadcast_seconds = registry.histogram(
+    "room_broadcast_seconds", "Time to serialize a room message and queue it for every socket", (),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+room_dropped_sockets_total = registry.counter(
+    "room_dropped_sockets_total", "Room sockets dropped by the server by reason", ("reason",))
+
+
+class RoomBackplane:
+    """
+    Carries serialized room messages to every process with sockets in a
+    room. Each process subscribes a delivery callback per room and
+    publishes each message once, already serialized.
+    """
+
+    async def publish(self, code: str, message: str):
+        raise NotImplementedError
+
+    def subscribe(self, code: str, deliver: Callable[[str], None]):
+        raise NotImplementedError
+
+    def unsubscribe(self, code: str, deliver: Callable[[str], None]):
+        raise NotImplementedError
+
+
+class LocalBackplane(RoomBackplane):
+    """Backplane for a single process: publishing calls the local subscribers directly."""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[Callable[[str], None]]] = {}
+
+    async def publish(self, code: str, message: str):
+        for deliver in list(self.subscribers.get(code, ())):
+            deliver(message)
+
+    def subscribe(self, code: str, deliver: Callable[[str], None]):
+        self.subscribers.setdefault(code, set()).add(deliver)
+
+    def unsubscribe(self, code: str, deliver: Callable[[str], None]):
+        subscribers = self.subscribers.get(code)
+        if subscribers is not None:
+            subscribers.discard(deliver)
+            if not subscribers:
+                del self.subscribers[code]
+
+
+class RoomConnection:
+    """
+    One socket in a room. Messages go through a bounded queue drained by
+    the socket's own sender task, so a broadcast only queues text and a
+    slow client delays nobody else; one whose queue fills up is dropped.
+    """
+
+    def __init__(self, websocket, username: str, is_host: bool, queue_size: int = ROOM_SEND_QUEUE):
+        self.websocket = websocket
+        self.username = username
+        self.is_host = is_host
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._send())
+
+    def offer(self, message: str) -> bool:
+        """Queue a serialized message; False if the socket is closed or too far behind."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def send_json(self, message: Dict[str, Any]) -> bool:
+        return self.offer(json.dumps(message, separators=(",", ":")))
+
+    async def _send(self):
+        try:
+            while True:
+                await self.websocket.send_text(await self.queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True  # the receive loop notices the disconnect and leaves the room
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+
+class Player:
+    def __init__(self, username: str):
+        self.username = username
+        self.score = 0
+        self.correct = 0
+        self.answers: Dict[str, List[str]] = {}  # question index -> selected, like quiz user_answers
+        self.points: Dict[str, int] = {}
+        self.sockets = 0
+
+
+class Room:
+    """
+    A live quiz run by a host for many players: everyone sees the same
+    question at the same time, answers are scored as they arrive (faster
+    correct answers earn more), and the scoreboard is kept incrementally.
+    Questions use the generated quiz format (question, options, answers,
+    explanation); answers are collected per player like a quiz attempt's
+    user_answers.
+    """
+
+    def __init__(self, code: str, host: str, topic: str, difficulty: str, questions: List[Dict[str, Any]],
+                 question_seconds: int = ROOM_QUESTION_SECONDS):
+        self.code = code
+        self.host = host
+        self.topic = topic
+        self.difficulty = difficulty
+        self.questions = questions
+        self.question_seconds = question_seconds
+        self.status = "lobby"  # lobby, question, reveal, finished
+        self.index = -1
+        self.ends_at: Optional[float] = None  # unix time the current question closes
+        self.opened_at = 0.0  # time.monotonic() the current question opened
+        self.players: Dict[str, Player] = {}
+        self.connected = 0  # players with at least one open socket
+        self.connections: Set[RoomConnection] = set()
+        self.answered = 0
+        self.counts: Dict[str, int] = {}  # option -> players who picked it, current question
+        self.scoreboard_dirty = False
+        self.lobby_dirty = False
+        self.idle_since: Optional[float] = time.monotonic()
+        self.timer: Optional[asyncio.Task] = None  # closes the open question when time is up
+        self.deliver: Optional[Callable[[str], None]] = None  # backplane subscription
+
+    @property
+    def question(self) -> Optional[Dict[str, Any]]:
+        return self.questions[self.index] if 0 <= self.index < len(self.questions) else None
+
+    def leaders(self, size: int = SCOREBOARD_SIZE) -> List[Dict[str, Any]]:
+        top = heapq.nlargest(size, self.players.values(), key=lambda player: (player.score, player.correct))
+        return [{"username": player.username, "score": player.score} for player in top]
+
+    def standings(self) -> List[Dict[str, Any]]:
+        ordered = sorted(self.players.values(), key=lambda player: (-player.score, -player.correct, player.username))
+        return [{"rank": rank, "username": player.username, "score": player.score, "correct": player.correct}
+                for rank, player in enumerate(ordered, 1)]
+
+    def question_message(self) -> Dict[str, Any]:
+        question = self.question
+        return {
+            "type": "question",
+            "index": self.index,
+            "total": len(self.questions),
+            "question": question.get("question"),
+            "options": question.get("options") or [],
+            "multiple": len(question.get("answers") or []) > 1,
+            "seconds": self.question_seconds,
+            "ends_at": self.ends_at,
+        }
+
+    def reveal_message(self) -> Dict[str, Any]:
+        question = self.question
+        return {
+            "type": "reveal",
+            "index": self.index,
+            "answers": question.get("answers") or [],
+            "explanation": question.get("explanation"),
+            "counts": self.counts,
+            "answered": self.answered,
+            "leaders": self.leaders(),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "code": self.code,
+            "host": self.host,
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+            "status": self.status,
+            "index": self.index,
+            "total_questions": len(self.questions),
+            "question_seconds": self.question_seconds,
+            "players": len(self.players),
+            "connected": self.connected,
+        }
+
+    def score_answer(self, player: Player, index: Any, selected: Any) -> int:
+        """Record a player's answer to the open question and return the points it earned."""
+        if self.status != "question" or index != self.index:
+            raise ValueError("That question is not open")
+        if not isinstance(selected, list) or not selected or not all(isinstance(s, str) for s in selected):
+            raise ValueError("selected must be a non-empty list of strings")
+        # Only the question's own options, each once: selections are counted and broadcast in the reveal
+        options = self.question["options"]
+        if len(selected) > len(options) or len(set(selected)) != len(selected) or any(s not in options for s in selected):
+            raise ValueError("selected must be distinct options of the question")
+        key = str(index)
+        if key in player.answers:
+            raise ValueError("Already answered")
+        elapsed = time.monotonic() - self.opened_at
+        if elapsed > self.question_seconds:
+            raise ValueError("Time is up")
+
+        player.answers[key] = selected
+        points = 0
+        if question_outcome(self.question, selected) == "correct":
+            # 1000 for an instant answer down to 500 at the buzzer
+            points = round(1000 * (1 - elapsed / self.question_seconds / 2))
+            player.correct += 1
+            player.score += points
+        player.points[key] = points
+        self.answered += 1
+        for option in selected:
+            self.counts[option] = self.counts.get(option, 0) + 1
+        self.scoreboard_dirty = True
+        return points
+
+
+class RoomManager:
+    """
+    Live quiz rooms behind the /rooms WebSocket.
+
+    A room's state lives in the process that created it. Every broadcast is
+    serialized once and published on the backplane, whose subscribers queue
+    the same text on each of their sockets; per-player messages (join
+    snapshots, answer acks, results) go straight to one socket. Scoreboard
+    and lobby changes are coalesced and sent every ROOM_UPDATE_INTERVAL
+    seconds, so 300 answers to one question cost a handful of broadcasts
+    rather than 300. The LocalBackplane only reaches this process; with
+    several workers, route each room's sockets to one of them (or plug in a
+    shared backplane that also forwards player events to the room's owner).
+    """
+
+    def __init__(self, backplane: Optional[RoomBackplane] = None, update_interval: float = ROOM_UPDATE_INTERVAL,
+                 idle_seconds: float = ROOM_IDLE_SECONDS, max_players: int = ROOM_MAX_PLAYERS):
+        self.backplane = backplane or LocalBackplane()
+        self.update_interval = update_interval
+        self.idle_seconds = idle_seconds
+        self.max_players = max_players
+        self.rooms: Dict[str, Room] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for room in list(self.rooms.values()):
+            await self._drop(room)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.update_interval)
+            try:
+                await self.send_updates()
+            except Exception as e:
+                print(f"Error sending room updates: {str(e)}")
+
+    async def send_updates(self):
+        """Send pending scoreboard and lobby changes, and drop rooms idle for too long."""
+        now = time.monotonic()
+        for room in list(self.rooms.values()):
+            if room.idle_since is not None and now - room.idle_since > self.idle_seconds:
+                await self._drop(room)
+                continue
+            if room.lobby_dirty:
+                room.lobby_dirty = False
+                await self.broadcast(room, {
+                    "type": "lobby",
+                    "players": sorted(name for name, player in room.players.items() if player.sockets),
+                })
+            if room.scoreboard_dirty and room.status == "question":
+                room.scoreboard_dirty = False
+                await self.broadcast(room, {
+                    "type": "scoreboard",
+                    "index": room.index,
+                    "answered": room.answered,
+                    "connected": room.connected,
+                    "leaders": room.leaders(),
+                })
+
+    def create(self, host: str, topic: str, difficulty: str, questions: List[Dict[str, Any]],
+               question_seconds: int = ROOM_QUESTION_SECONDS) -> Room:
+        while True:
+            code = "".join(random.choices(CODE_ALPHABET, k=CODE_LENGTH))
+            if code not in self.rooms:
+                break
+        room = Room(code, host, topic, difficulty, questions, question_seconds)
+        self.rooms[code] = room
+        room.deliver = lambda message: self._deliver(room, message)
+        self.backplane.subscribe(code, room.deliver)
+        return room
+
+    def get(self, code: str) -> Room:
+        room = self.rooms.get(code.upper())
+        if room is None:
+            raise HTTPException(status_code=404, detail="Room not found")
+        return room
+
+    def join(self, code: str, username: str, websocket) -> Tuple[Room, RoomConnection]:
+        """Attach an accepted socket to a room as its host or a player."""
+        room = self.get(code)
+        is_host = username == room.host
+        player = None
+        if not is_host:
+            player = room.players.get(username)
+            if player is None:
+                if room.status == "finished":
+                    raise HTTPException(status_code=409, detail="Room has finished")
+                if len(room.players) >= self.max_players:
+                    raise HTTPException(status_code=409, detail="Room is full")
+                player = room.players[username] = Player(username)
+            room.connected += player.sockets == 0
+            player.sockets += 1
+            room.lobby_dirty = True
+
+        connection = RoomConnection(websocket, username, is_host)
+        connection.start()
+        room.connections.add(connection)
+        room.idle_since = None
+
+        welcome = {"type": "welcome", "role": "host" if is_host else "player", "username": username,
+                   "room": room.summary(), "leaders": room.leaders()}
+        if player is not None:
+            welcome["score"] = player.score
+        if room.status == "question":
+            welcome["question"] = room.question_message()
+            if player is not None:
+                welcome["answered"] = str(room.index) in player.answers
+        elif room.status == "finished":
+            welcome["standings"] = room.standings()
+        connection.send_json(welcome)
+        return room, connection
+
+    async def leave(self, room: Room, connection: RoomConnection):
+        room.connections.discard(connection)
+        await connection.close()
+        if not connection.is_host:
+            player = room.players.get(connection.username)
+            if player is not None and player.sockets:
+                player.sockets -= 1
+                room.connected -= player.sockets == 0
+            room.lobby_dirty = True
+        if not room.connections:
+            room.idle_since = time.monotonic()
+
+    async def handle(self, room: Room, connection: RoomConnection, event: Dict[str, Any]):
+        """Apply one socket event. Raises ValueError for malformed or disallowed events."""
+        kind = event.get("type")
+        if kind == "answer":
+            player = room.players.get(connection.username)
+            if player is None:
+                raise ValueError("Only players answer")
+            room.score_answer(player, event.get("question"), event.get("selected"))
+            connection.send_json({"type": "answered", "index": room.index})
+            if room.answered >= room.connected:
+                await self.reveal(room)  # everyone here has answered; no need to wait for the timer
+            return
+        if kind in ("start", "next", "reveal", "end") and not connection.is_host:
+            raise ValueError(f"Only the host can {kind}")
+        if kind in ("start", "next"):
+            await self.next_question(room)
+        elif kind == "reveal":
+            if room.status != "question":
+                raise ValueError("No question is open")
+            await self.reveal(room)
+        elif kind == "end":
+            await self.finish(room)
+        else:
+            raise ValueError(f"Unknown event type: {kind}")
+
+    async def next_question(self, room: Room):
+        if room.status == "finished":
+            raise ValueError("Room has finished")
+        if room.status == "question":
+            await self.reveal(room)
+        if room.index + 1 >= len(room.questions):
+            await self.finish(room)
+            return
+        room.index += 1
+        room.status = "question"
+        room.answered = 0
+        room.counts = {}
+        room.scoreboard_dirty = False
+        room.opened_at = time.monotonic()
+        room.ends_at = time.time() + room.question_seconds
+        self._cancel_timer(room)
+        room.timer = asyncio.create_task(self._close_after(room, room.index, room.question_seconds))
+        await self.broadcast(room, room.question_message())
+
+    async def _close_after(self, room: Room, index: int, seconds: float):
+        await asyncio.sleep(seconds)
+        room.timer = None
+        if room.status == "question" and room.index == index:
+            await self.reveal(room)
+
+    async def reveal(self, room: Room):
+        """Close the open question: broadcast the answer and tell each player how they did."""
+        if room.status != "question":
+            return
+        self._cancel_timer(room)
+        room.status = "reveal"
+        room.scoreboard_dirty = False
+        await self.broadcast(room, room.reveal_message())
+
+        key = str(room.index)
+        ranks = {entry["username"]: entry["rank"] for entry in room.standings()}
+        for connection in list(room.connections):
+            player = room.players.get(connection.username)
+            if player is None:
+                continue
+            selected = player.answers.get(key)
+            connection.send_json({
+                "type": "result",
+                "index": room.index,
+                "answered": selected is not None,
+                "correct": selected is not None and question_outcome(room.question, selected) == "correct",
+                "points": player.points.get(key, 0),
+                "score": player.score,
+                "rank": ranks[player.username],
+            })
+
+    async def finish(self, room: Room):
+        if room.status == "finished":
+            return
+        if room.status == "question":
+            await self.reveal(room)
+        self._cancel_timer(room)
+        room.status = "finished"
+        room.ends_at = None
+        await self.broadcast(room, {"type": "finished", "standings": room.standings()})
+
+    async def broadcast(self, room: Room, message: Dict[str, Any]):
+        """Serialize once and publish to every socket in the room."""
+        started = time.perf_counter()
+        await self.backplane.publish(room.code, json.dumps(message, separators=(",", ":")))
+        room_broadcast_seconds.observe(time.perf_counter() - started)
+        room_broadcasts_total.inc((message["type"],))
+
+    def _deliver(self, room: Room, message: str):
+        for connection in list(room.connections):
+            if not connection.offer(message):
+                # Too far behind (or gone): drop it rather than buffer without bound
+                room.connections.discard(connection)
+                room_dropped_sockets_total.inc(("slow" if not connection.closed else "closed",))
+                asyncio.create_task(connection.close(code=1013, reason="Too slow"))
+
+    def _cancel_timer(self, room: Room):
+        if room.timer is not None:
+            room.timer.cancel()
+        room.timer = None
+
+    async def _drop(self, room: Room):
+        self._cancel_timer(room)
+        self.rooms.pop(room.code, None)
+        for connection in list(room.connections):
+            await connection.close(code=1001, reason="Room closed")
+        room.connections.clear()
+        self.backplane.unsubscribe(room.code, room.deliver)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "rooms": len(self.rooms),
+            "sockets": sum(len(room.connections) for room in self.rooms.values()),
+        }
+
+
+room_manager = RoomManager()
+
+registry.gauge_callback(
+    "room_sockets_active", "Open quiz room sockets", (),
+    lambda: {(): room_manager.metrics()["sockets"]})
@@ -0,0 +1,313 @@
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from models import QuestionAnswer, QuizAttempt
+from utils.tracing import traced
+
+# Index rows of attempt n are numbered from n * ROWS_PER_ATTEMPT: question i is row + i + 1, and an attempt
+# without questions gets one topic-only row. Updating or removing an attempt is a rowid range, not a scan.
+ROWS_PER_ATTEMPT = 1 << 10
+SEARCH_MAX_TERMS = 16
+SEARCH_SNIPPET_WORDS = 16
+HIGHLIGHT = ("<mark>", "</mark>")
+
+_WORD = re.compile(r"[^\W_]+")  # the words FTS5's unicode61 tokenizer would see
+
+# SQLite: FTS5 over the text columns, with every word stored as "u<user id>x<word>". Each user's words
+# are then separate terms: a search reads only that user's postings and bm25 weighs words by how rare
+# they are in the user's own quizzes. Plain bm25 over shared terms reads every user's postings of each
+# word to count documents, which costs tens of milliseconds per common word at a million rows.
+# `display` keeps the question (or topic) as written for snippets; `outcome` is correct/wrong.
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_search USING fts5("
+    "topic, question, options, explanation, display UNINDEXED, outcome UNINDEXED, "
+    "tokenize = 'porter unicode61 remove_diacritics 2')",
+]
+# PostgreSQL: the plain text in a table with a weighted tsvector, a GIN index and the owner's id
+POSTGRESQL_DDL = [
+    "CREATE TABLE IF NOT EXISTS quiz_search ("
+    "rowid BIGINT PRIMARY KEY, user_id BIGINT NOT NULL, topic TEXT, question TEXT, options TEXT, "
+    "explanation TEXT, outcome TEXT, document TSVECTOR GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(question, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(topic, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(options, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(explanation, '')), 'D')) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_quiz_search_document ON quiz_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_quiz_search_user ON quiz_search (user_id)",
+]
+SEARCH_DDL = {"sqlite": SQLITE_DDL, "postgresql": POSTGRESQL_DDL}
+
+# Ranked page of matching rows; highlight() runs for the page only. bm25 weights: topic, question,
+# options, explanation
+SQLITE_SEARCH = """
+SELECT quiz_search.rowid, outcome, display,
+       highlight(quiz_search, CASE WHEN question != '' THEN 1 ELSE 0 END, char(2), char(3)) AS marked
+FROM (
+    SELECT rowid AS id, bm25(quiz_search, 2.0, 4.0, 1.0, 1.0) AS score
+    FROM quiz_search
+    WHERE quiz_search MATCH :match {outcome}
+    ORDER BY score, rowid DESC
+    LIMIT :limit OFFSET :offset
+) AS page
+JOIN quiz_search ON quiz_search.rowid = page.id
+WHERE quiz_search MATCH :match
+ORDER BY page.score, page.id DESC
+"""
+POSTGRESQL_SEARCH = f"""
+SELECT page.rowid, page.outcome,
+       ts_headline('english', CASE WHEN page.question != '' THEN page.question ELSE page.topic END, page.query,
+                   'StartSel={HIGHLIGHT[0]}, StopSel={HIGHLIGHT[1]}, MaxWords={SEARCH_SNIPPET_WORDS}, MinWords=6')
+       AS snippet
+FROM (
+    SELECT rowid, outcome, question, topic, query, ts_rank_cd(document, query) AS rank
+    FROM quiz_search, plainto_tsquery('english', :terms) AS query
+    WHERE user_id = :user_id AND document @@ query {{outcome}}
+    ORDER BY rank DESC, rowid DESC
+    LIMIT :limit OFFSET :offset
+) AS page
+ORDER BY page.rank DESC, page.rowid DESC
+"""
+
+INSERT_ROWS = {
+    "sqlite": text(
+        "INSERT INTO quiz_search (rowid, topic, question, options, explanation, display, outcome) "
+        "VALUES (:rowid, :topic, :question, :options, :explanation, :display, :outcome)"
+    ),
+    "postgresql": text(
+        "INSERT INTO quiz_search (rowid, user_id, topic, question, options, explanation, outcome) "
+        "VALUES (:rowid, :user_id, :topic, :question, :options, :explanation, :outcome)"
+    ),
+}
+DELETE_ROWS = text("DELETE FROM quiz_search WHERE rowid >= :first AND rowid < :last")
+
+
+def search_supported(bind) -> bool:
+    return bind.dialect.name in SEARCH_DDL
+
+
+def create_search_table(bind):
+    """Create the quiz_search index on `bind` (SQLite FTS5 or PostgreSQL); other databases have no search."""
+    if not search_supported(bind):
+        print(f"Full-text search is not available on {bind.dialect.name}")
+        return
+    with bind.begin() as conn:
+        for statement in SEARCH_DDL[bind.dialect.name]:
+            conn.exec_driver_sql(statement)
+
+
+def search_terms(query: str) -> List[str]:
+    """Words of a free-text query; FTS operators and punctuation are dropped."""
+    return _words(query)[:SEARCH_MAX_TERMS]
+
+
+def _words(value: str) -> List[str]:
+    return _WORD.findall(unicodedata.normalize("NFKC", value or "").casefold())
+
+
+def _user_words(value: str, user_id: int) -> str:
+    return " ".join(f"u{user_id}x{word}" for word in _words(value))
+
+
+def question_outcome(question: Dict[str, Any], selected) -> Optional[str]:
+    if selected is None:
+        return None
+    if isinstance(selected, str):
+        selected = [selected]
+    correct = {str(answer).strip() for answer in question.get("answers") or []}
+    return "correct" if {str(answer).strip() for answer in selected} == correct else "wrong"
+
+
+def search_rows(attempt_id: int, user_id: int, topic: str, questions=None, user_answers=None,
+                answer_rows: Iterable[Any] = (), completed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Index rows for one attempt. Per-question results come from
+    `answer_rows` (question_answers) when there are any; otherwise from
+    questions_data and, once the quiz is completed, its user_answers.
+    """
+    base = attempt_id * ROWS_PER_ATTEMPT
+    questions = [q if isinstance(q, dict) else {} for q in questions or []]
+    user_answers = user_answers or {}
+    entries = {}
+    for index, question in enumerate(questions):
+        entries[index] = {
+            "question": question.get("question") or "",
+            "options": "\n".join(str(option) for option in question.get("options") or []),
+            "explanation": question.get("explanation") or "",
+            "outcome": question_outcome(question, user_answers.get(str(index))) if completed else None,
+        }
+    for answer in answer_rows:
+        entry = entries.setdefault(answer.question_index, {"options": ""})
+        entry.update(question=answer.question_text, explanation=answer.explanation or entry.get("explanation") or "",
+                     outcome=None if answer.user_answer is None else ("correct" if answer.is_correct else "wrong"))
+
+    rows = [
+        {"rowid": base + index + 1, "user_id": user_id, "topic": topic or "", **entry}
+        for index, entry in sorted(entries.items()) if 0 <= index < ROWS_PER_ATTEMPT - 1
+    ]
+    if not rows:
+        rows = [{"rowid": base, "user_id": user_id, "topic": topic or "", "question": "", "options": "",
+                 "explanation": "", "outcome": None}]
+    return rows
+
+
+def insert_search_rows(db: Session, rows: List[Dict[str, Any]]):
+    """Write rows from search_rows() in the caller's transaction."""
+    dialect = db.get_bind().dialect.name
+    if not rows or dialect not in SEARCH_DDL:
+        return
+    if dialect == "sqlite":
+        rows = [{
+            **{column: _user_words(row[column], row["user_id"]) for column in ("topic", "question", "options", "explanation")},
+            "rowid": row["rowid"], "display": row["question"] or row["topic"], "outcome": row["outcome"],
+        } for row in rows]
+    db.execute(INSERT_ROWS[dialect], rows)
+
+
+@traced("search.index_attempt")
+def index_attempt(db: Session, attempt: QuizAttempt, questions=None, user_answers=None,
+                  answer_rows: Iterable[Any] = (), replace: bool = True):
+    """
+    (Re)index an attempt in the caller's transaction, so the index commits
+    with the save. `replace=False` skips the delete for a just-created attempt.
+    """
+    if not search_supported(db.get_bind()):
+        return
+    if replace:
+        remove_attempts(db, [attempt.id])
+    insert_search_rows(db, search_rows(
+        attempt.id, attempt.user_id, attempt.topic, questions, user_answers, answer_rows,
+        completed=attempt.status == "completed"
+    ))
+
+
+def remove_attempts(db: Session, attempt_ids: Iterable[int]):
+    """Drop the index rows of `attempt_ids` in the caller's transaction."""
+    ranges = [{"first": attempt_id * ROWS_PER_ATTEMPT, "last": (attempt_id + 1) * ROWS_PER_ATTEMPT}
+              for attempt_id in attempt_ids]
+    if ranges and search_supported(db.get_bind()):
+        db.execute(DELETE_ROWS, ranges)
+
+
+def _snippet(display: str, marked: str) -> str:
+    """
+    Cut `display` around its first matched word and wrap the matched words in
+    HIGHLIGHT. `marked` is the indexed column from highlight(): the same
+    words, one indexed term each, with char(2)/char(3) around the matches.
+    """
+    words = list(_WORD.finditer(display or ""))
+    hits, inside = set(), False
+    for position, term in enumerate((marked or "").split(" ")):
+        inside = inside or "\x02" in term
+        if inside:
+            hits.add(position)
+        if "\x03" in term:
+            inside = False
+    if not words:
+        return display or ""
+
+    first = min(hits) if hits else 0
+    start = max(0, min(first - SEARCH_SNIPPET_WORDS // 4, len(words) - SEARCH_SNIPPET_WORDS))
+    end = min(len(words), start + SEARCH_SNIPPET_WORDS)
+    parts = ["…" if start else display[:words[0].start()]]
+    for position in range(start, end):
+        word = words[position]
+        parts.append(f"{HIGHLIGHT[0]}{word.group()}{HIGHLIGHT[1]}" if position in hits else word.group())
+        parts.append(display[word.end():words[position + 1].start()] if position + 1 < end else "")
+    parts.append("…" if end < len(words) else display[words[-1].end():])
+    return "".join(parts)
+
+
+def search_attempts(db: Session, user_id: int, query: str, outcome: Optional[str] = None,
+                    limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    One user's questions (and question-less attempts) matching every word
+    of `query`, best match first, with a highlighted snippet of the question
+    (or the topic) and the attempt it belongs to.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    params = {"user_id": user_id, "limit": limit, "offset": offset, "outcome": outcome}
+    outcome_filter = "AND outcome = :outcome" if outcome else ""
+    if db.get_bind().dialect.name == "sqlite":
+        params["match"] = " ".join(f'"u{user_id}x{term}"' for term in terms)
+        hits = [(hit.rowid, hit.outcome, _snippet(hit.display, hit.marked))
+                for hit in db.execute(text(SQLITE_SEARCH.format(outcome=outcome_filter)), params)]
+    else:
+        params["terms"] = " ".join(terms)
+        hits = [(hit.rowid, hit.outcome, hit.snippet)
+                for hit in db.execute(text(POSTGRESQL_SEARCH.format(outcome=outcome_filter)), params)]
+    if not hits:
+        return []
+
+    attempts = {row.id: row for row in db.execute(
+        select(QuizAttempt.id, QuizAttempt.topic, QuizAttempt.difficulty, QuizAttempt.status,
+               QuizAttempt.percentage, QuizAttempt.started_at, QuizAttempt.completed_at)
+        .where(QuizAttempt.id.in_({rowid // ROWS_PER_ATTEMPT for rowid, _, _ in hits}),
+               QuizAttempt.user_id == user_id)
+    )}
+    results = []
+    for rowid, hit_outcome, snippet in hits:
+        attempt = attempts.get(rowid // ROWS_PER_ATTEMPT)
+        if attempt is None:
+            continue
+        position = rowid % ROWS_PER_ATTEMPT
+        results.append({
+            "quiz_id": attempt.id,
+            "question_index": position - 1 if position else None,
+            "snippet": snippet,
+            "outcome": hit_outcome,
+            "topic": attempt.topic,
+            "difficulty": attempt.difficulty,
+            "status": attempt.status,
+            "percentage": round(attempt.percentage or 0, 2),
+            "started_at": attempt.started_at.isoformat() if attempt.started_at else None,
+            "completed_at": attempt.completed_at.isoformat() if attempt.completed_at else None,
+        })
+    return results
+
+
+def backfill_search_index(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Index every ongoing and completed attempt, one committed chunk of ids at
+    a time; each chunk replaces the rows of its id range, so searches keep
+    working while it runs. Returns attempts indexed.
+    """
+    if not search_supported(db.get_bind()):
+        return 0
+    indexed = 0
+    last_id = 0
+    while True:
+        attempts = db.execute(
+            select(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.topic, QuizAttempt.status,
+                   QuizAttempt.questions_data, QuizAttempt.user_answers)
+            .where(QuizAttempt.id > last_id)
+            .order_by(QuizAttempt.id).limit(chunk_size)
+        ).all()
+        if not attempts:
+            return indexed
+        answers = {}
+        for answer in db.execute(
+            select(QuestionAnswer.quiz_attempt_id, QuestionAnswer.question_index, QuestionAnswer.question_text,
+                   QuestionAnswer.explanation, QuestionAnswer.user_answer, QuestionAnswer.is_correct)
+            .where(QuestionAnswer.quiz_attempt_id.in_([attempt.id for attempt in attempts]))
+        ):
+            answers.setdefault(answer.quiz_attempt_id, []).append(answer)
+
+        db.execute(DELETE_ROWS, {"first": (last_id + 1) * ROWS_PER_ATTEMPT,
+                                 "last": (attempts[-1].id + 1) * ROWS_PER_ATTEMPT})
+        rows = []
+        for attempt in attempts:
+            if attempt.status == "abandoned":
+                continue
+            rows.extend(search_rows(attempt.id, attempt.user_id, attempt.topic, attempt.questions_data,
+                                    attempt.user_answers, answers.get(attempt.id, ()),
+                                    completed=attempt.status == "completed"))
+            indexed += 1
+        insert_search_rows(db, rows)
+        db.commit()
+        last_id = attempts[-1].id
@@ -0,0 +1,379 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, literal, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from auth_utils import verify_token
+from database import SessionLocal, create_tables, engine, make_engine, on_commit, profile_engine
+from models import (QuestionAnswer, QuizAttempt, ReviewItem, TenantShard, Topic, User, UserDailyProgress,
+                    UserPreference)
+from utils.metrics import registry
+from utils.search import insert_search_rows, remove_attempts, search_rows, search_supported
+from utils.topics import resolve_topic_id
+
+load_dotenv()
+
+# Number of databases tenants are spread over; shard 0 is DATABASE_URL, 1 disables sharding
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+SHARD_URL_TEMPLATE = os.getenv("SHARD_URL_TEMPLATE", "sqlite:///./app_shard{n}.db")
+# Seconds a process keeps a tenant's directory entry; moves wait this long before copying
+SHARD_DIRECTORY_TTL = float(os.getenv("SHARD_DIRECTORY_TTL", "5"))
+# Shard n hands out user and quiz ids from n * SHARD_ID_SPACING, so ids stay unique across shards
+SHARD_ID_SPACING = 1 << 40
+
+# Rows owned by a tenant, in the order they are copied; topics are shared but copied on first use
+TENANT_TABLES = [User.__table__, UserPreference.__table__, QuizAttempt.__table__, QuestionAnswer.__table__,
+                 UserDailyProgress.__table__, ReviewItem.__table__]
+SHARD_TABLES = [Topic.__table__] + TENANT_TABLES
+
+shard_sessions_total = registry.counter(
+    "shard_sessions_total", "Tenant database sessions opened per shard", ("shard",))
+
+
+class ShardRouter:
+    """
+    Maps each tenant (a username) to one of `count` databases.
+
+    The directory (`tenant_shards`) and every table that is not per tenant
+    (topics, jobs, the LLM ledger, rollups) stay in the main database, which
+    is also shard 0, so tenants registered before sharding was turned on need
+    no migration. Directory entries are cached per process for `ttl` seconds.
+    Canonical topics are created in the main database and copied to a shard
+    the first time one of its tenants uses them, so joins stay local.
+    """
+
+    def __init__(self, count: int = SHARD_COUNT, url_template: str = SHARD_URL_TEMPLATE,
+                 ttl: float = SHARD_DIRECTORY_TTL):
+        self.count = count
+        self.ttl = ttl
+        self.engines = [engine] + [make_engine(url_template.format(n=n)) for n in range(1, count)]
+        self.sessionmakers = [SessionLocal] + [
+            sessionmaker(autocommit=False, autoflush=False, bind=shard_engine, info={"shard": n})
+            for n, shard_engine in enumerate(self.engines[1:], start=1)
+        ]
+        for shard_engine in self.engines[1:]:
+            profile_engine(shard_engine)
+        self._directory: Dict[str, Tuple[int, str, float]] = {}  # tenant -> (shard, status, expires)
+        self._topics = set()  # (shard, topic id) already copied
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def create_tables(self):
+        """Create the tenant tables on every shard, reserve their id ranges and fill in the directory."""
+        if not self.enabled:
+            return
+        for n, shard_engine in enumerate(self.engines[1:], start=1):
+            create_tables(shard_engine, SHARD_TABLES)
+            self._reserve_ids(shard_engine, n * SHARD_ID_SPACING)
+        # Tenants from before sharding live in the main database; list them so names and emails stay unique
+        with engine.begin() as conn:
+            listed = select(TenantShard.tenant)
+            conn.execute(insert(TenantShard).from_select(
+                ["tenant", "email", "shard", "status", "created_at"],
+                select(User.username, User.email, literal(0), literal("active"), literal(datetime.utcnow()))
+                .where(User.username.not_in(listed))
+            ))
+
+    def _reserve_ids(self, shard_engine, start: int):
+        with shard_engine.begin() as conn:
+            for table in ("users", "quiz_attempts"):
+                if shard_engine.dialect.name == "sqlite":
+                    updated = conn.execute(text(
+                        "UPDATE sqlite_sequence SET seq = :start WHERE name = :table AND seq < :start"
+                    ), {"start": start, "table": table}).rowcount
+                    exists = conn.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = :table"),
+                                          {"table": table}).first()
+                    if not updated and not exists:
+                        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :start)"),
+                                     {"start": start, "table": table})
+                elif shard_engine.dialect.name == "postgresql":
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"GREATEST(:start, (SELECT COALESCE(MAX(id), 0) FROM {table})))"
+                    ), {"start": start})
+                else:
+                    print(f"Cannot reserve id ranges on {shard_engine.dialect.name}; ids may repeat across shards")
+
+    def shard_for(self, tenant: str) -> int:
+        """Shard holding `tenant`'s rows. Raises 503 while the tenant is being moved."""
+        if not self.enabled:
+            return 0
+        now = time.monotonic()
+        entry = self._directory.get(tenant)
+        if entry is None or entry[2] < now:
+            db = SessionLocal()
+            try:
+                row = db.query(TenantShard.shard, TenantShard.status).filter(TenantShard.tenant == tenant).first()
+            finally:
+                db.close()
+            # Unknown tenants were registered before sharding (or do not exist): main database
+            entry = (row.shard, row.status, now + self.ttl) if row else (0, "active", now + self.ttl)
+            self._directory[tenant] = entry
+        if entry[1] == "moving":
+            raise HTTPException(status_code=503, detail="Account is being moved, try again shortly",
+                                headers={"Retry-After": str(max(1, int(self.ttl)))})
+        return entry[0]
+
+    def session(self, tenant: str) -> Session:
+        shard = self.shard_for(tenant)
+        shard_sessions_total.inc((str(shard),))
+        return self.sessionmakers[shard]()
+
+    @contextmanager
+    def tenant_session(self, tenant: str):
+        db = self.session(tenant)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def claim(self, tenant: str, email: str) -> int:
+        """Reserve `tenant` and `email` in the directory on the shard with the fewest tenants."""
+        if not self.enabled:
+            return 0
+        db = SessionLocal()
+        try:
+            existing = db.query(TenantShard.tenant).filter(
+                (TenantShard.tenant == tenant) | (TenantShard.email == email)
+            ).first()
+            if existing:
+                detail = "Username already registered" if existing.tenant == tenant else "Email already registered"
+                raise HTTPException(status_code=400, detail=detail)
+            tenants = dict(db.query(TenantShard.shard, func.count(TenantShard.id)).group_by(TenantShard.shard).all())
+            shard = min(range(self.count), key=lambda n: (tenants.get(n, 0), n))
+            db.add(TenantShard(tenant=tenant, email=email, shard=shard))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise HTTPException(status_code=400, detail="Username or email already registered")
+        finally:
+            db.close()
+        self._directory[tenant] = (shard, "active", time.monotonic() + self.ttl)
+        return shard
+
+    def release(self, tenant: str):
+        """Drop a claim whose user row was never written."""
+        if not self.enabled:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(delete(TenantShard).where(TenantShard.tenant == tenant))
+            db.commit()
+        finally:
+            db.close()
+        self._directory.pop(tenant, None)
+
+    def change_email(self, tenant: str, email: str):
+        """Move `tenant`'s directory email; 400 if another tenant has it."""
+        if not self.enabled:
+            return
+        db = SessionLocal()
+        try:
+            taken = db.query(TenantShard.id).filter(TenantShard.email == email, TenantShard.tenant != tenant).first()
+            if taken:
+                raise HTTPException(status_code=400, detail="Email already registered")
+            db.execute(update(TenantShard).where(TenantShard.tenant == tenant).values(email=email))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                raise HTTPException(status_code=400, detail="Email already registered")
+        finally:
+            db.close()
+
+    def resolve_topic_id(self, db: Session, topic: str) -> Optional[int]:
+        """resolve_topic_id for a tenant session: the topic is shared, and copied to the shard if needed."""
+        shard = db.info.get("shard", 0)
+        if shard == 0:
+            return resolve_topic_id(db, topic)
+        shared = SessionLocal()
+        try:
+            topic_id = resolve_topic_id(shared, topic)
+            shared.commit()
+            if topic_id is not None:
+                # The copy joins the tenant session's transaction; the caller commits it
+                self._copy_topics(shared, db, shard, [topic_id])
+            return topic_id
+        finally:
+            shared.close()
+
+    def _copy_topics(self, shared: Session, db: Session, shard: int, topic_ids: List[int]):
+        missing = [topic_id for topic_id in topic_ids if (shard, topic_id) not in self._topics]
+        if not missing or shard == 0:
+            return
+        for row in shared.query(Topic).filter(Topic.id.in_(missing)).all():
+            db.merge(Topic(id=row.id, name=row.name, normalized_key=row.normalized_key, created_at=row.created_at))
+        db.flush()
+
+        def copied():
+            with self._lock:
+                self._topics.update((shard, topic_id) for topic_id in missing)
+        on_commit(db, copied)
+
+    def move_tenant(self, tenant: str, target: int, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Copy `tenant`'s rows to shard `target`, repoint the directory and
+        delete the originals. The tenant is marked as moving first and
+        requests for it get 503 until the move is done; this waits one
+        directory TTL so every process has seen the mark. User and quiz ids
+        are reassigned from the target's id range.
+        """
+        if not 0 <= target < self.count:
+            raise ValueError(f"shard {target} does not exist (SHARD_COUNT={self.count})")
+        shared = SessionLocal()
+        try:
+            entry = shared.query(TenantShard).filter(TenantShard.tenant == tenant).first()
+            if entry is None:
+                raise ValueError(f"tenant {tenant!r} is not in the directory")
+            source = entry.shard
+            if source == target:
+                return {}
+            entry.status = "moving"
+            shared.commit()
+            self._directory.pop(tenant, None)
+            time.sleep(self.ttl)
+
+            try:
+                counts = self._copy_tenant(tenant, source, target, shared, batch_size)
+            except Exception:
+                entry.status = "active"
+                shared.commit()
+                raise
+            entry.shard = target
+            entry.status = "active"
+            shared.commit()
+        finally:
+            shared.close()
+
+        self._delete_tenant(tenant, source)
+        self._directory.pop(tenant, None)
+        return counts
+
+    def _copy_tenant(self, tenant: str, source: int, target: int, shared: Session, batch_size: int) -> Dict[str, int]:
+        users, preferences, attempts, answers, progress, reviews = TENANT_TABLES
+        counts = {table.name: 0 for table in TENANT_TABLES}
+
+        def without_id(row, **changes):
+            return {**{key: value for key, value in row.items() if key != "id"}, **changes}
+
+        src = self.sessionmakers[source]()
+        dst = self.sessionmakers[target]()
+        try:
+            user = src.execute(select(users).where(users.c.username == tenant)).mappings().first()
+            if user is None:
+                return counts
+            user_id = dst.execute(insert(users).values(without_id(user))).inserted_primary_key[0]
+            counts["users"] = 1
+
+            for table in (preferences, progress, reviews):
+                rows = src.execute(select(table).where(table.c.user_id == user["id"])).mappings().all()
+                if rows:
+                    dst.execute(insert(table), [without_id(row, user_id=user_id) for row in rows])
+                    counts[table.name] += len(rows)
+
+            topic_ids = set()
+            last_id = 0
+            while True:
+                rows = src.execute(
+                    select(attempts).where(attempts.c.user_id == user["id"], attempts.c.id > last_id)
+                    .order_by(attempts.c.id).limit(batch_size)
+                ).mappings().all()
+                if not rows:
+                    break
+                last_id = rows[-1]["id"]
+                new_ids = dst.execute(
+                    insert(attempts).returning(attempts.c.id, sort_by_parameter_order=True),
+                    [without_id(row, user_id=user_id) for row in rows]
+                ).scalars().all()
+                new_id = dict(zip((row["id"] for row in rows), new_ids))
+                counts["quiz_attempts"] += len(rows)
+                topic_ids.update(row["topic_id"] for row in rows if row["topic_id"])
+
+                answer_rows = src.execute(
+                    select(answers).where(answers.c.quiz_attempt_id.in_(list(new_id)))
+                ).all()
+                if answer_rows:
+                    dst.execute(insert(answers), [
+                        without_id(row._mapping, quiz_attempt_id=new_id[row.quiz_attempt_id]) for row in answer_rows
+                    ])
+                    counts["question_answers"] += len(answer_rows)
+
+                if search_supported(dst.get_bind()):
+                    answered = {}
+                    for row in answer_rows:
+                        answered.setdefault(row.quiz_attempt_id, []).append(row)
+                    search = [entry for row in rows if row["status"] != "abandoned" for entry in search_rows(
+                        new_id[row["id"]], user_id, row["topic"], row["questions_data"], row["user_answers"],
+                        answered.get(row["id"], ()), completed=row["status"] == "completed"
+                    )]
+                    insert_search_rows(dst, search)
+
+            self._copy_topics(shared, dst, target, sorted(topic_ids))
+            dst.commit()
+            return counts
+        except Exception:
+            dst.rollback()
+            raise
+        finally:
+            src.close()
+            dst.close()
+
+    def _delete_tenant(self, tenant: str, shard: int):
+        users, preferences, attempts, answers, progress, reviews = TENANT_TABLES
+        db = self.sessionmakers[shard]()
+        try:
+            user_id = db.execute(select(users.c.id).where(users.c.username == tenant)).scalar()
+            if user_id is None:
+                return
+            owned = select(attempts.c.id).where(attempts.c.user_id == user_id)
+            remove_attempts(db, db.execute(owned).scalars().all())
+            db.execute(delete(answers).where(answers.c.quiz_attempt_id.in_(owned)))
+            for table in (attempts, progress, reviews, preferences):
+                db.execute(delete(table).where(table.c.user_id == user_id))
+            db.execute(delete(users).where(users.c.id == user_id))
+            db.commit()
+        finally:
+            db.close()
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Tenants and rows per shard."""
+        shared = SessionLocal()
+        try:
+            tenants = dict(shared.query(TenantShard.shard, func.count(TenantShard.id)).group_by(TenantShard.shard).all())
+        finally:
+            shared.close()
+        shards = []
+        for n, shard_engine in enumerate(self.engines):
+            with shard_engine.connect() as conn:
+                shards.append({
+                    "shard": n,
+                    "url": shard_engine.url.render_as_string(hide_password=True),
+                    "tenants": tenants.get(n, 0),
+                    "users": conn.execute(select(func.count()).select_from(User.__table__)).scalar(),
+                    "quiz_attempts": conn.execute(select(func.count()).select_from(QuizAttempt.__table__)).scalar(),
+                })
+        return shards
+
+
+shard_router = ShardRouter()
+
+
+def get_tenant_db(token: str):
+    """Session on the shard of the token's user (the main database when not sharded)"""
+    db = shard_router.session(verify_token(token))
+    try:
+        yield db
+    finally:
+        db.close()
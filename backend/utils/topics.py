@@ -0,0 +1,240 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import on_commit
+from models import Topic, QuizAttempt
+from utils.metrics import record_cache_lookup
+
+load_dotenv()
+
+# Minimum Dice coefficient over trigrams for a new topic to be folded into an existing one
+TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.75"))
+
+STOP_WORDS = frozenset({
+    "a", "an", "the", "of", "and", "or", "in", "on", "for", "to", "with", "about",
+    "by", "from", "at", "into", "its", "is", "are", "&",
+})
+
+_NON_WORD = re.compile(r"[^\w&+#]+")  # keep c++, c#, r&b style tokens together
+_ROMAN_NUMERAL = re.compile(r"^(i{1,3}|iv|vi{0,3}|ix|x)$")
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Canonical key for a free-text topic.
+
+    Unicode-normalises and case-folds the text, drops punctuation and stop
+    words, and sorts the remaining words, so "Python Basics ", "python
+    basics" and "basics of python" all map to "basics python".
+    """
+    text = unicodedata.normalize("NFKC", topic or "").casefold()
+    words = [w for w in _NON_WORD.split(text) if w and w not in STOP_WORDS]
+    if not words:
+        # Topic made only of stop words/punctuation: keep its plain words
+        words = [w for w in _NON_WORD.split(text) if w]
+    return " ".join(sorted(set(words)))
+
+
+def trigrams(key: str) -> Set[str]:
+    """Word-padded character trigrams (same scheme as PostgreSQL pg_trgm)."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def numbered_tokens(key: str) -> frozenset:
+    """Tokens that must match exactly for two topics to be similar ("python 2" vs "python 3")."""
+    return frozenset(w for w in key.split() if any(c.isdigit() for c in w) or _ROMAN_NUMERAL.match(w))
+
+
+class TopicIndex:
+    """
+    In-memory trigram index over canonical topic keys.
+
+    Exact keys resolve with one dict lookup. Otherwise candidates come from an
+    inverted index (trigram -> topic ids) and are scored with the Dice
+    coefficient. Any topic reaching the threshold must share at least one of
+    the query's rarest trigrams (prefix filtering), so only those postings
+    are scanned and common trigrams like "  p" never are; this keeps lookups
+    fast with 100k+ topics. Numbers and roman numerals never fuzzy
+    match, so "world war 1" and "world war 2" stay separate topics.
+    """
+
+    def __init__(self, threshold: float = TOPIC_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self._by_key: Dict[str, int] = {}
+        self._grams: Dict[int, frozenset] = {}  # topic id -> trigrams
+        self._numbered: Dict[int, frozenset] = {}  # topic id -> numbered tokens, only when non-empty
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._by_key)
+
+    def add(self, topic_id: int, key: str):
+        with self._lock:
+            self._add(topic_id, key)
+
+    def _add(self, topic_id: int, key: str):
+        if key in self._by_key:
+            return
+        grams = frozenset(trigrams(key))
+        self._by_key[key] = topic_id
+        self._grams[topic_id] = grams
+        numbered = numbered_tokens(key)
+        if numbered:
+            self._numbered[topic_id] = numbered
+        for gram in grams:
+            self._postings[gram].append(topic_id)
+
+    def load(self, db: Session):
+        """Load all stored topics once per process."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for topic_id, key in db.query(Topic.id, Topic.normalized_key).yield_per(10_000):
+                self._add(topic_id, key)
+            self._loaded = True
+
+    def lookup(self, key: str) -> Optional[Tuple[int, float]]:
+        """Best matching topic id and its similarity, or None below the threshold."""
+        topic_id = self._by_key.get(key)
+        if topic_id is not None:
+            return topic_id, 1.0
+
+        grams = trigrams(key)
+        if not grams:
+            return None
+
+        # Dice >= t requires the candidate size to lie within these bounds,
+        # and at least `min_common` shared trigrams
+        n = len(grams)
+        numbered = numbered_tokens(key)
+        min_size = n * self.threshold / (2 - self.threshold)
+        max_size = n * (2 - self.threshold) / self.threshold
+        min_common = math.ceil(self.threshold * (n + min_size) / 2)
+
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))
+        candidates: Set[int] = set()
+        for gram in rarest[:max(n - min_common + 1, 1)]:
+            candidates.update(self._postings.get(gram, ()))
+
+        best = None
+        for candidate in candidates:
+            candidate_grams = self._grams[candidate]
+            size = len(candidate_grams)
+            if size < min_size or size > max_size:
+                continue
+            if self._numbered.get(candidate, frozenset()) != numbered:
+                continue
+            score = 2 * len(grams & candidate_grams) / (n + size)
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+
+topic_index = TopicIndex()
+
+
+def resolve_topic_id(db: Session, topic: str) -> Optional[int]:
+    """
+    Canonical topic id for a user-entered topic, creating the topic if no
+    existing one is similar enough. A new topic is inserted within the
+    caller's transaction, which is neither committed nor rolled back here.
+    Topics found or created this way join the in-memory index only once
+    that transaction commits, so the index never refers to a rolled-back row.
+    """
+    key = normalize_topic(topic)
+    if not key:
+        return None
+
+    topic_index.load(db)
+    match = topic_index.lookup(key)
+    record_cache_lookup("topic_index", match is not None)
+    if match is not None:
+        return match[0]
+
+    # Another worker may have created it since this process loaded the index
+    # (or this transaction did, before committing)
+    existing = db.query(Topic.id).filter(Topic.normalized_key == key).first()
+    if existing:
+        # The row may be this transaction's own insert, so index it only once committed
+        on_commit(db, lambda: topic_index.add(existing.id, key))
+        return existing.id
+
+    name = " ".join(topic.split())
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        # A conflict leaves the caller's transaction usable, so no savepoint is needed
+        topic_id = db.execute(
+            insert(Topic).values(name=name, normalized_key=key)
+            .on_conflict_do_nothing(index_elements=["normalized_key"]).returning(Topic.id)
+        ).scalar()
+    else:
+        try:
+            with db.begin_nested():
+                new_topic = Topic(name=name, normalized_key=key)
+                db.add(new_topic)
+                db.flush()
+                topic_id = new_topic.id
+        except IntegrityError:
+            topic_id = None
+    if topic_id is None:
+        # Lost a race with another worker creating the same topic
+        topic_id = db.query(Topic.id).filter(Topic.normalized_key == key).scalar()
+        topic_index.add(topic_id, key)
+        return topic_id
+    on_commit(db, lambda: topic_index.add(topic_id, key))
+    return topic_id
+
+
+def backfill_topic_ids(db: Session, batch_size: int = 500) -> int:
+    """Assign canonical topics to attempts saved before topic ids existed. Returns rows updated."""
+    updated = 0
+    last_id = 0
+    cache: Dict[str, Optional[int]] = {}
+    while True:
+        rows = db.query(QuizAttempt.id, QuizAttempt.topic).filter(
+            QuizAttempt.topic_id.is_(None),
+            QuizAttempt.id > last_id
+        ).order_by(QuizAttempt.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+
+        mappings = []
+        for attempt_id, topic in rows:
+            if topic not in cache:
+                cache[topic] = resolve_topic_id(db, topic)
+            if cache[topic] is not None:
+                mappings.append({"attempt_id": attempt_id, "new_topic_id": cache[topic]})
+
+        # Plain executemany on the table: this is not a state change, so `version` is left alone
+        if mappings:
+            table = QuizAttempt.__table__
+            db.execute(
+                update(table).where(table.c.id == bindparam("attempt_id")).values(topic_id=bindparam("new_topic_id")),
+                mappings
+            )
+        db.commit()
+        updated += len(mappings)
@@ -0,0 +1,497 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi.routing import APIRoute
+
+from utils.metrics import registry
+
+load_dotenv()
+
+# Fraction of requests and jobs traced from the start (0 disables head sampling)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# Unsampled traces are recorded anyway and kept if they take at least this long (0 disables)
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "0"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")  # JSON lines, one span per line; empty disables
+# OTLP/HTTP collector base URL, e.g. http://localhost:4318 (spans go to /v1/traces as OTLP JSON)
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT") or None
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "quizmind-api")
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "2.0"))  # seconds
+TRACE_MAX_BUFFER = int(os.getenv("TRACE_MAX_BUFFER", "10000"))  # traces waiting for export
+
+TRACING_ENABLED = TRACE_SAMPLE_RATE > 0 or TRACE_SLOW_MS > 0
+STATEMENT_CHARS = 300
+
+traces_total = registry.counter(
+    "traces_total", "Finished traces by what happened to them", ("decision",))
+
+
+class Trace:
+    """Spans of one request or job; exported once its root span ends."""
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans: List["Span"] = []  # finished spans; appended from the event loop and threadpool alike
+
+
+class Span:
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def fail(self, error: BaseException):
+        self.status = "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+        self.error = f"{type(error).__name__}: {error}"[:500]
+
+    def finish(self):
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+            self.trace.spans.append(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def _activate(new: Span):
+    token = _current_span.set(new)
+    try:
+        yield new
+    except BaseException as e:
+        new.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        new.finish()
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Child span of the current one, for sync and async code alike (asyncio
+    tasks and threadpool calls inherit it). Yields None outside a trace,
+    so untraced requests pay one context variable lookup.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(Span(parent.trace, name, parent.span_id, attributes)) as child:
+        yield child
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any):
+    """
+    Root span of a new trace (a request or a job), or a child span when a
+    trace is already active. Whether it is recorded is decided here:
+    sampled with TRACE_SAMPLE_RATE, otherwise recorded only if TRACE_SLOW_MS
+    is set, and then kept only if the root turns out slow.
+    """
+    if _current_span.get() is not None:
+        with span(name, **attributes) as child:
+            yield child
+        return
+    sampled = tracer.sample_rate > 0 and random.random() < tracer.sample_rate
+    if not sampled and tracer.slow_ms <= 0:
+        yield None
+        return
+    trace = Trace(sampled)
+    root = Span(trace, name, None, attributes)
+    try:
+        with _activate(root):
+            yield root
+    finally:
+        tracer.submit(trace, root)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running a sync or async function in a span named after it."""
+    def decorate(fn: Callable):
+        operation = name or fn.__qualname__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(operation):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(operation):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class JsonLinesExporter:
+    """Appends spans to a local file, one JSON object per line (see trace_report.py)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Dict[str, Any]]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(s, separators=(",", ":"), default=str) + "\n" for s in spans)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter:
+    """Posts spans to an OpenTelemetry collector as OTLP/HTTP JSON; needs no OpenTelemetry packages."""
+
+    STATUS_CODES = {"ok": 1, "error": 2, "cancelled": 2}
+
+    def __init__(self, endpoint: str, service_name: str = TRACE_SERVICE_NAME, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def payload(self, spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "quizmind.tracing"},
+                "spans": [
+                    {
+                        "traceId": s["trace_id"],
+                        "spanId": s["span_id"],
+                        **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                        "name": s["name"],
+                        "kind": 2 if s["parent_id"] is None else 1,  # SERVER for roots, INTERNAL below
+                        "startTimeUnixNano": str(int(s["start"] * 1e9)),
+                        "endTimeUnixNano": str(int((s["start"] + s["duration_ms"] / 1000) * 1e9)),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                        "status": {"code": self.STATUS_CODES[s["status"]], **({"message": s["error"]} if s["error"] else {})},
+                    }
+                    for s in spans
+                ],
+            }],
+        }]}
+
+    def export(self, spans: List[Dict[str, Any]]):
+        request = urllib.request.Request(
+            self.url, data=json.dumps(self.payload(spans), default=str).encode(), method="POST",
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class Tracer:
+    """
+    Decides which finished traces to keep and exports them write-behind.
+
+    `submit` only puts the trace on an in-memory queue; a daemon thread
+    hands batches to the exporters (JSON lines file, OTLP collector), so
+    exporting never blocks a request. When the buffer is full, traces are
+    dropped and counted.
+    """
+
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, slow_ms: float = TRACE_SLOW_MS,
+                 exporters: Optional[List[Any]] = None, flush_interval: float = TRACE_FLUSH_INTERVAL,
+                 max_buffer: int = TRACE_MAX_BUFFER):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exporters = exporters if exporters is not None else default_exporters()
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=max_buffer)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.exported = 0
+        self.dropped = 0
+
+    def submit(self, trace: Trace, root: Span):
+        if trace.sampled:
+            decision = "sampled"
+        elif root.duration_ms >= self.slow_ms:
+            decision = "slow"
+        else:
+            traces_total.inc(("discarded",))
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(trace.spans)
+            traces_total.inc((decision,))
+        except queue.Full:
+            self.dropped += 1
+            traces_total.inc(("dropped",))
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="tracer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._export(self._drain(block=True))
+        self._export(self._drain(block=False))
+
+    def _drain(self, block: bool) -> List[Dict[str, Any]]:
+        traces = []
+        if block:
+            try:
+                traces.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                return []
+        while True:
+            try:
+                traces.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [s.to_dict() for spans in traces for s in sorted(spans, key=lambda s: s.start)]
+
+    def _export(self, spans: List[Dict[str, Any]]):
+        if not spans:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                print(f"Error exporting {len(spans)} spans with {type(exporter).__name__}: {str(e)}")
+        self.exported += len(spans)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the export thread after exporting everything buffered so far."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        thread.join(timeout)
+        self._thread = None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "buffered": self._queue.qsize(),
+            "exported_spans_total": self.exported,
+            "dropped_total": self.dropped,
+        }
+
+
+def default_exporters() -> List[Any]:
+    exporters: List[Any] = []
+    if TRACE_FILE:
+        exporters.append(JsonLinesExporter(TRACE_FILE))
+    if TRACE_OTLP_ENDPOINT:
+        exporters.append(OTLPExporter(TRACE_OTLP_ENDPOINT))
+    return exporters
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware starting a trace per HTTP request. The root span is
+    named by route template, like the request metrics, and sampled requests
+    get an X-Trace-Id response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "")
+        with start_trace(f"{method} {scope.get('path')}", **{"http.method": method,
+                                                             "http.target": scope.get("path")}) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set(**{"http.status_code": message["status"]})
+                    if root.trace.sampled:
+                        headers = list(message.get("headers", []))
+                        headers.append((b"x-trace-id", root.trace.trace_id.encode()))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if getattr(route, "path", None):
+                    root.name = f"{method} {route.path}"
+
+
+class TracedRoute(APIRoute):
+    """
+    Route class whose request handler runs in a span: body parsing, Pydantic
+    validation of the request and the response model, and the endpoint. The
+    handler span's own time, outside the endpoint's child spans, is mostly
+    validation and serialization.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def traced_handler(request):
+            with span("fastapi.handler", route=self.path):
+                return await handler(request)
+
+        return traced_handler
+
+
+# SQLAlchemy: one span per statement, under whatever span issued it
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    statement_span = None
+    if parent is not None:
+        verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "statement"
+        statement_span = Span(parent.trace, f"db.{verb}", parent.span_id, {
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:STATEMENT_CHARS],
+            **({"db.executemany": len(parameters)} if executemany else {}),
+        })
+    # Pushed even outside a trace, so the after/error hooks always pop their own entry
+    conn.info.setdefault("trace_spans", []).append(statement_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statement_span = conn.info["trace_spans"].pop()
+    if statement_span is not None:
+        statement_span.finish()
+
+
+def _handle_error(context):
+    if context.connection is None:
+        return
+    stack = context.connection.info.get("trace_spans")
+    if stack:
+        statement_span = stack.pop()
+        if statement_span is not None:
+            statement_span.fail(context.original_exception)
+            statement_span.finish()
+
+
+def trace_engine(bind):
+    """Record `bind`'s statements as spans of the active trace (no-op unless tracing is enabled)."""
+    if TRACING_ENABLED:
+        from sqlalchemy import event
+
+        event.listen(bind, "before_cursor_execute", _before_cursor_execute)
+        event.listen(bind, "after_cursor_execute", _after_cursor_execute)
+        event.listen(bind, "handle_error", _handle_error)
+
+
+# LangChain: spans for the runnables inside a chain (prompt, model call, output parser)
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # LangChain is only needed for generation
+    BaseCallbackHandler = object
+
+
+class LangChainSpans(BaseCallbackHandler):
+    """Turns LangChain run callbacks into child spans of the span active when the chain was invoked."""
+
+    run_inline = True  # call on the event loop, so timings are not skewed by an executor hop
+
+    def __init__(self, parent: Span):
+        self.parent = parent
+        self.runs: Dict[Any, Span] = {}
+
+    def _start(self, name: str, run_id, parent_run_id, **attributes):
+        parent = self.runs.get(parent_run_id, self.parent)
+        self.runs[run_id] = Span(parent.trace, name, parent.span_id, attributes)
+
+    def _end(self, run_id, error: Optional[BaseException] = None, **attributes):
+        run_span = self.runs.pop(run_id, None)
+        if run_span is not None:
+            run_span.set(**attributes)
+            if error is not None:
+                run_span.fail(error)
+            run_span.finish()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        self._start(f"langchain.{name}", run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start("langchain.model", run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (getattr(response, "llm_output", None) or {}).get("usage_metadata") or {}
+        self._end(run_id, **({"llm.total_tokens": usage["total_tokens"]} if "total_tokens" in usage else {}))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+def langchain_config() -> Optional[Dict[str, Any]]:
+    """Runnable config tracing a chain invocation under the current span, or None outside a trace."""
+    parent = _current_span.get()
+    if parent is None or BaseCallbackHandler is object:
+        return None
+    return {"callbacks": [LangChainSpans(parent)]}
+
+
+registry.gauge_callback(
+    "traces_buffered", "Finished traces waiting to be exported", (),
+    lambda: {(): tracer.metrics()["buffered"]})
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import authService from '../services/authService';
 import './QuestionGenerator.css';
@@ -20,6 +20,12 @@ interface GenerateQuestionsResponse {
   questions: Question[];
 }
 
+// One key per quiz session: lets the backend dedupe repeated creates and completions
+const newQuizSessionKey = (): string =>
+  typeof crypto !== 'undefined' && 'randomUUID' in crypto
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const QuestionGenerator: React.FC = () => {
   const navigate = useNavigate();
   const location = useLocation();
@@ -39,6 +45,26 @@ const QuestionGenerator: React.FC = () => {
   const [elapsedTime, setElapsedTime] = useState<number>(0);
   const [quizId, setQuizId] = useState<number | null>(null);
   const [initialTimeOffset, setInitialTimeOffset] = useState<number>(0);
+  // Refs so the autosave interval and unload handler always see the latest values
+  const quizSessionKeyRef = useRef<string>(newQuizSessionKey());
+  const quizVersionRef = useRef<number | null>(null);
+  // Live session socket; while it is open, answers and navigation are streamed instead of autosaved
+  const sessionSocketRef = useRef<WebSocket | null>(null);
+  const sentAnswersRef = useRef<{ [key: number]: string[] }>({});
+  const quizProgressRef = useRef({ currentQuestion, selectedAnswers });
+  quizProgressRef.current = { currentQuestion, selectedAnswers };
+
+  const getTotalTimeTaken = () => {
+    const currentSessionTime = quizStartTime ? Math.floor((Date.now() - quizStartTime) / 1000) : 0;
+    return initialTimeOffset + currentSessionTime;
+  };
+
+  const sendSessionEvent = (event: object): boolean => {
+    const socket = sessionSocketRef.current;
+    if (!socket || socket.readyState !== WebSocket.OPEN) return false;
+    socket.send(JSON.stringify({ ...event, time_taken: getTotalTimeTaken() }));
+    return true;
+  };
 
   // Check for resume quiz on mount
   useEffect(() => {
@@ -49,12 +75,67 @@ const QuestionGenerator: React.FC = () => {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
-  // Auto-save every 30 seconds
+  // Live session: stream answers, navigation and the timer; the server persists them
+  useEffect(() => {
+    if (!showQuiz || showResults || !questions.length || !quizId) return;
+    const token = authService.getToken();
+    if (!token) return;
+
+    const socket = new WebSocket(`ws://localhost:8000/dashboard/session/${quizId}?token=${token}`);
+    sessionSocketRef.current = socket;
+
+    socket.onopen = () => {
+      // Catch the server up with anything answered before the socket opened
+      const { currentQuestion: index, selectedAnswers: answers } = quizProgressRef.current;
+      sentAnswersRef.current = answers;
+      sendSessionEvent({ type: 'sync', current_question_index: index, user_answers: answers });
+    };
+    socket.onmessage = (message) => {
+      const data = JSON.parse(message.data);
+      if (data.type === 'ready' || data.type === 'saved') {
+        quizVersionRef.current = data.version;
+      } else if (data.type === 'error') {
+        console.error('Quiz session error:', data.detail);
+      }
+    };
+    socket.onclose = () => {
+      if (sessionSocketRef.current === socket) sessionSocketRef.current = null;
+    };
+
+    const tickInterval = setInterval(() => sendSessionEvent({ type: 'tick' }), 10000);
+
+    return () => {
+      clearInterval(tickInterval);
+      sessionSocketRef.current = null;
+      socket.close(); // the server saves the session when the last socket closes
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [showQuiz, showResults, questions.length, quizId, quizStartTime, initialTimeOffset]);
+
+  // Stream each changed answer over the session socket
+  useEffect(() => {
+    Object.entries(selectedAnswers).forEach(([index, selected]) => {
+      const question = Number(index);
+      if (sentAnswersRef.current[question] === selected) return;
+      if (sendSessionEvent({ type: 'answer', question, selected })) {
+        sentAnswersRef.current = { ...sentAnswersRef.current, [question]: selected };
+      }
+    });
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [selectedAnswers]);
+
+  useEffect(() => {
+    sendSessionEvent({ type: 'navigate', question: currentQuestion });
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentQuestion]);
+
+  // Auto-save every 30 seconds, only while the session socket is unavailable
   useEffect(() => {
     if (!showQuiz || showResults || !questions.length || !quizId) return;
 
     console.log('Auto-save timer started');
     const autoSaveInterval = setInterval(() => {
+      if (sessionSocketRef.current?.readyState === WebSocket.OPEN) return;
       console.log('Auto-save triggered');
       saveQuizState();
     }, 30000); // 30 seconds
@@ -97,23 +178,28 @@ const QuestionGenerator: React.FC = () => {
         const token = authService.getToken();
         if (!token) return;
 
-        const currentSessionTime = quizStartTime ? Math.floor((Date.now() - quizStartTime) / 1000) : 0;
-        const totalTimeTaken = initialTimeOffset + currentSessionTime;
-
-        const quizData = {
-          quiz_id: quizId,
-          topic: topic,
-          difficulty: difficulty,
-          total_questions: questions.length,
-          current_question_index: currentQuestion,
-          questions_data: questions,
-          user_answers: selectedAnswers,
-          time_taken: totalTimeTaken
-        };
-
-        // Use sendBeacon for reliable async save on unload
-        const blob = new Blob([JSON.stringify(quizData)], { type: 'application/json' });
-        navigator.sendBeacon(`http://localhost:8000/dashboard/save-state?token=${token}`, blob);
+        // An open session socket is saved by the server when the page closes it
+        if (!sendSessionEvent({ type: 'flush' })) {
+          const currentSessionTime = quizStartTime ? Math.floor((Date.now() - quizStartTime) / 1000) : 0;
+          const totalTimeTaken = initialTimeOffset + currentSessionTime;
+
+          const quizData = {
+            quiz_id: quizId,
+            idempotency_key: quizSessionKeyRef.current,
+            version: quizVersionRef.current,
+            topic: topic,
+            difficulty: difficulty,
+            total_questions: questions.length,
+            current_question_index: currentQuestion,
+            questions_data: questions,
+            user_answers: selectedAnswers,
+            time_taken: totalTimeTaken
+          };
+
+          // Use sendBeacon for reliable async save on unload
+          const blob = new Blob([JSON.stringify(quizData)], { type: 'application/json' });
+          navigator.sendBeacon(`http://localhost:8000/dashboard/save-state?token=${token}`, blob);
+        }
         
         // Show confirmation dialog
         e.preventDefault();
@@ -150,6 +236,8 @@ const QuestionGenerator: React.FC = () => {
         remaining_time: remainingTime
       });
       
+      quizSessionKeyRef.current = newQuizSessionKey();
+      quizVersionRef.current = data.version ?? null;
       setQuizId(data.quiz_id);
       setTopic(data.topic);
       setDifficulty(data.difficulty);
@@ -176,6 +264,7 @@ const QuestionGenerator: React.FC = () => {
 
       const quizData = {
         quiz_id: null,
+        idempotency_key: quizSessionKeyRef.current,
         topic: topic,
         difficulty: difficulty,
         total_questions: questionsData.length,
@@ -194,6 +283,7 @@ const QuestionGenerator: React.FC = () => {
       if (response.ok) {
         const result = await response.json();
         setQuizId(result.quiz_id);
+        quizVersionRef.current = result.version ?? null;
         console.log('Initial quiz saved with ID:', result.quiz_id);
       }
     } catch (error) {
@@ -212,6 +302,8 @@ const QuestionGenerator: React.FC = () => {
 
       const quizData = {
         quiz_id: quizId,
+        idempotency_key: quizSessionKeyRef.current,
+        version: quizVersionRef.current,
         topic: topic,
         difficulty: difficulty,
         total_questions: questions.length,
@@ -231,6 +323,7 @@ const QuestionGenerator: React.FC = () => {
 
       if (response.ok) {
         const result = await response.json();
+        quizVersionRef.current = result.version ?? quizVersionRef.current;
         if (!quizId) {
           setQuizId(result.quiz_id);
           console.log('Quiz ID set:', result.quiz_id);
@@ -260,7 +353,12 @@ const QuestionGenerator: React.FC = () => {
         difficulty,
       };
 
-      const response = await fetch('http://localhost:8000/api/generate-questions', {
+      const token = authService.getToken();
+      const url = token
+        ? `http://localhost:8000/api/generate-questions?token=${token}`
+        : 'http://localhost:8000/api/generate-questions';
+
+      const response = await fetch(url, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -281,6 +379,8 @@ const QuestionGenerator: React.FC = () => {
       setInitialTimeOffset(0); // Reset for fresh quiz
       setElapsedTime(0);
       setQuizId(null); // No quiz ID for fresh quiz
+      quizSessionKeyRef.current = newQuizSessionKey();
+      quizVersionRef.current = null;
       
       // Save initial quiz state immediately
       setTimeout(() => {
@@ -311,7 +411,8 @@ const QuestionGenerator: React.FC = () => {
     // Save quiz progress before closing
     if (showQuiz && !showResults && questions.length > 0) {
       console.log('Closing quiz, saving state...');
-      await saveQuizState();
+      // With a live session, unmounting closes the socket and the server saves it
+      if (!sendSessionEvent({ type: 'flush' })) await saveQuizState();
       console.log('Quiz state saved, navigating to dashboard');
     }
     // Navigate to dashboard
@@ -368,6 +469,7 @@ const QuestionGenerator: React.FC = () => {
         
         const quizData = {
           quiz_id: quizId, // Include quiz_id if resuming
+          idempotency_key: quizSessionKeyRef.current, // Retries don't save the result twice
           subcategory_name: topic,
           category_name: 'General',
           difficulty: difficulty,
@@ -21,9 +21,30 @@ export interface UserResponse {
 export interface TokenResponse {
   access_token: string;
   token_type: string;
+  refresh_token?: string;
+  expires_in?: number;
+}
+
+// Renew the access token this long before it expires
+const REFRESH_MARGIN_MS = 60 * 1000;
+
+function tokenExpiry(token: string): number | null {
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return typeof payload.exp === 'number' ? payload.exp * 1000 : null;
+  } catch {
+    return null;
+  }
 }
 
 class AuthService {
+  private refreshTimer: ReturnType<typeof setTimeout> | null = null;
+  private refreshing: Promise<boolean> | null = null;
+
+  constructor() {
+    this.scheduleRefresh();
+  }
+
   async register(data: RegisterData): Promise<UserResponse> {
     const response = await fetch(`${API_URL}/register`, {
       method: 'POST',
@@ -56,27 +77,105 @@ class AuthService {
     }
 
     const tokenData = await response.json();
-    // Store token in localStorage
-    localStorage.setItem('token', tokenData.access_token);
+    this.storeTokens(tokenData);
     return tokenData;
   }
 
+  private storeTokens(tokenData: TokenResponse): void {
+    // Store tokens in localStorage
+    localStorage.setItem('token', tokenData.access_token);
+    if (tokenData.refresh_token) {
+      localStorage.setItem('refreshToken', tokenData.refresh_token);
+    }
+    this.scheduleRefresh();
+  }
+
+  private scheduleRefresh(): void {
+    if (this.refreshTimer) {
+      clearTimeout(this.refreshTimer);
+      this.refreshTimer = null;
+    }
+    const token = this.getToken();
+    const expiry = token ? tokenExpiry(token) : null;
+    if (!expiry || !localStorage.getItem('refreshToken')) {
+      return;
+    }
+    // A little jitter so several open tabs do not all refresh at once
+    const delay = Math.max(0, expiry - REFRESH_MARGIN_MS - Date.now()) + Math.random() * 5000;
+    this.refreshTimer = setTimeout(() => this.refresh(), delay);
+  }
+
+  // Exchange the refresh token for a new pair; concurrent callers share one request
+  async refresh(): Promise<boolean> {
+    if (!this.refreshing) {
+      this.refreshing = this.doRefresh().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
+  private async doRefresh(): Promise<boolean> {
+    // Another tab may have refreshed already (refresh tokens work once)
+    const token = this.getToken();
+    const expiry = token ? tokenExpiry(token) : null;
+    if (expiry && expiry - Date.now() > REFRESH_MARGIN_MS * 2) {
+      this.scheduleRefresh();
+      return true;
+    }
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (!refreshToken) {
+      return false;
+    }
+
+    try {
+      const response = await fetch(`${API_URL}/refresh`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ refresh_token: refreshToken }),
+      });
+      if (!response.ok) {
+        if (response.status === 401) {
+          this.clearTokens();
+        }
+        return false;
+      }
+      this.storeTokens(await response.json());
+      return true;
+    } catch (error) {
+      console.error('Token refresh failed:', error);
+      return false;
+    }
+  }
+
   async getCurrentUser(): Promise<UserResponse> {
     const token = localStorage.getItem('token');
     if (!token) {
       throw new Error('No token found');
     }
 
-    const response = await fetch(`${API_URL}/me`, {
+    let response = await fetch(`${API_URL}/me`, {
       method: 'GET',
       headers: {
         'Authorization': `Bearer ${token}`,
       },
     });
 
+    // The access token may just have expired; try once with a refreshed one
+    if (response.status === 401 && (await this.refresh())) {
+      response = await fetch(`${API_URL}/me`, {
+        method: 'GET',
+        headers: {
+          'Authorization': `Bearer ${this.getToken()}`,
+        },
+      });
+    }
+
     if (!response.ok) {
       if (response.status === 401) {
-        this.logout();
+        this.clearTokens();
       }
       const error = await response.json();
       throw new Error(error.detail || 'Failed to get user info');
@@ -86,7 +185,26 @@ class AuthService {
   }
 
   logout(): void {
+    const token = this.getToken();
+    if (token) {
+      // Revoke the session server-side; the local sign-out does not wait for it
+      fetch(`${API_URL}/logout`, {
+        method: 'POST',
+        headers: {
+          'Authorization': `Bearer ${token}`,
+        },
+      }).catch(() => undefined);
+    }
+    this.clearTokens();
+  }
+
+  private clearTokens(): void {
+    if (this.refreshTimer) {
+      clearTimeout(this.refreshTimer);
+      this.refreshTimer = null;
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
   }
 
   getToken(): string | null {